@@ -1,66 +1,104 @@
 import streamlit as st
-import pandas as pd
-import gspread
-from google.oauth2.service_account import Credentials
+import hmac
+import os
+import uuid
 from datetime import datetime
-import time
-import random
-import string
-import json
-import emoji
-import phonenumbers
-from phonenumbers.phonenumberutil import region_code_for_country_code
+
+from portal.country_codes import COUNTRY_CODE_LABELS, COUNTRY_CODE_MAP, DEFAULT_COUNTRY_INDEX
+from portal.instrumentation import DEBUG_PANEL, Timer, metrics, span, start_exporters
+from portal.participants import normalize_email
+from portal.phones import normalize_phone_number
+from portal.profiling import RerunProfile, profile_key_matches, profiled
+from portal.rate_limit import is_sheets_busy
+from portal.request_ids import request_prefix
+from portal.request_types import DATE_REQUIRED_SUB_CATEGORIES, LONG_TERM_CATEGORY, request_types, sub_categories
+from portal.sheets_data import get_data_layer
+from portal.storage import STORAGE_ENGINE, get_storage
+from portal.submissions import FAILED, RETRYING, get_submission_queue, submission_key
+from portal.triage import FILTER_COLUMNS
 
 # Google Sheets API Setup
 SHEET_URL = "https://docs.google.com/spreadsheets/d/17Jf186s0G5uQrT6itt8KuiP9GhJqVtyqREyc_kYFS9M/edit?gid=0#gid=0"
 SERVICE_ACCOUNT_FILE = "service_account.json"
 
-# st.write("🔍 Checking credentials...")
-
-# Verify if Streamlit secrets are correctly loaded
-if "gcp_service_account" not in st.secrets:
-    # st.error("❌ `gcp_service_account` is missing in Streamlit secrets!")
-    st.stop()
+# Metrics file / HTTP endpoint are started once per process, only when configured
+start_exporters()
+rerun_timer = Timer("rerun")
 
-# Print loaded keys for debugging (DO NOT print private key)
-creds_dict = st.secrets["gcp_service_account"]
-# st.write("✅ Service account loaded:", creds_dict["client_email"])
+# Opt-in sampling profiler: PORTAL_PROFILE=1 for all sessions, or ?profile=<PORTAL_PROFILE_KEY>
+# for one. Traces are tagged with this short session id.
+if "profile_session" not in st.session_state:
+    st.session_state.profile_session = uuid.uuid4().hex[:8]
+if profile_key_matches(st.query_params.get("profile")):
+    st.session_state.profile_requested = True
+rerun_profile = RerunProfile(st.session_state.profile_session, requested=st.session_state.get("profile_requested", False))
 
-# Define Google API scopes
-SCOPES = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive"
-]
+# Fragment reruns are traced on their own, under the fragment's name
+profiled_section = profiled(lambda: st.session_state.profile_session, lambda: st.session_state.get("profile_requested", False))
 
-try:
-    creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-    client = gspread.authorize(creds)
-    # st.success("✅ Authentication successful!")
-except Exception as e:
-    st.error(f"❌ Authentication failed: {e}")
-    st.stop()
+# st.write("🔍 Checking credentials...")
 
-# Google Sheets Authentication
-#scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-#creds = Credentials.from_service_account_info(json.loads(json.dumps(creds_dict)))
-#creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=scope)
-#client = gspread.authorize(creds)
+if STORAGE_ENGINE == "sqlite":
+    # Local SQLite store only: no Google credentials or network access needed
+    storage = get_storage(STORAGE_ENGINE)
+else:
+    # Verify if Streamlit secrets are correctly loaded
+    if "gcp_service_account" not in st.secrets:
+        # st.error("❌ `gcp_service_account` is missing in Streamlit secrets!")
+        st.stop()
 
-# Load the Participants and Requests sheets
-sheet = client.open_by_url(SHEET_URL)
-# sheet = client.open('Volunteer Support Portal')
-participants_sheet = sheet.worksheet("Volunteer Details")
-requests_sheet = sheet.worksheet("Requests")
-message_templates_sheet = sheet.worksheet("Message Templates")
+    # Print loaded keys for debugging (DO NOT print private key)
+    creds_dict = st.secrets["gcp_service_account"]
+    # st.write("✅ Service account loaded:", creds_dict["client_email"])
 
-# Load participant data into a DataFrame
-participants_data = pd.DataFrame(participants_sheet.get_all_records())
+    try:
+        # The authorized client, worksheet handles and snapshots are shared by every session in this process
+        data_layer = get_data_layer(creds_dict, SHEET_URL)
+        client = data_layer.client
+        # st.success("✅ Authentication successful!")
+    except Exception as e:
+        st.error(f"❌ Authentication failed: {e}")
+        st.stop()
+
+    # Google Sheets Authentication
+    #scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+    #creds = Credentials.from_service_account_info(json.loads(json.dumps(creds_dict)))
+    #creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_FILE, scopes=scope)
+    #client = gspread.authorize(creds)
+
+    # Load the Participants and Requests sheets. They are read in one batched request by
+    # storage.refresh(); the spreadsheet itself is only opened once a worksheet handle is needed.
+    # sheet = client.open('Volunteer Support Portal')
+
+    storage = get_storage(STORAGE_ENGINE, data_layer)
+
+# Rerun the page a few seconds after Google Sheets was too busy to load it
+@st.fragment(run_every=3)
+def retry_when_sheets_free():
+    if st.session_state.get("sheets_busy_retry"):
+        st.session_state.sheets_busy_retry = False
+        st.rerun()
+    st.session_state.sheets_busy_retry = True
+
+# Shown instead of the page while Google Sheets is busy (our rate limiter, or Google's
+# own 429/5xx) and nothing is cached yet; later loads fall back to the cached data
+def wait_for_sheets():
+    st.info("⏳ Google Sheets is busy right now, retrying in a few seconds...")
+    retry_when_sheets_free()
+    st.stop()
 
-# Load Message Templates sheet
-message_templates_data = pd.DataFrame(message_templates_sheet.get_all_records())
+# Pick up new participants, templates and request IDs (a no-op while nothing changed)
+try:
+    with span("storage.refresh"):
+        storage.refresh()
+except Exception as error:
+    if not is_sheets_busy(error):
+        raise
+    wait_for_sheets()
+st.session_state.sheets_busy_retry = False
 
-# Load existing request IDs
-existing_requests = set(pd.DataFrame(requests_sheet.get_all_values())[0].tolist())
+# New requests are appended by a background writer shared by all sessions
+submission_queue = get_submission_queue(storage)
 
 # Custom Styling
 # st.markdown("""
@@ -194,124 +232,100 @@ div.stVerticalBlock {
 
 """, unsafe_allow_html=True)
 
+# Coordinators open the triage view with ?view=coordinator; it needs the access code
+# from PORTAL_COORDINATOR_ACCESS_CODE or `coordinator_access_code` in Streamlit secrets
+def coordinator_access_code():
+    access_code = os.environ.get("PORTAL_COORDINATOR_ACCESS_CODE", "")
+    if not access_code:
+        try:
+            access_code = st.secrets.get("coordinator_access_code", "")
+        except FileNotFoundError:
+            pass
+    return access_code
+
+# Filter and page through all active requests. Filtering runs on the server over a
+# columnar snapshot; only the rows of the current page are sent to the browser.
+def coordinator_view():
+    st.markdown("<h2 style='font-weight: bold;'>🗂️ Request Triage</h2>", unsafe_allow_html=True)
+    access_code = coordinator_access_code()
+    if not access_code:
+        st.error("❌ The coordinator view is not enabled on this portal.")
+        return
+    if not st.session_state.get("coordinator_unlocked"):
+        with st.form("coordinator_login"):
+            entered_code = st.text_input("🔑 Coordinator access code", type="password")
+            if st.form_submit_button("Open"):
+                if hmac.compare_digest(entered_code.encode(), access_code.encode()):
+                    st.session_state.coordinator_unlocked = True
+                    st.rerun()
+                st.error("❌ Wrong access code.")
+        return
+
+    try:
+        with span("triage.refresh"):
+            triage = storage.request_triage()
+    except Exception as error:
+        if not is_sheets_busy(error):
+            raise
+        st.info("⏳ Google Sheets is busy right now, please try again in a few seconds.")
+        return
+
+    # Any filter change starts again from the first page
+    def first_page():
+        st.session_state.triage_page = 1
+
+    filters = {}
+    filter_columns = st.columns(len(FILTER_COLUMNS))
+    for column, container in zip(FILTER_COLUMNS, filter_columns):
+        filters[column] = container.multiselect(column, triage.options(column), key=f"triage_{column}", on_change=first_page)
+    submitted_between = st.date_input("📅 Submitted between", value=(), key="triage_dates", on_change=first_page)
+    from_date = submitted_between[0] if len(submitted_between) > 0 else None
+    to_date = submitted_between[1] if len(submitted_between) > 1 else from_date
+    page_number = st.number_input("Page", min_value=1, step=1, key="triage_page")
+
+    with span("triage.query"):
+        result = triage.query(filters, from_date, to_date, page_number - 1)
+    st.caption(f"{result.total} of {len(triage)} requests · page {result.page + 1} of {result.pages}")
+    st.dataframe(result.rows, hide_index=True)
+
+if st.query_params.get("view") == "coordinator":
+    coordinator_view()
+    rerun_timer.stop()
+    rerun_profile.stop()
+    st.stop()
 
 
 
 
-# Function to normalize phone numbers to E.164 format
-def normalize_phone_number(phone_number, country_code="IN"):
-    try:
-        parsed_number = phonenumbers.parse(phone_number, country_code)
-        if not phonenumbers.is_valid_number(parsed_number):
-            return None
-        return phonenumbers.format_number(parsed_number, phonenumbers.PhoneNumberFormat.E164)
-    except phonenumbers.NumberParseException:
-        return None
-
-# Generate country code list (Without Flags)
-def get_country_code_map():
-    country_code_map = {}
-
-    for cc in sorted(phonenumbers.COUNTRY_CODE_TO_REGION_CODE.keys()):
-        regions = phonenumbers.COUNTRY_CODE_TO_REGION_CODE[cc]
-        if regions:
-            region = regions[0]  # Use the first region if multiple exist
-            key = f"{region} (+{cc})"
-            country_code_map[key] = str(cc)
-
-    return country_code_map
-
-# Get country data
-country_code_map = get_country_code_map()
-default_country = "IN (+91)"  # Default to India
 
 # Function to get message based on template name
 def get_message(template_name):
-    message_row = message_templates_data[message_templates_data["Template Name"] == template_name]
-    if not message_row.empty:
-        return message_row.iloc[0]["Message"]
+    message = storage.message_template(template_name)
+    if message is not None:
+        return message
     return "⚠️ Please visit counter 23/24 at Welcome Point for further assistance with your request."
 
 # Retrieve the specific message
-assist_message = get_message("Reach Out to Add Credentials Message")
-step_out_request_message = get_message("Step Out Request Default Message")
+# With a shared cache, storage.refresh() leaves the templates to be loaded here
+try:
+    assist_message = get_message("Reach Out to Add Credentials Message")
+    step_out_request_message = get_message("Step Out Request Default Message")
+except Exception as error:
+    if not is_sheets_busy(error):
+        raise
+    wait_for_sheets()
 
 # Streamlit UI
 # st.title("🔹 Raise a Request")
 st.markdown("<h2 style='font-weight: bold;'>🔹 Raise a Request</h2>", unsafe_allow_html=True)
 
-# Input Variables
-email = st.text_input("📧 Email ID", placeholder="Enter your Email ID")
-email_verified = False
-phone_verified = False
-volunteer_category = None
-name = None
-phone_number = None
-gender = None
-show_forgot_email = False
-
-# Check if email exists
-if email and "forgot_email_clicked" not in st.session_state:
-    matching_record = participants_data[participants_data["Email ID"] == email]
-    if not matching_record.empty:
-        volunteer_category = matching_record.iloc[0]["Volunteer Category"]
-        name = matching_record.iloc[0]["Name"]
-        gender = matching_record.iloc[0]["Gender"]
-        phone_number = str(matching_record.iloc[0]["Phone Number"]).strip()
-
-        # Auto-detect country code for stored numbers
-        if not phone_number.startswith("+"):
-            phone_number = f"+91{phone_number}"  # Assume India if no code
-
-        phone_number = normalize_phone_number(phone_number)
-        email_verified = True
-    else:
-        show_forgot_email = True
-        st.error("❌ Email record does not exist in the database.")
-
-# Show "Forgot my Email ID" button
-if show_forgot_email and "forgot_email_clicked" not in st.session_state:
-    if st.button("🔍 Forgot my Email ID"):
-        st.session_state["forgot_email_clicked"] = True
-
-# **Phone Input - Without Flags**
-if st.session_state.get("forgot_email_clicked", False):
-    col1, col2 = st.columns([1.5, 3])  
-
-    with col1:
-        selected_country = st.selectbox("🌍 Select Country Code", list(country_code_map.keys()), index=list(country_code_map.keys()).index(default_country))
-        country_code = country_code_map[selected_country]
-
-    with col2:
-        raw_phone = st.text_input("📞 Phone Number", placeholder="Enter phone number without country code")
+# Each section of the form is a fragment, so a change in one section reruns only that
+# section instead of the whole page. Sections pass what they found to each other through
+# session state; a section whose change affects the ones after it reruns the whole page.
 
-    # Validate and normalize input
-    if raw_phone:
-        normalized_input_number = normalize_phone_number(f"+{country_code}{raw_phone}")
-
-        # Normalize stored phone numbers for verification
-        participants_data["Normalized Phone Number"] = participants_data["Phone Number"].astype(str).apply(
-            lambda num: normalize_phone_number(f"+91{num}") if not num.startswith("+") else normalize_phone_number(num)
-        )
-
-        phone_match = participants_data[participants_data["Normalized Phone Number"] == normalized_input_number]
-
-        if not phone_match.empty:
-            volunteer_category = phone_match.iloc[0]["Volunteer Category"]
-            name = phone_match.iloc[0]["Name"]
-            gender = phone_match.iloc[0]["Gender"]
-            email = phone_match.iloc[0]["Email ID"]
-            phone_verified = True
-            st.success("✅ Now you can fill the request type and description to submit the form.")
-        else:
-            st.error("❌ Phone number does not exist in the database.")
-            st.warning(assist_message)  # Use the dynamically fetched message
-            
-
-# Define request type options based on participant type
-request_options = ["", "Seva Team", "Health Team", "Sahaya (Support) Team", "Others"]
-if volunteer_category == "Long Term Department Support":
-    request_options.insert(2, "Accommodation Team")
+# Verified participant of this session (None until the email or phone number matches)
+if "participant" not in st.session_state:
+    st.session_state.participant = None
 
 # Initialize session state for dynamic UI updates
 if "selected_request_type" not in st.session_state:
@@ -353,223 +367,416 @@ if "extension_request_message" not in st.session_state:
 if "clear_form" not in st.session_state:
     st.session_state.clear_form = False
 
+# Identifies this browser session in submission idempotency keys
+if "submission_session_key" not in st.session_state:
+    st.session_state.submission_session_key = uuid.uuid4().hex
+
 # Reset form fields before rendering widgets
 if st.session_state.clear_form:
     reset_form()
 
-# Request Type Dropdown
-request_type = st.selectbox("📌 I want to reach out to:", request_options, index=0, key="request_type")
-
-# Update session state on request type selection
-if request_type != st.session_state.selected_request_type:
-    st.session_state.selected_request_type = request_type
-    st.session_state.step_out_message = False  # Hide message when request type changes
-    st.session_state.linga_seva_message = False
-    st.session_state.extension_request_message = False
-
-    # Define dynamic sub-category options
-    if request_type == "Seva Team":
-        st.session_state.sub_category_options = ["Seva Affecting Health", "Seva Change", "Linga Seva", "Devi Seva", "Prana Danam", "Adi Yogi Arpanam", "Others"]
-        if volunteer_category == "Long Term Department Support":
-            st.session_state.sub_category_options.insert(0, "Meet Seva Team")
-    
-    elif request_type == "Sahaya (Support) Team" and volunteer_category == "Long Term Department Support":
-        st.session_state.sub_category_options = ["Meet Sahaya Team", "Step out of Ashram", "3 days Silence", "Extension Request", "Others"]
-    
-    else:
-        st.session_state.sub_category_options = []
-
-# Display Sub Category Dropdown only if options exist
-sub_category = None
-if st.session_state.sub_category_options:
-    sub_category = st.selectbox("📌 Sub Category", [""] + st.session_state.sub_category_options, index=0, key="sub_category")
-
-# Show information message based on selected sub-category
-if sub_category == "Step out of Ashram":
-    st.session_state.step_out_message = True
-    st.session_state.linga_seva_message = False
-    st.session_state.extension_request_message = False
-elif sub_category == "Linga Seva":
-    st.session_state.step_out_message = False
-    st.session_state.linga_seva_message = True
-    st.session_state.extension_request_message = False
-elif sub_category == "Extension Request":
-    st.session_state.step_out_message = False
-    st.session_state.linga_seva_message = False
-    st.session_state.extension_request_message = True
-else:
-    # Hide all messages when another sub-category is selected
-    st.session_state.step_out_message = False
-    st.session_state.linga_seva_message = False
-    st.session_state.extension_request_message = False
-
-
-# Show Step-Out Message
-if st.session_state.step_out_message:
-    st.markdown(
-        """
-        <div style='color: #555555; background-color: #f8f9fa; padding: 12px; border-radius: 8px; font-size: 14px;'>
-            <b style="display: block; margin-bottom: 5px;">⚠️ Please raise the request at least <u>72 hrs before the travel date</u>:</b>
-            <ul style="padding-left: 20px; margin: 5px 0;">
-                <li>📅 <b>Mention the Dates of Departure & Expected Return</b></li>
-                <li>📝 <b>Specify the Reason for travel in the description</b></li>
-            </ul>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
-
-# Show Linga Seva Message
-if st.session_state.linga_seva_message:
-    st.markdown(
-        """
-        <div style='color: #555555; background-color: #f8f9fa; padding: 12px; border-radius: 8px; font-size: 14px;'>
-            <b>⚠️ Applicable for both 5 days and 10 days Linga Seva</b>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
-
-# Show Extension Request Message
-if st.session_state.extension_request_message:
-    st.markdown(
-        """
-        <div style='color: #555555; background-color: #f8f9fa; padding: 12px; border-radius: 8px; font-size: 14px;'>
-            <b>⚠️ Please mention the date until which you wish to extend and the reason why.</b>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
+# Whether the request options on the page were built for a long-term volunteer; None
+# until the request section renders in this run, so a full run never reruns itself
+st.session_state.request_options_long_term = None
+
+# Identity lookup: email, or phone number after "Forgot my Email ID"
+@st.fragment
+@profiled_section
+def identity_section():
+    # Input Variables
+    email = st.text_input("📧 Email ID", placeholder="Enter your Email ID")
+    email_verified = False
+    phone_verified = False
+    volunteer_category = None
+    name = None
+    phone_number = None
+    gender = None
+    show_forgot_email = False
+
+    # Check if email exists
+    if email and "forgot_email_clicked" not in st.session_state:
+        try:
+            with span("lookup.email"):
+                matching_record = storage.participant_by_email(email)
+        except Exception as error:
+            if not is_sheets_busy(error):
+                raise
+            st.info("⏳ Google Sheets is busy right now, please try again in a few seconds.")
+            st.session_state.participant = None
+            return
+        if matching_record is not None:
+            volunteer_category = matching_record.category
+            name = matching_record.name
+            gender = matching_record.gender
+            phone_number = matching_record.phone  # Already normalized when the index was built
+            email_verified = True
+        else:
+            show_forgot_email = True
+            st.error("❌ Email record does not exist in the database.")
 
-# Define the sub-categories that require date selection
-date_required_sub_categories = {
-    "Linga Seva", "Devi Seva", "Prana Danam", "Adi Yogi Arpanam", 
-    "Step out of Ashram", "3 days Silence", "Extension Request"
-}
+            # Typo-tolerant hints (e.g. gmial.com), masked so no one else's email is revealed
+            with span("lookup.email_suggestions"):
+                email_suggestions = storage.suggest_emails(email)
+            if email_suggestions:
+                st.info("🔎 Did you mean " + " or ".join(f"`{suggestion}`" for suggestion in email_suggestions) + "?")
 
-# Set default date values (even if hidden)
-if sub_category in date_required_sub_categories:
-    st.session_state.from_date = datetime.today()
-    st.session_state.to_date = datetime.today()
+    # Show "Forgot my Email ID" button
+    if show_forgot_email and "forgot_email_clicked" not in st.session_state:
+        if st.button("🔍 Forgot my Email ID"):
+            st.session_state["forgot_email_clicked"] = True
 
-    if sub_category == "Extension Request":
-        # Show "To Date" picker in full width for "Extension Request"
-        st.session_state.to_date = st.date_input("📅 To Date", 
-            value=st.session_state.to_date, format="DD/MM/YYYY")
-    else:
-        # Use two-column layout for other subcategories
-        col1, col2 = st.columns(2)
+    # **Phone Input - Without Flags**
+    if st.session_state.get("forgot_email_clicked", False):
+        col1, col2 = st.columns([1.5, 3])  
 
         with col1:
-            st.session_state.from_date = st.date_input("📅 From Date", 
-                value=st.session_state.from_date, format="DD/MM/YYYY")
+            # Country code options are a pre-generated table (portal/country_codes.py)
+            selected_country = st.selectbox("🌍 Select Country Code", COUNTRY_CODE_LABELS, index=DEFAULT_COUNTRY_INDEX)
+            country_code = COUNTRY_CODE_MAP[selected_country]
 
         with col2:
-            st.session_state.to_date = st.date_input("📅 To Date", 
-                value=st.session_state.to_date, format="DD/MM/YYYY")
+            raw_phone = st.text_input("📞 Phone Number", placeholder="Enter phone number without country code")
+
+        # Validate and normalize input
+        if raw_phone:
+            with span("lookup.normalize_phone"):
+                normalized_input_number = normalize_phone_number(f"+{country_code}{raw_phone}")
+
+            # Stored phone numbers are normalized once, when the participant data is loaded
+            try:
+                with span("lookup.phone"):
+                    phone_match = storage.participant_by_phone(normalized_input_number)
+            except Exception as error:
+                if not is_sheets_busy(error):
+                    raise
+                st.info("⏳ Google Sheets is busy right now, please try again in a few seconds.")
+                st.session_state.participant = None
+                return
+
+            if phone_match is not None:
+                volunteer_category = phone_match.category
+                name = phone_match.name
+                gender = phone_match.gender
+                email = phone_match.email
+                phone_number = phone_match.phone
+                phone_verified = True
+                st.success("✅ Now you can fill the request type and description to submit the form.")
+            else:
+                st.error("❌ Phone number does not exist in the database.")
+                st.warning(assist_message)  # Use the dynamically fetched message
+
+    if email_verified or phone_verified:
+        st.session_state.participant = {
+            "name": name, "gender": gender, "email": email, "phone": phone_number, "category": volunteer_category,
+        }
+    else:
+        st.session_state.participant = None
+
+    # Long-term volunteers get more request types: rebuild the page when that changes
+    rendered_long_term = st.session_state.request_options_long_term
+    if rendered_long_term is not None and rendered_long_term != (volunteer_category == LONG_TERM_CATEGORY):
+        st.rerun()
+
+identity_section()
+
+# Request type, sub category and the messages and dates that go with them
+@st.fragment
+@profiled_section
+def request_section():
+    participant = st.session_state.participant
+    volunteer_category = participant["category"] if participant else None
+
+    # Define request type options based on participant type
+    request_options = [""] + request_types(volunteer_category)
+    st.session_state.request_options_long_term = volunteer_category == LONG_TERM_CATEGORY
+
+    # Request Type Dropdown
+    request_type = st.selectbox("📌 I want to reach out to:", request_options, index=0, key="request_type")
+
+    # Update session state on request type selection
+    if request_type != st.session_state.selected_request_type:
+        st.session_state.selected_request_type = request_type
+        st.session_state.step_out_message = False  # Hide message when request type changes
+        st.session_state.linga_seva_message = False
+        st.session_state.extension_request_message = False
+
+        # Define dynamic sub-category options
+        st.session_state.sub_category_options = sub_categories(request_type, volunteer_category)
+
+    # Display Sub Category Dropdown only if options exist
+    sub_category = None
+    if st.session_state.sub_category_options:
+        sub_category = st.selectbox("📌 Sub Category", [""] + st.session_state.sub_category_options, index=0, key="sub_category")
+
+    # Show information message based on selected sub-category
+    if sub_category == "Step out of Ashram":
+        st.session_state.step_out_message = True
+        st.session_state.linga_seva_message = False
+        st.session_state.extension_request_message = False
+    elif sub_category == "Linga Seva":
+        st.session_state.step_out_message = False
+        st.session_state.linga_seva_message = True
+        st.session_state.extension_request_message = False
+    elif sub_category == "Extension Request":
+        st.session_state.step_out_message = False
+        st.session_state.linga_seva_message = False
+        st.session_state.extension_request_message = True
+    else:
+        # Hide all messages when another sub-category is selected
+        st.session_state.step_out_message = False
+        st.session_state.linga_seva_message = False
+        st.session_state.extension_request_message = False
+
+
+    # Show Step-Out Message
+    if st.session_state.step_out_message:
+        st.markdown(
+            """
+            <div style='color: #555555; background-color: #f8f9fa; padding: 12px; border-radius: 8px; font-size: 14px;'>
+                <b style="display: block; margin-bottom: 5px;">⚠️ Please raise the request at least <u>72 hrs before the travel date</u>:</b>
+                <ul style="padding-left: 20px; margin: 5px 0;">
+                    <li>📅 <b>Mention the Dates of Departure & Expected Return</b></li>
+                    <li>📝 <b>Specify the Reason for travel in the description</b></li>
+                </ul>
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
 
-else:
-    st.session_state.from_date = None
-    st.session_state.to_date = None
+    # Show Linga Seva Message
+    if st.session_state.linga_seva_message:
+        st.markdown(
+            """
+            <div style='color: #555555; background-color: #f8f9fa; padding: 12px; border-radius: 8px; font-size: 14px;'>
+                <b>⚠️ Applicable for both 5 days and 10 days Linga Seva</b>
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
 
-# Description (Mandatory)
-description = st.text_area("📝 Description of your request", key="description")
+    # Show Extension Request Message
+    if st.session_state.extension_request_message:
+        st.markdown(
+            """
+            <div style='color: #555555; background-color: #f8f9fa; padding: 12px; border-radius: 8px; font-size: 14px;'>
+                <b>⚠️ Please mention the date until which you wish to extend and the reason why.</b>
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
 
-import random
-import string
+    dates_section(sub_category)
 
-# Function to generate a unique request ID in incremental order
-def generate_unique_request_id(volunteer_category):
-    # Define request prefix mapping
-    request_prefix = {
-        "Ashram Volunteer": "AV",
-        "Short Term Department Support": "STV",
-        "Long Term Department Support": "LTV"
-    }.get(volunteer_category, "REQ")
+# Date pickers; a fragment of their own inside the request section, so picking a date
+# reruns only the pickers
+@st.fragment
+@profiled_section
+def dates_section(sub_category):
+    # Set default date values (even if hidden)
+    if sub_category in DATE_REQUIRED_SUB_CATEGORIES:
+        st.session_state.from_date = datetime.today()
+        st.session_state.to_date = datetime.today()
 
-    # Add "REQ-" to the prefix
-    full_prefix = f"REQ-{request_prefix}"
+        if sub_category == "Extension Request":
+            # Show "To Date" picker in full width for "Extension Request"
+            st.session_state.to_date = st.date_input("📅 To Date", 
+                value=st.session_state.to_date, format="DD/MM/YYYY")
+        else:
+            # Use two-column layout for other subcategories
+            col1, col2 = st.columns(2)
 
-    # Extract existing numeric parts of request IDs for this category
-    existing_numbers = sorted([
-        int(request_id.replace(full_prefix, "")) for request_id in existing_requests 
-        if request_id.startswith(full_prefix) and request_id.replace(full_prefix, "").isdigit()
-    ])
+            with col1:
+                st.session_state.from_date = st.date_input("📅 From Date", 
+                    value=st.session_state.from_date, format="DD/MM/YYYY")
 
-    # Determine the next available number (incremental approach)
-    next_number = 1  # Start from 00001
+            with col2:
+                st.session_state.to_date = st.date_input("📅 To Date", 
+                    value=st.session_state.to_date, format="DD/MM/YYYY")
 
-    for num in existing_numbers:
-        if num == next_number:
-            next_number += 1  # Move to the next available number
+    else:
+        st.session_state.from_date = None
+        st.session_state.to_date = None
+
+request_section()
+
+# Description and submit
+@st.fragment
+@profiled_section
+def submit_section():
+    # Description (Mandatory)
+    description = st.text_area("📝 Description of your request", key="description")
+
+    # Submit Button
+    if st.button("Submit Request"):
+        participant = st.session_state.participant
+        request_type = st.session_state.request_type
+        sub_category = st.session_state.get("sub_category") if st.session_state.sub_category_options else None
+        if participant is None:
+            st.error("⚠️ Please enter a valid Email ID or Phone Number.")
+        elif not request_type or request_type == "":
+            st.error("⚠️ Please select a Request Type.")
+        elif st.session_state.sub_category_options and (not sub_category or sub_category == ""):
+            st.error("⚠️ Please select a Sub Category.")
+        elif sub_category in DATE_REQUIRED_SUB_CATEGORIES and (not st.session_state.from_date or not st.session_state.to_date):
+            st.error("⚠️ Please select both From Date and To Date.")
+        elif not description.strip():
+            st.error("⚠️ Please enter a description.")
         else:
-            break  # Found a gap, use this number
-
-    # If we reach 99999, switch to alphanumeric fallback
-    if next_number > 99999:
-        for _ in range(10000):  # Try up to 10,000 times to find a unique alphanumeric ID
-            random_alnum = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-            request_id = f"{full_prefix}{random_alnum}"
-            if request_id not in existing_requests:
-                return request_id
-        return f"{full_prefix}XXXXX"  # Fallback if all alphanumeric options are exhausted
+            submit_request(participant, request_type, sub_category, description)
 
-    # Format the number as a 5-digit string and return
-    request_id = f"{full_prefix}{next_number:05d}"
-    return request_id
+# Queue a validated request and rerun the page to show its confirmation
+def submit_request(participant, request_type, sub_category, description):
+    from_date_text = st.session_state.from_date.strftime("%d/%m/%Y") if st.session_state.from_date else "None"
+    to_date_text = st.session_state.to_date.strftime("%d/%m/%Y") if st.session_state.to_date else "None"
 
-
-# Submit Button
-if st.button("Submit Request"):
-    if not (email_verified or phone_verified):
-        st.error("⚠️ Please enter a valid Email ID or Phone Number.")
-    elif not request_type or request_type == "":
-        st.error("⚠️ Please select a Request Type.")
-    elif st.session_state.sub_category_options and (not sub_category or sub_category == ""):
-        st.error("⚠️ Please select a Sub Category.")
-    elif sub_category in date_required_sub_categories and (not st.session_state.from_date or not st.session_state.to_date):
-        st.error("⚠️ Please select both From Date and To Date.")
-    elif not description.strip():
-        st.error("⚠️ Please enter a description.")
+    # A double click, browser retry or rerun that submits the same request again
+    # gets the original Request ID back instead of a second row
+    idempotency_key = submission_key(
+        st.session_state.submission_session_key, participant["email"], request_type, sub_category, from_date_text, to_date_text, description
+    )
+    original_request_id = submission_queue.duplicate_of(idempotency_key)
+    if original_request_id is not None:
+        request_id = original_request_id
     else:
-        request_id = generate_unique_request_id(volunteer_category)
+        with span("submit.reserve_id"):
+            request_id = storage.reserve_request_ids(request_prefix(participant["category"]))[0]
 
-        # Save to Google Sheet
-        requests_sheet.append_row([
+    # Queue the row for the background writer; it is appended to the Google Sheet in batches
+    try:
+        request_id = submission_queue.submit(request_id, [
             request_id,
-            name,  # Name from Volunteer Details
-            gender,  # Gender
-            email,  # Email ID
-            phone_number,  # Phone Number
-            volunteer_category,
+            participant["name"],  # Name from Volunteer Details
+            participant["gender"],  # Gender
+            participant["email"],  # Email ID
+            participant["phone"],  # Phone Number
+            participant["category"],
             request_type,
             sub_category if sub_category else "None",
-            st.session_state.from_date.strftime("%d/%m/%Y") if st.session_state.from_date else "None",  # Store in dd/mm/yyyy format
-            st.session_state.to_date.strftime("%d/%m/%Y") if st.session_state.to_date else "None",
+            from_date_text,  # Store in dd/mm/yyyy format
+            to_date_text,
             description,
             str(datetime.now())
-        ])
-
-        # Display different messages based on the sub-category
-        if sub_category == "Step out of Ashram":
-            # Format the message with request ID
-            formatted_message = step_out_request_message.replace("{request_id}", request_id)
-            # Force a newline before "Your request ID"
-            formatted_message = formatted_message.replace("Your request ID:", "\n\nYour request ID:")
-            st.success(formatted_message)
-            
-            # st.success(
-            #     "🔹 Please request your department coordinator to send an approval email for your step out request to "
-            #     "**overseas.volunteers@ishafoundation.org**, for us to process it further.\n\n"
-            #     f"Your request ID: **{request_id}**"
-            # )
+        ], idempotency_key=idempotency_key)
+    except OSError:
+        # The local journal could not be written, so nothing was queued and a retry is safe
+        st.error("❌ We could not save your request. Please try again.")
+        st.warning(assist_message)
+        return
+
+    # Display different messages based on the sub-category
+    if sub_category == "Step out of Ashram":
+        # Format the message with request ID
+        formatted_message = step_out_request_message.replace("{request_id}", request_id)
+        # Force a newline before "Your request ID"
+        formatted_message = formatted_message.replace("Your request ID:", "\n\nYour request ID:")
+
+        # st.success(
+        #     "🔹 Please request your department coordinator to send an approval email for your step out request to "
+        #     "**overseas.volunteers@ishafoundation.org**, for us to process it further.\n\n"
+        #     f"Your request ID: **{request_id}**"
+        # )
+    else:
+        formatted_message = (
+            f"✅ **We have received your request (Request ID: {request_id}).**\n\n"
+            "The respective team will get back to you shortly."
+        )
+
+    # The confirmation is shown after the rerun, so the script thread never sleeps
+    st.session_state.last_submission = {"request_id": request_id, "message": formatted_message}
+    # Set flag to clear form on next render
+    st.session_state.clear_form = True
+    st.rerun()  # Force rerun to refresh form inputs
+
+submit_section()
+
+# Function to show the confirmation and save status of the last submitted request
+def show_submission_status(submission):
+    status = submission_queue.status(submission["request_id"])
+    if status is not None and status.state == FAILED:
+        st.error(f"❌ We could not save your request (Request ID: {submission['request_id']}).")
+        st.warning(assist_message)
+        return
+    st.success(submission["message"])
+    if status is not None and status.state == RETRYING:
+        st.info("⏳ Google Sheets is busy, we are still saving your request...")
+    elif status is not None and not status.done:
+        st.info("⏳ Saving your request...")
+
+# Poll the background writer until the request is saved, then rerun the full page once
+@st.fragment(run_every=2)
+def poll_submission_status(submission):
+    show_submission_status(submission)
+    status = submission_queue.status(submission["request_id"])
+    if status is None or status.done:
+        st.rerun()
+
+# Submit Button
+# Show the confirmation of the last submitted request
+if "last_submission" in st.session_state:
+    last_submission_status = submission_queue.status(st.session_state.last_submission["request_id"])
+    if last_submission_status is None or last_submission_status.done:
+        show_submission_status(st.session_state.last_submission)
+    else:
+        poll_submission_status(st.session_state.last_submission)
+
+# Show the stored details and status of one request
+def show_tracked_request(request_id, tracked_email):
+    try:
+        with span("lookup.request"):
+            details = storage.request_details(request_id)
+    except Exception as error:
+        if not is_sheets_busy(error):
+            raise
+        st.info("⏳ Google Sheets is busy right now, please try again in a few seconds.")
+        return
+
+    # Only reveal a request to someone who knows both its ID and email
+    if details is None or normalize_email(details["Email ID"]) != normalize_email(tracked_email):
+        status = submission_queue.status(request_id.strip().upper())
+        if details is None and status is not None and status.state == FAILED:
+            st.error(f"❌ We could not save your request (Request ID: {status.request_id}).")
+            st.warning(assist_message)
+        elif details is None and status is not None:
+            st.info("⏳ Your request is still being saved. Please check again in a minute.")
         else:
-            st.success(
-                f"✅ **We have received your request (Request ID: {request_id}).**\n\n"
-                "The respective team will get back to you shortly."
-            )
-
-        time.sleep(21)
-        # Set flag to clear form on next render
-        st.session_state.clear_form = True
-        st.rerun()  # Force rerun to refresh form inputs
+            st.error("❌ No request found for this Request ID and Email ID.")
+        return
+
+    st.success(f"📌 **{details['Request ID']}**: {details['Status']}")
+    lines = [
+        f"**Request Type:** {details['Request Type']}",
+        f"**Sub Category:** {details['Sub Category']}",
+    ]
+    if details["From Date"] not in ("", "None"):
+        lines.append(f"**From Date:** {details['From Date']}")
+    if details["To Date"] not in ("", "None"):
+        lines.append(f"**To Date:** {details['To Date']}")
+    lines.append(f"**Description:** {details['Description']}")
+    lines.append(f"**Submitted:** {details['Timestamp'][:16]}")
+    st.markdown("\n\n".join(lines))
+
+# Track my Request: a fragment, so looking up a request does not rerun the whole form
+@st.fragment
+@profiled_section
+def track_request():
+    with st.expander("🔎 Track my Request"):
+        with st.form("track_request_form"):
+            last_request_id = st.session_state.get("last_submission", {}).get("request_id", "")
+            tracked_request_id = st.text_input("🆔 Request ID", value=last_request_id, placeholder="e.g. REQ-LTV00042", key="tracked_request_id")
+            tracked_email = st.text_input("📧 Email ID used for the request", key="tracked_email")
+            track_clicked = st.form_submit_button("Track Request")
+        if track_clicked:
+            if not tracked_request_id.strip() or not tracked_email.strip():
+                st.error("⚠️ Please enter both your Request ID and Email ID.")
+            else:
+                show_tracked_request(tracked_request_id, tracked_email)
+
+track_request()
+
+rerun_timer.stop()
+rerun_profile.stop()
+
+# Opt-in debug panel with per-process timings, API call counts and quota use
+if DEBUG_PANEL or st.query_params.get("debug") == "1":
+    with st.expander("🛠️ Portal metrics"):
+        st.json(metrics.snapshot())
@@ -0,0 +1 @@
+# Benchmarks for the Volunteer Support Portal; run with python -m benchmarks.<module>.
@@ -0,0 +1,254 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import requests
+from gspread.exceptions import APIError, WorksheetNotFound
+
+# In-memory stand-in for the gspread client, spreadsheet and worksheets used by
+# the portal. Every call is counted and can be slowed down or failed with a 429
+# to mimic Google Sheets under load.
+
+PARTICIPANT_HEADER = ["Name", "Gender", "Email ID", "Phone Number", "Volunteer Category"]
+REQUEST_HEADER = [
+    "Request ID", "Name", "Gender", "Email ID", "Phone Number", "Volunteer Category",
+    "Request Type", "Sub Category", "From Date", "To Date", "Description", "Timestamp",
+]
+TEMPLATE_HEADER = ["Template Name", "Message"]
+
+VOLUNTEER_CATEGORIES = ["Ashram Volunteer", "Short Term Department Support", "Long Term Department Support"]
+
+_A1_RANGE = re.compile(r"^([A-Z]+)(\d+)?(?::([A-Z]+)(\d+)?)?$")
+
+
+def _column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
+
+
+# Values of an A1 range such as "A2:A" or "A1:L100" (no sheet name)
+def slice_range(values, range_name):
+    match = _A1_RANGE.match(range_name)
+    first_column = _column_index(match.group(1))
+    last_column = _column_index(match.group(3) or match.group(1))
+    first_row = int(match.group(2) or 1) - 1
+    last_row = int(match.group(4)) if match.group(4) else len(values)
+    return [list(row[first_column:last_column + 1]) for row in values[first_row:last_row]]
+
+
+# Build the gspread APIError that a real 429 response would raise
+def quota_error():
+    response = requests.Response()
+    response.status_code = 429
+    response._content = json.dumps({
+        "error": {"code": 429, "message": "Quota exceeded (fake)", "status": "RESOURCE_EXHAUSTED"}
+    }).encode()
+    return APIError(response)
+
+
+class FakeBackend:
+    def __init__(self, latency=0.0, jitter=0.0, quota_error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_error_rate = quota_error_rate
+        self.calls = Counter()
+        self.version = 1
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # Count the call, wait like the network would, and maybe fail with a quota error
+    def call(self, operation):
+        with self._lock:
+            self.calls[operation] += 1
+            fail = self._random.random() < self.quota_error_rate
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            self.calls["quota_errors"] += 1
+            raise quota_error()
+
+    def bump_version(self):
+        with self._lock:
+            self.version += 1
+
+    @property
+    def total_calls(self):
+        return sum(count for operation, count in self.calls.items() if operation != "quota_errors")
+
+
+class FakeWorksheet:
+    def __init__(self, backend, title, values):
+        self.backend = backend
+        self.title = title
+        self.values = values
+
+    def get_all_values(self):
+        self.backend.call("get_all_values")
+        return [list(row) for row in self.values]
+
+    def get_all_records(self):
+        self.backend.call("get_all_records")
+        header = self.values[0]
+        return [dict(zip(header, row)) for row in self.values[1:]]
+
+    def get(self, range_name):
+        self.backend.call("values_get")
+        return slice_range(self.values, range_name)
+
+    def append_row(self, values, **kwargs):
+        self.append_rows([values], _operation="append_row")
+
+    def append_rows(self, values, _operation="append_rows", **kwargs):
+        self.backend.call(_operation)
+        self.values.extend([str(value) if value is not None else "" for value in row] for row in values)
+        self.backend.bump_version()
+
+    # Rows start_index..end_index (1-based, inclusive), like gspread
+    def delete_rows(self, start_index, end_index=None):
+        self.backend.call("delete_rows")
+        del self.values[start_index - 1:(end_index or start_index)]
+        self.backend.bump_version()
+
+
+class _FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class FakeHTTPClient:
+    def __init__(self, backend, spreadsheet):
+        self.backend = backend
+        self.spreadsheet = spreadsheet
+
+    # Only the Drive metadata request used for revision checks goes through here
+    def request(self, method, url, params=None, **kwargs):
+        self.backend.call("drive_metadata")
+        return _FakeResponse({"version": str(self.backend.version), "modifiedTime": ""})
+
+    def values_batch_get(self, id, ranges, params=None):
+        return self.spreadsheet.values_batch_get(ranges, params)
+
+
+class FakeSpreadsheet:
+    id = "fake-spreadsheet"
+
+    def __init__(self, backend, worksheets):
+        self.backend = backend
+        self._worksheets = {worksheet.title: worksheet for worksheet in worksheets}
+
+    def worksheet(self, title):
+        self.backend.call("fetch_sheet_metadata")
+        if title not in self._worksheets:
+            raise WorksheetNotFound(title)
+        return self._worksheets[title]
+
+    def add_worksheet(self, title, rows=1000, cols=26, index=None):
+        self.backend.call("add_worksheet")
+        self._worksheets[title] = FakeWorksheet(self.backend, title, [])
+        self.backend.bump_version()
+        return self._worksheets[title]
+
+    def worksheets(self):
+        self.backend.call("fetch_sheet_metadata")
+        return list(self._worksheets.values())
+
+    def values_batch_get(self, ranges, params=None):
+        self.backend.call("values_batch_get")
+        value_ranges = []
+        for range_name in ranges:
+            title, _, cells = range_name.rpartition("!")
+            if not title:
+                title, cells = cells, ""
+            values = self._worksheets[title.strip("'")].values
+            values = slice_range(values, cells) if cells else [list(row) for row in values]
+            value_ranges.append({"range": range_name, "values": values})
+        return {"spreadsheetId": self.id, "valueRanges": value_ranges}
+
+
+class FakeClient:
+    def __init__(self, backend, spreadsheet):
+        self.backend = backend
+        self.spreadsheet = spreadsheet
+        self.http_client = FakeHTTPClient(backend, spreadsheet)
+
+    def open_by_url(self, url):
+        self.backend.call("open_by_url")
+        return self.spreadsheet
+
+    def open_by_key(self, key):
+        self.backend.call("open_by_key")
+        return self.spreadsheet
+
+
+def fake_phone_number(rng):
+    return f"{rng.choice('6789')}{rng.randrange(10 ** 8, 10 ** 9)}"
+
+
+# Participants are named volunteer<N>@example.com so benchmarks can pick known rows
+def generate_participants(count, seed=0):
+    rng = random.Random(seed)
+    rows = [PARTICIPANT_HEADER]
+    for number in range(count):
+        rows.append([
+            f"Volunteer {number}",
+            rng.choice(["Male", "Female"]),
+            f"volunteer{number}@example.com",
+            fake_phone_number(rng),
+            rng.choice(VOLUNTEER_CATEGORIES),
+        ])
+    return rows
+
+
+# Request type -> sub categories, as offered by the form
+REQUEST_TYPES = {
+    "Seva Team": ["Seva Affecting Health", "Seva Change", "Linga Seva", "Devi Seva", "Others"],
+    "Sahaya (Support) Team": ["Meet Sahaya Team", "Step out of Ashram", "Extension Request", "Others"],
+    "Health Team": [""],
+    "Accommodation Team": [""],
+    "Others": [""],
+}
+
+
+# Requests are spread evenly over 2024-2025 and over the form's request types, for the triage filters
+def generate_requests(count, seed=0):
+    rng = random.Random(seed)
+    rows = [REQUEST_HEADER]
+    first_day = datetime(2024, 1, 1)
+    for number in range(1, count + 1):
+        request_type = rng.choice(list(REQUEST_TYPES))
+        submitted_at = first_day + timedelta(minutes=number * (2 * 365 * 24 * 60) // (count + 1))
+        rows.append([
+            f"REQ-LTV{number:05d}", f"Volunteer {number}", "Female", f"volunteer{number}@example.com",
+            f"+91{fake_phone_number(rng)}", rng.choice(VOLUNTEER_CATEGORIES), request_type,
+            rng.choice(REQUEST_TYPES[request_type]), "None", "None", "Benchmark request", str(submitted_at),
+        ])
+    return rows
+
+
+def default_templates():
+    return [
+        TEMPLATE_HEADER,
+        ["Reach Out to Add Credentials Message", "Please visit counter 23/24 at Welcome Point."],
+        ["Step Out Request Default Message", "Please ask your coordinator for approval. Your request ID: {request_id}"],
+    ]
+
+
+# Build a fake client holding the three worksheets the portal reads
+def build_fake_client(participants=1000, requests_count=1000, **backend_options):
+    backend = FakeBackend(**backend_options)
+    spreadsheet = FakeSpreadsheet(backend, [
+        FakeWorksheet(backend, "Volunteer Details", generate_participants(participants)),
+        FakeWorksheet(backend, "Requests", generate_requests(requests_count)),
+        FakeWorksheet(backend, "Message Templates", default_templates()),
+    ])
+    return FakeClient(backend, spreadsheet)
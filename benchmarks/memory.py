@@ -0,0 +1,99 @@
+import argparse
+import gc
+import json
+import sys
+import tempfile
+import tracemalloc
+
+from benchmarks.run_benchmarks import SHEET_URL, Harness, configure_environment
+
+# Memory report for sizing containers. For each participant volume it measures,
+# with tracemalloc, the Python memory the portal holds once for the whole process
+# (worksheet snapshots, participant index, caches) and what every additional
+# session adds on top, then estimates the total for a planned number of sessions.
+# The fake sheet itself is allocated before tracing starts and is not counted.
+#
+#   python -m benchmarks.memory --sizes 10000 100000 1000000 --plan-sessions 200
+
+MB = 1024 * 1024
+
+
+def traced_bytes():
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+# Resident set size of this process, for comparison with the traced numbers
+def rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure(size, sessions, plan_sessions):
+    from portal.sheets_data import get_data_layer
+    from portal.storage import STORAGE_ENGINE, get_storage
+
+    # Only full runs here, and the pages kept for fragment reruns would count as session memory
+    harness = Harness(size, fragment_reruns=False)
+    emails = [harness.rng.choice(harness.participants)[2] for _ in range(sessions + 1)]
+
+    def open_session(email):
+        at = harness.session()
+        at.run()
+        at.text_input[0].input(email).run()
+        return at
+
+    tracemalloc.start()
+    baseline = traced_bytes()
+    alive = [open_session(emails[0])]
+    shared = traced_bytes() - baseline
+
+    before_sessions = traced_bytes()
+    alive.extend(open_session(email) for email in emails[1:])
+    per_session = (traced_bytes() - before_sessions) / max(sessions, 1)
+    tracemalloc.stop()
+
+    report = {
+        "shared_mb": round(shared / MB, 2),
+        "per_session_kb": round(per_session / 1024, 1),
+        "planned_sessions": plan_sessions,
+        "planned_total_mb": round((shared + plan_sessions * per_session) / MB, 1),
+        "rss_mb": round(rss_bytes() / MB, 1),
+    }
+    storage = get_storage(STORAGE_ENGINE, get_data_layer(harness.creds, SHEET_URL))
+    if hasattr(storage, "participant_index"):
+        report["participant_index_mb"] = round(storage.participant_index().memory_bytes() / MB, 2)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report shared and per-session memory of the portal.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000], help="participant row counts")
+    parser.add_argument("--sessions", type=int, default=20, help="sessions opened to measure the per-session cost")
+    parser.add_argument("--plan-sessions", type=int, default=100, help="concurrent sessions to size the container for")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="portal-memory-") as workdir:
+        configure_environment(workdir)
+        for size in args.sizes:
+            results[str(size)] = measure(size, args.sessions, args.plan_sessions)
+            print(f"== {size} participants {json.dumps(results[str(size)])}", flush=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,374 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import weakref
+from urllib.parse import urlencode
+
+# Drives App.py headlessly through Streamlit's AppTest against the fake Sheets
+# backend and reports rerun throughput, latency percentiles and API calls per
+# rerun for each participant/request volume.
+#
+#   python -m benchmarks.run_benchmarks --sizes 10000 100000 1000000
+#   python -m benchmarks.run_benchmarks --save-baseline benchmarks/baseline.json
+#   python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(REPO_ROOT, "App.py")
+SHEET_URL = "https://docs.google.com/spreadsheets/d/17Jf186s0G5uQrT6itt8KuiP9GhJqVtyqREyc_kYFS9M/edit?gid=0#gid=0"
+
+# Latency metrics compared against a saved baseline
+REGRESSION_METRICS = ("p50_ms", "p95_ms", "script_p50_ms", "api_calls_per_rerun")
+
+# AppTest reruns the whole script after every interaction, while a browser reruns
+# only the st.fragment holding the widget that changed. Interactions are replayed the
+# browser's way: every run starts from the page shown before (its delta messages),
+# and a rerun scoped to a fragment replaces only that fragment's part of the page.
+_pages = weakref.WeakKeyDictionary()
+_fragment_reruns = weakref.WeakKeyDictionary()
+
+# Wall and CPU seconds spent running App.py itself, without AppTest's own per-run
+# setup: the work a Streamlit server does for each interaction
+_script_time = {"wall": 0.0, "cpu": 0.0}
+
+
+# Every file the portal keeps on disk, placed inside a throwaway directory
+def cache_paths(workdir):
+    return {
+        "PORTAL_PHONE_CACHE_PATH": os.path.join(workdir, "phone_numbers.sqlite3"),
+        "PORTAL_REQUEST_ID_DB": os.path.join(workdir, "request_ids.sqlite3"),
+        "PORTAL_SQLITE_PATH": os.path.join(workdir, "portal.sqlite3"),
+        "PORTAL_SUBMIT_JOURNAL_DIR": os.path.join(workdir, "journal"),
+    }
+
+
+# Keep every on-disk cache of the portal inside a throwaway directory
+def configure_environment(workdir):
+    for name, path in cache_paths(workdir).items():
+        os.environ.setdefault(name, path)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(durations, api_calls, script_times=(), script_cpu_times=()):
+    total = sum(durations)
+    result = {
+        "reruns": len(durations),
+        "reruns_per_sec": round(len(durations) / total, 2) if total else 0.0,
+        "p50_ms": round(percentile(durations, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(durations, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(durations, 0.99) * 1000, 2),
+        "api_calls_per_rerun": round(sum(api_calls) / len(api_calls), 3) if api_calls else 0.0,
+    }
+    if any(script_times):
+        result["script_p50_ms"] = round(percentile(script_times, 0.50) * 1000, 2)
+        result["script_p95_ms"] = round(percentile(script_times, 0.95) * 1000, 2)
+        result["script_cpu_ms_per_rerun"] = round(sum(script_cpu_times) / len(script_cpu_times) * 1000, 2)
+    return result
+
+
+# Make AppTest run scripts through a runner that supports fragment-scoped reruns
+def install_fragment_reruns():
+    from streamlit.runtime.scriptrunner import RerunData, ScriptRunnerEvent
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.runtime.scriptrunner_utils.script_requests import ScriptRequests
+    from streamlit.testing.v1 import app_test
+    from streamlit.testing.v1.element_tree import parse_tree_from_messages
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner, require_widgets_deltas
+
+    stopped = {
+        ScriptRunnerEvent.SCRIPT_STOPPED_WITH_SUCCESS,
+        ScriptRunnerEvent.SCRIPT_STOPPED_WITH_COMPILE_ERROR,
+        ScriptRunnerEvent.SCRIPT_STOPPED_FOR_RERUN,
+        ScriptRunnerEvent.FRAGMENT_STOPPED_WITH_SUCCESS,
+    }
+    # A server compiles App.py once; AppTest would compile it again for every run
+    script_cache = ScriptCache()
+
+    # Both events are sent from the script thread, so thread_time() is the script's CPU time
+    def time_script(sender, event, **kwargs):
+        if event == ScriptRunnerEvent.SCRIPT_STARTED:
+            sender.script_started = (time.perf_counter(), time.thread_time())
+        elif event in stopped and getattr(sender, "script_started", None):
+            wall, cpu = sender.script_started
+            _script_time["wall"] += time.perf_counter() - wall
+            _script_time["cpu"] += time.thread_time() - cpu
+            sender.script_started = None
+
+    class FragmentScriptRunner(LocalScriptRunner):
+        def run(self, widget_state=None, query_params=None, timeout=3, page_hash=""):
+            self.on_event.connect(time_script, weak=False)
+            self._script_cache = script_cache
+            fragment_id = _fragment_reruns.pop(self.session_state, None)
+            page = _pages.get(self.session_state, [])
+            if fragment_id:
+                # The fragment redraws its whole container, including fragments nested in it
+                container = min(
+                    (tuple(msg.metadata.delta_path) for msg in page if msg.delta.fragment_id == fragment_id),
+                    key=len, default=None,
+                )
+                if container is not None:
+                    page = [msg for msg in page if tuple(msg.metadata.delta_path[:len(container)]) != container]
+            # A full run clears these again; a fragment run keeps the ones outside the fragment
+            for msg in page:
+                self.forward_msg_queue.enqueue(msg)
+            # The runner starts out with a full rerun queued, which would absorb a fragment rerun
+            self._requests = ScriptRequests()
+            self.request_rerun(RerunData(
+                widget_states=widget_state,
+                query_string=urlencode(query_params or {}, doseq=True),
+                page_script_hash=page_hash,
+                fragment_id_queue=[fragment_id] if fragment_id else [],
+            ))
+            try:
+                if not self._script_thread:
+                    self.start()
+                require_widgets_deltas(self, timeout)
+            finally:
+                self.join()
+            # In page order, so elements outside the fragment keep their place in the tree
+            page = sorted((msg for msg in self.forward_msgs() if msg.HasField("delta")), key=lambda msg: list(msg.metadata.delta_path))
+            _pages[self.session_state] = page
+            return parse_tree_from_messages(page)
+
+    app_test.LocalScriptRunner = FragmentScriptRunner
+
+
+class Harness:
+    def __init__(self, size, latency=0.0, jitter=0.0, quota_error_rate=0.0, timeout=900, fragment_reruns=True):
+        from streamlit.testing.v1 import AppTest
+
+        from benchmarks.fake_sheets import build_fake_client
+        from portal import sheets_data
+
+        self.AppTest = AppTest
+        self.timeout = timeout
+        self.client = build_fake_client(size, size, latency=latency, jitter=jitter, quota_error_rate=quota_error_rate)
+        self.backend = self.client.backend
+        sheets_data.set_client_factory(lambda creds_info: self.client)
+        if fragment_reruns:
+            install_fragment_reruns()
+        # A distinct service account name gives every harness its own process-wide data layer
+        self.creds = {"client_email": f"benchmark-{size}-{id(self)}@example.com"}
+
+        participants = self.client.spreadsheet.worksheet("Volunteer Details").values[1:]
+        self.participants = participants
+        self.long_term = [row for row in participants if row[4] == "Long Term Department Support"]
+        self.rng = random.Random(size)
+
+    def session(self):
+        at = self.AppTest.from_file(APP_PATH, default_timeout=self.timeout)
+        at.secrets["gcp_service_account"] = self.creds
+        return at
+
+    # Run one interaction and return (seconds, Sheets API calls it made)
+    def timed(self, interaction):
+        calls_before = self.backend.total_calls
+        started = time.perf_counter()
+        interaction()
+        return time.perf_counter() - started, self.backend.total_calls - calls_before
+
+    def measure(self, interactions):
+        durations, api_calls, script_times, script_cpu_times = [], [], [], []
+        for interaction in interactions:
+            wall_before, cpu_before = _script_time["wall"], _script_time["cpu"]
+            duration, calls = self.timed(interaction)
+            durations.append(duration)
+            api_calls.append(calls)
+            script_times.append(_script_time["wall"] - wall_before)
+            script_cpu_times.append(_script_time["cpu"] - cpu_before)
+        return summarize(durations, api_calls, script_times, script_cpu_times)
+
+    # Rerun after `widget` changed: only its fragment if it is inside one, like a browser
+    def rerun(self, at, widget):
+        for msg in _pages.get(at._session_state, ()):
+            element = msg.delta.new_element
+            kind = element.WhichOneof("type")
+            if kind and getattr(getattr(element, kind), "id", None) == widget.id:
+                if msg.delta.fragment_id:
+                    _fragment_reruns[at._session_state] = msg.delta.fragment_id
+                break
+        return at.run()
+
+    def cold_start(self):
+        at = self.session()
+        duration, calls = self.timed(at.run)
+        return {"seconds": round(duration, 3), "api_calls": calls}
+
+    def email_lookup(self, iterations):
+        at = self.session()
+        at.run()
+        emails = [self.rng.choice(self.participants)[2] for _ in range(iterations)]
+        return self.measure(lambda email=email: self.rerun(at, at.text_input[0].input(email)) for email in emails)
+
+    def phone_lookup(self, iterations):
+        at = self.session()
+        at.run()
+        self.rerun(at, at.text_input[0].input("nobody@example.com"))
+        self.rerun(at, at.button[0].click())
+        phones = [self.rng.choice(self.participants)[3] for _ in range(iterations)]
+        return self.measure(lambda phone=phone: self.rerun(at, at.text_input[1].input(phone)) for phone in phones)
+
+    # A long-term volunteer who picked a request type, ready for the sub category
+    def request_session(self, request_type="Seva Team"):
+        at = self.session()
+        at.run()
+        self.rerun(at, at.text_input[0].input(self.rng.choice(self.long_term)[2]))
+        self.rerun(at, at.selectbox(key="request_type").select(request_type))
+        return at
+
+    def sub_category_changes(self, iterations):
+        at = self.request_session()
+        options = ["Seva Change", "Linga Seva", "Devi Seva", "Prana Danam", "Seva Affecting Health"]
+        return self.measure(
+            lambda option=options[i % len(options)]: self.rerun(at, at.selectbox(key="sub_category").select(option))
+            for i in range(iterations)
+        )
+
+    def date_changes(self, iterations):
+        at = self.request_session()
+        self.rerun(at, at.selectbox(key="sub_category").select("Linga Seva"))
+        today = datetime.date.today()
+        return self.measure(
+            lambda day=today + datetime.timedelta(days=i % 28 + 1): self.rerun(at, at.date_input[1].set_value(day))
+            for i in range(iterations)
+        )
+
+    def description_typing(self, iterations):
+        at = self.request_session("Health Team")
+        return self.measure(
+            lambda number=number: self.rerun(at, at.text_area(key="description").input(f"Feeling unwell since day {number}"))
+            for number in range(iterations)
+        )
+
+    # Submit latency is the rerun that acknowledges the request; saved latency runs until the row is in the sheet
+    def submit(self, iterations, save_timeout=120):
+        from portal.sheets_data import get_data_layer
+        from portal.storage import STORAGE_ENGINE, get_storage
+        from portal.submissions import get_submission_queue
+
+        at = self.session()
+        at.run()
+        at.text_input[0].input(self.rng.choice(self.long_term)[2]).run()
+        submission_queue = get_submission_queue(get_storage(STORAGE_ENGINE, get_data_layer(self.creds, SHEET_URL)))
+
+        durations, api_calls, saved = [], [], []
+        for number in range(iterations):
+            self.rerun(at, at.selectbox(key="request_type").select("Health Team"))
+            self.rerun(at, at.text_area(key="description").input(f"Benchmark submission {number}"))
+            submit_button = next(button for button in at.button if button.label == "Submit Request")
+            duration, calls = self.timed(lambda: self.rerun(at, submit_button.click()))
+            durations.append(duration)
+            api_calls.append(calls)
+
+            request_id = at.session_state["last_submission"]["request_id"]
+            status = submission_queue.status(request_id)
+            deadline = time.monotonic() + save_timeout
+            while status is not None and not status.done and time.monotonic() < deadline:
+                time.sleep(0.01)
+            if status is not None and status.saved_at:
+                saved.append(status.saved_at - status.queued_at)
+
+        result = summarize(durations, api_calls)
+        result["saved_p50_ms"] = round(percentile(saved, 0.50) * 1000, 2)
+        result["saved_p95_ms"] = round(percentile(saved, 0.95) * 1000, 2)
+        return result
+
+    # "Track my Request" lookups straight against the storage backend: the first one
+    # reads the Requests sheet, the rest are served from the request ID index
+    def track_lookup(self, iterations):
+        from portal.sheets_data import get_data_layer
+        from portal.storage import STORAGE_ENGINE, get_storage
+
+        storage = get_storage(STORAGE_ENGINE, get_data_layer(self.creds, SHEET_URL))
+        request_ids = [row[0] for row in self.client.spreadsheet.worksheet("Requests").values[1:]]
+        build_seconds, build_calls = self.timed(lambda: storage.request_details(request_ids[0]))
+        lookups = [self.rng.choice(request_ids) for _ in range(iterations)]
+        result = self.measure(lambda request_id=request_id: storage.request_details(request_id) for request_id in lookups)
+        result["index_build_ms"] = round(build_seconds * 1000, 2)
+        return result
+
+
+def run(sizes, iterations, latency, jitter, quota_error_rate):
+    results = {}
+    for size in sizes:
+        print(f"== {size} participants / {size} requests", flush=True)
+        harness = Harness(size, latency, jitter, quota_error_rate)
+        results[str(size)] = {
+            "cold_start": harness.cold_start(),
+            "email_lookup": harness.email_lookup(iterations),
+            "phone_lookup": harness.phone_lookup(iterations),
+            "sub_category_changes": harness.sub_category_changes(iterations),
+            "date_changes": harness.date_changes(iterations),
+            "description_typing": harness.description_typing(iterations),
+            "submit": harness.submit(max(1, iterations // 3)),
+            "track_lookup": harness.track_lookup(iterations),
+        }
+        for scenario, metrics in results[str(size)].items():
+            print(f"   {scenario:22} {json.dumps(metrics)}", flush=True)
+    return results
+
+
+# Report every metric that got worse than the baseline by more than `tolerance`
+def compare(results, baseline, tolerance):
+    regressions = []
+    for size, scenarios in results.items():
+        for scenario, metrics in scenarios.items():
+            expected = baseline.get(size, {}).get(scenario, {})
+            for metric in REGRESSION_METRICS:
+                if metric not in metrics or not expected.get(metric):
+                    continue
+                # Small absolute differences are noise, whatever the ratio
+                if metrics[metric] > expected[metric] * (1 + tolerance) and metrics[metric] - expected[metric] > 1:
+                    regressions.append(f"{size}/{scenario}/{metric}: {expected[metric]} -> {metrics[metric]}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark App.py reruns against a fake Google Sheets backend.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="participant and request row counts to benchmark")
+    parser.add_argument("--iterations", type=int, default=30, help="reruns measured per scenario")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every fake API call")
+    parser.add_argument("--jitter", type=float, default=0.02, help="random extra seconds per fake API call")
+    parser.add_argument("--quota-error-rate", type=float, default=0.0, help="fraction of fake API calls failing with 429")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--save-baseline", help="write results as the new baseline to this file")
+    parser.add_argument("--baseline", help="compare results against this baseline and fail on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown against the baseline")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="portal-bench-") as workdir:
+        configure_environment(workdir)
+        results = run(args.sizes, args.iterations, args.latency, args.jitter, args.quota_error_rate)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for regression in regressions:
+                print(f"   {regression}")
+            return 1
+        print("No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
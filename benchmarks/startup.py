@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.run_benchmarks import cache_paths
+
+# Startup-time budget for App.py. Each sample runs in a fresh interpreter and measures:
+#   import_ms     importing everything App.py imports
+#   cold_run_ms   the first script run of a new process (fake Sheets backend, no latency)
+#   warm_p95_ms   later reruns of the same session
+# It then repeats the cold run with --latency seconds added to every fake API call;
+# the extra time divided by the latency is the number of sequential round trips
+# before first paint (cold_round_trips), which should stay at about one.
+# It fails when a median exceeds its budget or a lazily loaded module was imported anyway.
+#
+#   python -m benchmarks.startup
+#   python -m benchmarks.startup --cold-budget-ms 1500 --warm-budget-ms 60
+#   python -m benchmarks.startup --latency 0.5 --max-cold-round-trips 1.5
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be loaded by a first run that never reaches the phone lookup
+LAZY_MODULES = ("phonenumbers", "pandas", "numpy", "emoji")
+
+
+def measure_child(participants, reruns, latency=0.0):
+    started = time.perf_counter()
+    import streamlit  # noqa: F401
+
+    import portal.country_codes  # noqa: F401
+    import portal.instrumentation  # noqa: F401
+    import portal.phones  # noqa: F401
+    import portal.request_ids  # noqa: F401
+    import portal.sheets_data  # noqa: F401
+    import portal.storage  # noqa: F401
+    import portal.submissions  # noqa: F401
+    import_ms = (time.perf_counter() - started) * 1000
+
+    from streamlit.testing.v1 import AppTest
+
+    from benchmarks.fake_sheets import build_fake_client
+
+    client = build_fake_client(participants, participants, latency=latency)
+    portal.sheets_data.set_client_factory(lambda creds_info: client)
+
+    at = AppTest.from_file(os.path.join(REPO_ROOT, "App.py"), default_timeout=600)
+    at.secrets["gcp_service_account"] = {"client_email": "startup@example.com"}
+    started = time.perf_counter()
+    at.run()
+    cold_run_ms = (time.perf_counter() - started) * 1000
+    lazy_loaded = [module for module in LAZY_MODULES if module in sys.modules]
+
+    warm = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        at.run()
+        warm.append((time.perf_counter() - started) * 1000)
+    warm.sort()
+
+    return {
+        "import_ms": round(import_ms, 1),
+        "cold_run_ms": round(cold_run_ms, 1),
+        "warm_p50_ms": round(warm[len(warm) // 2], 1),
+        "warm_p95_ms": round(warm[min(len(warm) - 1, int(0.95 * len(warm)))], 1),
+        "lazy_modules_loaded": lazy_loaded,
+    }
+
+
+def run_sample(participants, reruns, latency=0.0):
+    with tempfile.TemporaryDirectory(prefix="portal-startup-") as workdir:
+        env = dict(os.environ)
+        for name, path in cache_paths(workdir).items():
+            env.setdefault(name, path)
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup", "--child",
+             "--participants", str(participants), "--reruns", str(reruns), "--latency", str(latency)],
+            cwd=REPO_ROOT, env=env, check=True, capture_output=True, text=True,
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure and enforce the App.py startup-time budget.")
+    parser.add_argument("--samples", type=int, default=3, help="fresh processes to measure")
+    parser.add_argument("--participants", type=int, default=10_000, help="rows in the fake participant sheet")
+    parser.add_argument("--reruns", type=int, default=20, help="warm reruns measured per process")
+    parser.add_argument("--import-budget-ms", type=float, default=float(os.environ.get("PORTAL_IMPORT_BUDGET_MS", "1500")))
+    parser.add_argument("--cold-budget-ms", type=float, default=float(os.environ.get("PORTAL_COLD_START_BUDGET_MS", "2000")))
+    parser.add_argument("--warm-budget-ms", type=float, default=float(os.environ.get("PORTAL_WARM_RERUN_BUDGET_MS", "100")))
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per fake API call for the round-trip check (0 skips it)")
+    parser.add_argument("--max-cold-round-trips", type=float,
+                        default=float(os.environ.get("PORTAL_COLD_START_ROUND_TRIPS", "1.5")))
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure_child(args.participants, args.reruns, args.latency)))
+        return 0
+
+    samples = [run_sample(args.participants, args.reruns) for _ in range(args.samples)]
+    medians = {
+        metric: round(statistics.median(sample[metric] for sample in samples), 1)
+        for metric in ("import_ms", "cold_run_ms", "warm_p50_ms", "warm_p95_ms")
+    }
+    if args.latency > 0:
+        slow_samples = [run_sample(args.participants, 1, args.latency) for _ in range(args.samples)]
+        slow_cold_ms = statistics.median(sample["cold_run_ms"] for sample in slow_samples)
+        medians["cold_round_trips"] = round((slow_cold_ms - medians["cold_run_ms"]) / (args.latency * 1000), 2)
+    lazy_loaded = sorted({module for sample in samples for module in sample["lazy_modules_loaded"]})
+    print(json.dumps({"medians": medians, "lazy_modules_loaded": lazy_loaded}, indent=2))
+
+    failures = []
+    for metric, budget in (("import_ms", args.import_budget_ms), ("cold_run_ms", args.cold_budget_ms),
+                           ("warm_p95_ms", args.warm_budget_ms)):
+        if medians[metric] > budget:
+            failures.append(f"{metric} {medians[metric]} ms exceeds budget of {budget} ms")
+    if "cold_round_trips" in medians and medians["cold_round_trips"] > args.max_cold_round_trips:
+        failures.append(f"cold start waits for {medians['cold_round_trips']} sequential round trips, "
+                        f"more than {args.max_cold_round_trips}")
+    if lazy_loaded:
+        failures.append(f"modules that should load lazily were imported on the first run: {', '.join(lazy_loaded)}")
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
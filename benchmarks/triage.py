@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks.run_benchmarks import SHEET_URL, configure_environment, percentile
+
+# Latency budget for the coordinator triage view. For each request volume it builds
+# the columnar snapshot from the fake "Requests" worksheet, then times random filter
+# combinations (request type, sub category, volunteer category, date range, page)
+# and the incremental refresh after new requests were appended. It fails when the
+# p95 of a filter query exceeds the budget.
+#
+#   python -m benchmarks.triage --sizes 100000 1000000
+#   python -m benchmarks.triage --budget-ms 100
+
+
+def random_query(rng, triage):
+    from portal.triage import FILTER_COLUMNS
+
+    filters = {}
+    for column in FILTER_COLUMNS:
+        options = triage.options(column)
+        if options and rng.random() < 0.5:
+            filters[column] = rng.sample(options, rng.randint(1, min(2, len(options))))
+    from_date = to_date = None
+    if rng.random() < 0.5:
+        from_date = date(2024, 1, 1) + timedelta(days=rng.randrange(700))
+        to_date = from_date + timedelta(days=rng.randrange(1, 120))
+    return filters, from_date, to_date, rng.choice([0, 0, 1, 5, 1000])
+
+
+def measure(size, iterations, appended):
+    from benchmarks.fake_sheets import build_fake_client, generate_requests
+    from portal.sheets_data import SheetsDataLayer, set_client_factory
+    from portal.storage import REQUESTS_SHEET, SheetsStorage
+
+    client = build_fake_client(10, size)
+    set_client_factory(lambda creds_info: client)
+    storage = SheetsStorage(SheetsDataLayer({"client_email": "triage@example.com"}, SHEET_URL))
+    rng = random.Random(size)
+
+    started = time.perf_counter()
+    triage = storage.request_triage()
+    build_ms = (time.perf_counter() - started) * 1000
+
+    durations = []
+    for _ in range(iterations):
+        filters, from_date, to_date, page = random_query(rng, triage)
+        started = time.perf_counter()
+        triage.query(filters, from_date, to_date, page)
+        durations.append((time.perf_counter() - started) * 1000)
+
+    worksheet = client.open_by_url(SHEET_URL).worksheet(REQUESTS_SHEET)
+    new_rows = [[f"REQ-LTV{size + number:05d}"] + row[1:] for number, row in enumerate(generate_requests(appended, seed=size)[1:], 1)]
+    worksheet.append_rows(new_rows)
+    started = time.perf_counter()
+    storage.request_triage()
+    refresh_ms = (time.perf_counter() - started) * 1000
+
+    return {
+        "rows": len(triage),
+        "build_ms": round(build_ms, 1),
+        "query_p50_ms": round(percentile(durations, 0.5), 2),
+        "query_p95_ms": round(percentile(durations, 0.95), 2),
+        "incremental_refresh_ms": round(refresh_ms, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the coordinator triage view's filter latency.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000], help="request row counts")
+    parser.add_argument("--iterations", type=int, default=200, help="filter queries measured per size")
+    parser.add_argument("--appended", type=int, default=100, help="rows appended before the incremental refresh")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("PORTAL_TRIAGE_BUDGET_MS", "100")))
+    args = parser.parse_args(argv)
+
+    failures = []
+    with tempfile.TemporaryDirectory(prefix="portal-triage-") as workdir:
+        configure_environment(workdir)
+        # Every refresh checks the revision, so the appended rows are picked up at once
+        os.environ.setdefault("PORTAL_REVISION_CHECK_INTERVAL", "0")
+        for size in args.sizes:
+            report = measure(size, args.iterations, args.appended)
+            print(f"== {size} requests {json.dumps(report)}", flush=True)
+            if report["query_p95_ms"] > args.budget_ms:
+                failures.append(f"{size} requests: query_p95_ms {report['query_p95_ms']} ms exceeds budget of {args.budget_ms} ms")
+
+    for failure in failures:
+        print(f"OVER BUDGET: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
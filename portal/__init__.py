@@ -0,0 +1 @@
+# Shared, process-wide building blocks for the Volunteer Support Portal (App.py).
@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from portal.instrumentation import sheets_call
+from portal.request_ids import format_request_id, parse_request_id
+
+# Old requests are moved out of the "Requests" worksheet into one archive worksheet
+# per month ("Requests 2025-01"), so the active worksheet, which the portal reads
+# and allocates IDs from, stays small. A manifest worksheet records which Request
+# ID range of each prefix went to which shard, so lookups still find archived
+# requests and ID counters never fall behind archived IDs.
+#
+#   python -m portal.archive --older-than-days 90 --dry-run
+#   python -m portal.archive --older-than-days 90 --credentials service_account.json
+
+ARCHIVE_MANIFEST_SHEET = "Request Archive"
+MANIFEST_COLUMNS = ("Shard", "Period", "Prefix", "First Number", "Last Number", "Rows", "Archived At")
+
+# Requests with one of these statuses are archived regardless of age
+CLOSED_STATUSES = {"closed", "resolved", "done", "rejected", "cancelled"}
+
+SHEET_URL = os.environ.get("PORTAL_SHEET_URL", "")
+
+
+# The rows to delete from "Requests" are no longer the ones that were archived
+class RowsChanged(Exception):
+    pass
+
+
+def shard_title(period):
+    return f"Requests {period}"
+
+
+# Timestamps are written as str(datetime.now()); None if one cannot be read
+def parse_timestamp(timestamp):
+    try:
+        return datetime.fromisoformat(timestamp.strip())
+    except (AttributeError, ValueError):
+        return None
+
+
+# "2025-01-31 10:20:30.123456" -> "2025-01"
+def request_period(timestamp):
+    return parse_timestamp(timestamp).strftime("%Y-%m")
+
+
+class ManifestEntry:
+    __slots__ = ("shard", "period", "prefix", "first", "last", "rows")
+
+    def __init__(self, shard, period, prefix, first, last, rows):
+        self.shard = shard
+        self.period = period
+        self.prefix = prefix
+        self.first = first
+        self.last = last
+        self.rows = rows
+
+    def as_row(self, archived_at):
+        return [self.shard, self.period, self.prefix, self.first, self.last, self.rows, archived_at]
+
+
+# Request ID ranges per archive shard, read from the manifest worksheet
+class ArchiveManifest:
+    def __init__(self, entries=()):
+        self.entries = tuple(entries)
+        self._by_prefix = {}
+        for entry in self.entries:
+            self._by_prefix.setdefault(entry.prefix, []).append(entry)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        entries = []
+        for row in snapshot.rows:
+            record = dict(zip(snapshot.header, row))
+            try:
+                entries.append(ManifestEntry(
+                    record["Shard"], record["Period"], record["Prefix"],
+                    int(record["First Number"]), int(record["Last Number"]), int(record["Rows"] or 0),
+                ))
+            except (KeyError, ValueError):
+                continue
+        return cls(entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Archive worksheets whose ID range covers a request ID, in manifest order. Ranges
+    # of different months overlap when IDs were not handed out in date order (backdated
+    # imports, IDs that filled gaps), so the ID may be in any of them.
+    def shards_for(self, request_id):
+        parsed = parse_request_id(str(request_id).strip().upper())
+        if parsed is None:
+            return []
+        prefix, number = parsed
+        shards = [entry.shard for entry in self._by_prefix.get(prefix, ()) if entry.first <= number <= entry.last]
+        return list(dict.fromkeys(shards))
+
+    # Highest archived ID per prefix, for ID allocator recovery
+    def last_request_ids(self):
+        highest = {}
+        for entry in self.entries:
+            highest[entry.prefix] = max(highest.get(entry.prefix, 0), entry.last)
+        return [format_request_id(prefix, number) for prefix, number in highest.items()]
+
+
+# The leading rows to archive: old or closed requests, stopping at the first row
+# that has to stay. Only a prefix is ever moved, so rows appended while archiving
+# are never touched.
+def archivable_rows(header, rows, cutoff):
+    timestamp_index = header.index("Timestamp")
+    status_index = header.index("Status") if "Status" in header else None
+    count = 0
+    for row in rows:
+        timestamp = row[timestamp_index] if timestamp_index < len(row) else ""
+        status = row[status_index].strip().casefold() if status_index is not None and status_index < len(row) else ""
+        submitted_at = parse_timestamp(timestamp)
+        if submitted_at is None or parse_request_id(row[0] if row else "") is None:
+            break
+        if not (submitted_at < cutoff or status in CLOSED_STATUSES):
+            break
+        count += 1
+    return rows[:count]
+
+
+# Group rows by month and compute the manifest entries describing them
+def plan_shards(rows, timestamp_index):
+    periods = {}
+    for row in rows:
+        periods.setdefault(request_period(row[timestamp_index]), []).append(row)
+    shards = {shard_title(period): shard_rows for period, shard_rows in periods.items()}
+    entries = []
+    for period, shard_rows in periods.items():
+        title = shard_title(period)
+        numbers = {}
+        for row in shard_rows:
+            prefix, number = parse_request_id(row[0])
+            numbers.setdefault(prefix, []).append(number)
+        for prefix, values in sorted(numbers.items()):
+            entries.append(ManifestEntry(title, period, prefix, min(values), max(values), len(values)))
+    return shards, entries
+
+
+def _worksheet_or_create(spreadsheet, title, header):
+    from gspread.exceptions import WorksheetNotFound
+
+    try:
+        with sheets_call("worksheet"):
+            return spreadsheet.worksheet(title), False
+    except WorksheetNotFound:
+        with sheets_call("add_worksheet", "write"):
+            worksheet = spreadsheet.add_worksheet(title, rows=1000, cols=len(header))
+        with sheets_call("append_rows", "write"):
+            worksheet.append_rows([list(header)])
+        return worksheet, True
+
+
+# Move old/closed requests from the active worksheet into monthly archive shards.
+# Safe to re-run after a failure: rows already present in a shard are not appended
+# again, and rows are only removed from "Requests" once shards and manifest are written.
+# Raises RowsChanged, deleting nothing, when rows were edited or removed meanwhile.
+def archive_requests(data_layer, cutoff, requests_sheet="Requests", dry_run=False):
+    spreadsheet = data_layer.spreadsheet
+    requests_worksheet = data_layer.worksheet(requests_sheet)
+    with sheets_call("get_all_values"):
+        values = requests_worksheet.get_all_values()
+    if not values:
+        return {"archived_rows": 0, "shards": {}}
+    header, rows = values[0], values[1:]
+    rows = archivable_rows(header, rows, cutoff)
+    shards, entries = plan_shards(rows, header.index("Timestamp"))
+    summary = {"archived_rows": len(rows), "shards": {title: len(shard_rows) for title, shard_rows in shards.items()}}
+    if dry_run or not rows:
+        return summary
+
+    for title, shard_rows in shards.items():
+        worksheet, created = _worksheet_or_create(spreadsheet, title, header)
+        existing = set()
+        if not created:
+            with sheets_call("values_get"):
+                existing = {row[0] for row in worksheet.get("A2:A") if row}
+        pending = [row for row in shard_rows if row[0] not in existing]
+        if pending:
+            with sheets_call("append_rows", "write"):
+                worksheet.append_rows(pending)
+
+    manifest, _ = _worksheet_or_create(spreadsheet, ARCHIVE_MANIFEST_SHEET, MANIFEST_COLUMNS)
+    with sheets_call("get_all_values"):
+        recorded = {tuple(row[:5]) for row in manifest.get_all_values()[1:]}
+    archived_at = str(datetime.now())
+    new_entries = [
+        entry.as_row(archived_at) for entry in entries
+        if (entry.shard, entry.period, entry.prefix, str(entry.first), str(entry.last)) not in recorded
+    ]
+    if new_entries:
+        with sheets_call("append_rows", "write"):
+            manifest.append_rows(new_entries)
+
+    # Header is row 1, so the archived rows are rows 2 .. len(rows) + 1. Rows are deleted
+    # by position, so their Request IDs are read again first: an edit or removal since
+    # they were read would otherwise delete rows that were never archived.
+    with sheets_call("values_get"):
+        current = [row[0] if row else "" for row in requests_worksheet.get(f"A2:A{len(rows) + 1}")]
+    if current != [row[0] for row in rows]:
+        raise RowsChanged(f"'{requests_sheet}' changed while archiving; nothing was deleted, please run it again")
+    with sheets_call("delete_rows", "write"):
+        requests_worksheet.delete_rows(2, len(rows) + 1)
+    data_layer.invalidate()
+    return summary
+
+
+def main(argv=None):
+    from portal.sheets_data import SheetsDataLayer
+
+    parser = argparse.ArgumentParser(description="Archive old or closed requests into monthly shards.")
+    parser.add_argument("--older-than-days", type=int, default=90, help="archive requests older than this")
+    parser.add_argument("--sheet-url", default=SHEET_URL, required=not SHEET_URL, help="Google Sheet URL (or PORTAL_SHEET_URL)")
+    parser.add_argument("--credentials", default="service_account.json", help="service account JSON file")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be archived")
+    args = parser.parse_args(argv)
+
+    with open(args.credentials) as f:
+        creds_info = json.load(f)
+    cutoff = datetime.now() - timedelta(days=args.older_than_days)
+    started = time.perf_counter()
+    try:
+        summary = archive_requests(SheetsDataLayer(creds_info, args.sheet_url), cutoff, dry_run=args.dry_run)
+    except RowsChanged as error:
+        print(str(error), file=sys.stderr)
+        return 1
+    summary["seconds"] = round(time.perf_counter() - started, 1)
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
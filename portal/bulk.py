@@ -0,0 +1,287 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+
+from portal.archive import SHEET_URL
+from portal.instrumentation import metrics
+from portal.phones import normalize_stored_phone_numbers
+from portal.request_ids import request_prefix
+from portal.request_types import DATE_REQUIRED_SUB_CATEGORIES, request_types, sub_categories
+from portal.storage import STORAGE_ENGINE, get_storage
+from portal.submissions import MAX_ATTEMPTS, backoff_delay, is_retryable_error, may_have_been_written
+from portal.triage import FILTER_COLUMNS
+
+# Bulk import and export of requests, e.g. for paper forms collected while the
+# portal was offline. The CSV is read in batches of BATCH_ROWS: every batch is
+# validated with the same rules as the form, gets its Request IDs as one block per
+# prefix and is written with a single append. Memory stays bounded by the batch
+# size, and a bad row is reported in the report file instead of stopping the import.
+#
+#   python -m portal.bulk import paper_forms.csv --dry-run
+#   python -m portal.bulk import paper_forms.csv --credentials service_account.json
+#   python -m portal.bulk export seva.csv --request-type "Seva Team" --from 2025-01-01
+#
+# Request IDs come from the same counters as the portal's, so run it where the portal
+# runs (same PORTAL_REQUEST_ID_DB) or with PORTAL_SHARED_CACHE set.
+
+# Columns read from an import CSV; Phone Number is only used when Email ID is empty,
+# and Timestamp (when the paper form was filled in) defaults to the time of the import
+IMPORT_COLUMNS = ("Email ID", "Phone Number", "Request Type", "Sub Category", "From Date", "To Date", "Description", "Timestamp")
+
+# Rows validated, given IDs and appended together
+BATCH_ROWS = int(os.environ.get("PORTAL_IMPORT_BATCH_ROWS", "5000"))
+
+# The form stores dates as dd/mm/yyyy; ISO dates are accepted too
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d")
+TIMESTAMP_FORMATS = ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%d/%m/%Y %H:%M", "%Y-%m-%d", "%d/%m/%Y")
+
+# Row numbers are spreadsheet rows of the CSV: row 1 is the header
+REPORT_COLUMNS = ("Row", "Request ID", "Error")
+
+
+# The same few dates come back on most rows, so each distinct text is parsed once
+@lru_cache(maxsize=4096)
+def parse_datetime(text, formats):
+    for date_format in formats:
+        try:
+            return datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    raise ValueError(f"'{text}' is not a date")
+
+
+@lru_cache(maxsize=4096)
+def stored_date(text):
+    return parse_datetime(text, DATE_FORMATS).strftime("%d/%m/%Y")
+
+
+# Stripped text of one CSV field; csv.DictReader fills the fields missing from a short row with None
+def field(record, column):
+    return (record.get(column) or "").strip()
+
+
+# Stored Request row (without its Request ID) for one CSV record, or ValueError
+def request_row(participant, record, imported_at):
+    request_type = field(record, "Request Type")
+    if request_type not in request_types(participant.category):
+        raise ValueError(f"Request Type '{request_type}' is not available to {participant.category or 'this participant'}")
+
+    sub_category = field(record, "Sub Category")
+    options = sub_categories(request_type, participant.category)
+    if options and sub_category not in options:
+        raise ValueError(f"Sub Category '{sub_category}' is not one of: {', '.join(options)}")
+    if not options and sub_category:
+        raise ValueError(f"{request_type} has no sub categories")
+
+    timestamp = field(record, "Timestamp")
+    submitted_at = parse_datetime(timestamp, TIMESTAMP_FORMATS) if timestamp else imported_at
+
+    from_date_text = to_date_text = "None"
+    if sub_category in DATE_REQUIRED_SUB_CATEGORIES:
+        from_date, to_date = field(record, "From Date"), field(record, "To Date")
+        # The form only asks for the To Date of an extension; its From Date is the day it was submitted
+        if sub_category == "Extension Request" and not from_date:
+            from_date = submitted_at.strftime("%d/%m/%Y")
+        if not from_date or not to_date:
+            raise ValueError(f"{sub_category} needs both From Date and To Date")
+        from_date_text = stored_date(from_date)
+        to_date_text = stored_date(to_date)
+
+    description = field(record, "Description")
+    if not description:
+        raise ValueError("Description is empty")
+
+    return [
+        participant.name, participant.gender, participant.email, participant.phone, participant.category,
+        request_type, sub_category or "None", from_date_text, to_date_text, description, str(submitted_at),
+    ]
+
+
+# Validate one CSV record; returns (row or None, error or None)
+def validate_record(storage, record, phone, imported_at):
+    email = field(record, "Email ID")
+    if email:
+        participant = storage.participant_by_email(email)
+        missing = f"No participant with Email ID '{email}'"
+    else:
+        participant = storage.participant_by_phone(phone) if phone else None
+        missing = f"No participant with Phone Number '{field(record, 'Phone Number')}'"
+    if participant is None:
+        return None, missing if email or phone else "Email ID or a valid Phone Number is required"
+    try:
+        return request_row(participant, record, imported_at), None
+    except ValueError as error:
+        return None, str(error)
+
+
+# Validate a batch of CSV records; returns (row or None, error or None) per record.
+# Anything unexpected is reported for its row too, so one odd row never stops the import.
+def validate_batch(storage, records, imported_at):
+    # Phone numbers are only looked at for rows without an email, and normalized together
+    by_phone = [i for i, record in enumerate(records) if not field(record, "Email ID")]
+    phones = normalize_stored_phone_numbers([field(records[i], "Phone Number") for i in by_phone], persist=False)
+    phone_of = dict(zip(by_phone, phones))
+
+    results = []
+    for i, record in enumerate(records):
+        try:
+            results.append(validate_record(storage, record, phone_of.get(i), imported_at))
+        except Exception as error:
+            metrics.increment("bulk_import.row_errors")
+            results.append((None, f"Could not be validated: {type(error).__name__}: {error}"))
+    return results
+
+
+class BatchNotSaved(Exception):
+    def __init__(self, error, stored):
+        super().__init__(str(error))
+        # Request IDs of the batch that did reach the sheet anyway
+        self.stored = stored
+
+
+# Request IDs of `rows` already stored; empty if that cannot be told right now
+def _stored(storage, rows):
+    try:
+        return storage.stored_request_ids([row[0] for row in rows])
+    except Exception:
+        return set()
+
+
+# Append rows in one call, retrying quota and transient errors like the submission writer.
+# A timeout or 5xx may come back after the rows were written, so before the next attempt
+# the rows already stored are dropped, as SubmissionQueue does. Raises BatchNotSaved.
+def append_batch(storage, rows):
+    stored = set()
+    uncertain = False
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            if uncertain:
+                stored |= storage.stored_request_ids([row[0] for row in rows if row[0] not in stored])
+                uncertain = False
+            remaining = [row for row in rows if row[0] not in stored]
+            if remaining:
+                storage.append_requests(remaining)
+            return
+        except Exception as error:
+            uncertain = uncertain or may_have_been_written(error)
+            if not is_retryable_error(error) or attempt + 1 == MAX_ATTEMPTS:
+                if uncertain:
+                    stored |= _stored(storage, [row for row in rows if row[0] not in stored])
+                raise BatchNotSaved(error, stored) from error
+            metrics.increment("bulk_import.retries")
+            time.sleep(backoff_delay(attempt))
+
+
+# Import CSV records (dicts) and write one report row per record. Returns counts.
+def import_requests(storage, records, report, batch_rows=BATCH_ROWS, dry_run=False):
+    imported_at = datetime.now()
+    summary = {"rows": 0, "imported": 0, "failed": 0}
+    numbered = enumerate(records, 2)
+    while True:
+        batch = list(islice(numbered, batch_rows))
+        if not batch:
+            return summary
+        results = validate_batch(storage, [record for _, record in batch], imported_at)
+        valid = [i for i, (row, _) in enumerate(results) if row is not None]
+
+        request_ids = {}
+        error = None
+        stored = set()
+        if valid and not dry_run:
+            # One block of consecutive IDs per prefix
+            prefixes = {}
+            for i in valid:
+                prefixes.setdefault(request_prefix(results[i][0][4]), []).append(i)
+            for prefix, indexes in prefixes.items():
+                request_ids.update(zip(indexes, storage.reserve_request_ids(prefix, len(indexes))))
+            try:
+                append_batch(storage, [[request_ids[i]] + results[i][0] for i in valid])
+            except BatchNotSaved as append_error:
+                error = f"Not saved: {append_error}"
+                stored = append_error.stored
+
+        for i, (row_number, _) in enumerate(batch):
+            row_error = results[i][1] or (None if request_ids.get(i) in stored else error)
+            report.writerow({"Row": row_number, "Request ID": "" if row_error else request_ids.get(i, ""), "Error": row_error or ""})
+            summary["failed" if row_error else "imported"] += 1
+        summary["rows"] += len(batch)
+
+
+# Write the requests matching the filters as CSV, in sheet order. Returns the row count.
+def export_requests(storage, output, filters=None, from_date=None, to_date=None):
+    triage = storage.request_triage()
+    writer = csv.DictWriter(output, fieldnames=list(dict.fromkeys(triage.columns + ("Status",))))
+    writer.writeheader()
+    count = 0
+    for record in triage.matching(filters, from_date, to_date):
+        writer.writerow(record)
+        count += 1
+    return count
+
+
+def open_storage(args):
+    if STORAGE_ENGINE == "sqlite":
+        return get_storage(STORAGE_ENGINE)
+
+    from portal.sheets_data import get_data_layer
+
+    with open(args.credentials) as f:
+        creds_info = json.load(f)
+    return get_storage(STORAGE_ENGINE, get_data_layer(creds_info, args.sheet_url))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import or export requests as CSV.")
+    parser.add_argument("--sheet-url", default=SHEET_URL, help="Google Sheet URL (or PORTAL_SHEET_URL)")
+    parser.add_argument("--credentials", default="service_account.json", help="service account JSON file")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="import requests from a CSV file")
+    import_parser.add_argument("csv", help=f"CSV with columns {', '.join(IMPORT_COLUMNS)}")
+    import_parser.add_argument("--report", help="per-row results (default: <csv>.report.csv)")
+    import_parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help="rows validated and appended together")
+    import_parser.add_argument("--dry-run", action="store_true", help="only validate, write nothing")
+
+    export_parser = commands.add_parser("export", help="export requests to a CSV file")
+    export_parser.add_argument("csv", help="output file ('-' for stdout)")
+    for column in FILTER_COLUMNS:
+        export_parser.add_argument(f"--{column.lower().replace(' ', '-')}", action="append", default=[], metavar="VALUE",
+                                   help=f"only this {column} (repeatable)")
+    export_parser.add_argument("--from", dest="from_date", help="submitted on or after (YYYY-MM-DD)")
+    export_parser.add_argument("--to", dest="to_date", help="submitted on or before (YYYY-MM-DD)")
+    args = parser.parse_args(argv)
+    if STORAGE_ENGINE != "sqlite" and not args.sheet_url:
+        parser.error("--sheet-url (or PORTAL_SHEET_URL) is required")
+
+    storage = open_storage(args)
+    storage.refresh()
+    started = time.perf_counter()
+    if args.command == "import":
+        report_path = args.report or f"{os.path.splitext(args.csv)[0]}.report.csv"
+        with open(args.csv, newline="", encoding="utf-8-sig") as source, open(report_path, "w", newline="") as report_file:
+            report = csv.DictWriter(report_file, fieldnames=REPORT_COLUMNS)
+            report.writeheader()
+            summary = import_requests(storage, csv.DictReader(source), report, args.batch_rows, args.dry_run)
+        summary["report"] = report_path
+    else:
+        filters = {column: getattr(args, column.lower().replace(" ", "_")) for column in FILTER_COLUMNS}
+        from_date = datetime.strptime(args.from_date, "%Y-%m-%d").date() if args.from_date else None
+        to_date = datetime.strptime(args.to_date, "%Y-%m-%d").date() if args.to_date else None
+        if args.csv == "-":
+            summary = {"exported": export_requests(storage, sys.stdout, filters, from_date, to_date)}
+        else:
+            with open(args.csv, "w", newline="") as output:
+                summary = {"exported": export_requests(storage, output, filters, from_date, to_date)}
+    summary["seconds"] = round(time.perf_counter() - started, 1)
+    print(json.dumps(summary, indent=2), file=sys.stderr if args.csv == "-" else sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+# Generated by `python -m portal.generate_country_codes` from phonenumbers 9.0.41. Do not edit by hand.
+
+COUNTRY_CODE_MAP = {
+    "US (+1)": "1",
+    "RU (+7)": "7",
+    "EG (+20)": "20",
+    "ZA (+27)": "27",
+    "GR (+30)": "30",
+    "NL (+31)": "31",
+    "BE (+32)": "32",
+    "FR (+33)": "33",
+    "ES (+34)": "34",
+    "HU (+36)": "36",
+    "IT (+39)": "39",
+    "RO (+40)": "40",
+    "CH (+41)": "41",
+    "AT (+43)": "43",
+    "GB (+44)": "44",
+    "DK (+45)": "45",
+    "SE (+46)": "46",
+    "NO (+47)": "47",
+    "PL (+48)": "48",
+    "DE (+49)": "49",
+    "PE (+51)": "51",
+    "MX (+52)": "52",
+    "CU (+53)": "53",
+    "AR (+54)": "54",
+    "BR (+55)": "55",
+    "CL (+56)": "56",
+    "CO (+57)": "57",
+    "VE (+58)": "58",
+    "MY (+60)": "60",
+    "AU (+61)": "61",
+    "ID (+62)": "62",
+    "PH (+63)": "63",
+    "NZ (+64)": "64",
+    "SG (+65)": "65",
+    "TH (+66)": "66",
+    "JP (+81)": "81",
+    "KR (+82)": "82",
+    "VN (+84)": "84",
+    "CN (+86)": "86",
+    "TR (+90)": "90",
+    "IN (+91)": "91",
+    "PK (+92)": "92",
+    "AF (+93)": "93",
+    "LK (+94)": "94",
+    "MM (+95)": "95",
+    "IR (+98)": "98",
+    "SS (+211)": "211",
+    "MA (+212)": "212",
+    "DZ (+213)": "213",
+    "TN (+216)": "216",
+    "LY (+218)": "218",
+    "GM (+220)": "220",
+    "SN (+221)": "221",
+    "MR (+222)": "222",
+    "ML (+223)": "223",
+    "GN (+224)": "224",
+    "CI (+225)": "225",
+    "BF (+226)": "226",
+    "NE (+227)": "227",
+    "TG (+228)": "228",
+    "BJ (+229)": "229",
+    "MU (+230)": "230",
+    "LR (+231)": "231",
+    "SL (+232)": "232",
+    "GH (+233)": "233",
+    "NG (+234)": "234",
+    "TD (+235)": "235",
+    "CF (+236)": "236",
+    "CM (+237)": "237",
+    "CV (+238)": "238",
+    "ST (+239)": "239",
+    "GQ (+240)": "240",
+    "GA (+241)": "241",
+    "CG (+242)": "242",
+    "CD (+243)": "243",
+    "AO (+244)": "244",
+    "GW (+245)": "245",
+    "IO (+246)": "246",
+    "AC (+247)": "247",
+    "SC (+248)": "248",
+    "SD (+249)": "249",
+    "RW (+250)": "250",
+    "ET (+251)": "251",
+    "SO (+252)": "252",
+    "DJ (+253)": "253",
+    "KE (+254)": "254",
+    "TZ (+255)": "255",
+    "UG (+256)": "256",
+    "BI (+257)": "257",
+    "MZ (+258)": "258",
+    "ZM (+260)": "260",
+    "MG (+261)": "261",
+    "RE (+262)": "262",
+    "ZW (+263)": "263",
+    "NA (+264)": "264",
+    "MW (+265)": "265",
+    "LS (+266)": "266",
+    "BW (+267)": "267",
+    "SZ (+268)": "268",
+    "KM (+269)": "269",
+    "SH (+290)": "290",
+    "ER (+291)": "291",
+    "AW (+297)": "297",
+    "FO (+298)": "298",
+    "GL (+299)": "299",
+    "GI (+350)": "350",
+    "PT (+351)": "351",
+    "LU (+352)": "352",
+    "IE (+353)": "353",
+    "IS (+354)": "354",
+    "AL (+355)": "355",
+    "MT (+356)": "356",
+    "CY (+357)": "357",
+    "FI (+358)": "358",
+    "BG (+359)": "359",
+    "LT (+370)": "370",
+    "LV (+371)": "371",
+    "EE (+372)": "372",
+    "MD (+373)": "373",
+    "AM (+374)": "374",
+    "BY (+375)": "375",
+    "AD (+376)": "376",
+    "MC (+377)": "377",
+    "SM (+378)": "378",
+    "UA (+380)": "380",
+    "RS (+381)": "381",
+    "ME (+382)": "382",
+    "XK (+383)": "383",
+    "HR (+385)": "385",
+    "SI (+386)": "386",
+    "BA (+387)": "387",
+    "MK (+389)": "389",
+    "CZ (+420)": "420",
+    "SK (+421)": "421",
+    "LI (+423)": "423",
+    "FK (+500)": "500",
+    "BZ (+501)": "501",
+    "GT (+502)": "502",
+    "SV (+503)": "503",
+    "HN (+504)": "504",
+    "NI (+505)": "505",
+    "CR (+506)": "506",
+    "PA (+507)": "507",
+    "PM (+508)": "508",
+    "HT (+509)": "509",
+    "GP (+590)": "590",
+    "BO (+591)": "591",
+    "GY (+592)": "592",
+    "EC (+593)": "593",
+    "GF (+594)": "594",
+    "PY (+595)": "595",
+    "MQ (+596)": "596",
+    "SR (+597)": "597",
+    "UY (+598)": "598",
+    "CW (+599)": "599",
+    "TL (+670)": "670",
+    "NF (+672)": "672",
+    "BN (+673)": "673",
+    "NR (+674)": "674",
+    "PG (+675)": "675",
+    "TO (+676)": "676",
+    "SB (+677)": "677",
+    "VU (+678)": "678",
+    "FJ (+679)": "679",
+    "PW (+680)": "680",
+    "WF (+681)": "681",
+    "CK (+682)": "682",
+    "NU (+683)": "683",
+    "WS (+685)": "685",
+    "KI (+686)": "686",
+    "NC (+687)": "687",
+    "TV (+688)": "688",
+    "PF (+689)": "689",
+    "TK (+690)": "690",
+    "FM (+691)": "691",
+    "MH (+692)": "692",
+    "001 (+800)": "800",
+    "001 (+808)": "808",
+    "KP (+850)": "850",
+    "HK (+852)": "852",
+    "MO (+853)": "853",
+    "KH (+855)": "855",
+    "LA (+856)": "856",
+    "001 (+870)": "870",
+    "001 (+878)": "878",
+    "BD (+880)": "880",
+    "001 (+881)": "881",
+    "001 (+882)": "882",
+    "001 (+883)": "883",
+    "TW (+886)": "886",
+    "001 (+888)": "888",
+    "MV (+960)": "960",
+    "LB (+961)": "961",
+    "JO (+962)": "962",
+    "SY (+963)": "963",
+    "IQ (+964)": "964",
+    "KW (+965)": "965",
+    "SA (+966)": "966",
+    "YE (+967)": "967",
+    "OM (+968)": "968",
+    "PS (+970)": "970",
+    "AE (+971)": "971",
+    "IL (+972)": "972",
+    "BH (+973)": "973",
+    "QA (+974)": "974",
+    "BT (+975)": "975",
+    "MN (+976)": "976",
+    "NP (+977)": "977",
+    "001 (+979)": "979",
+    "TJ (+992)": "992",
+    "TM (+993)": "993",
+    "AZ (+994)": "994",
+    "GE (+995)": "995",
+    "KG (+996)": "996",
+    "UZ (+998)": "998",
+}
+
+COUNTRY_CODE_LABELS = tuple(COUNTRY_CODE_MAP)
+
+DEFAULT_COUNTRY = "IN (+91)"
+DEFAULT_COUNTRY_INDEX = COUNTRY_CODE_LABELS.index(DEFAULT_COUNTRY)
@@ -0,0 +1,134 @@
+from array import array
+from collections import Counter
+
+from portal.participants import normalize_email
+
+# Typo-tolerant email lookup backed by a character trigram index.
+#
+# An edit changes at most 4 trigrams of a padded string (a transposition touches
+# the trigrams over both characters), so an email within d edits of the query is
+# missing at most 4d of the query's trigrams. Reading only the m rarest posting
+# lists, a match must therefore appear in at least m - 4d of them. Those short
+# lists are counted to collect candidates, which are then checked with a cheap
+# trigram-overlap filter and the exact distance.
+
+MAX_DISTANCE = 2
+MAX_SUGGESTIONS = 3
+
+# Once the required rarest lists are read, keep reading more lists (which tightens
+# the filter) while their combined length stays under this many entries
+CANDIDATE_BUDGET = 20000
+
+_EMPTY = array("i")
+
+_PAD = "\x02"
+
+
+def _trigrams(text):
+    padded = f"{_PAD}{_PAD}{text}{_PAD}"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Optimal string alignment distance (Levenshtein plus adjacent transpositions),
+# giving up as soon as the distance must exceed `limit`
+def edit_distance(a, b, limit=MAX_DISTANCE):
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if previous_previous is not None and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return limit + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+# Hide most of the local part: ravi.kumar@gmail.com -> ra*******r@gmail.com
+def mask_email(email):
+    local, _, domain = email.partition("@")
+    if len(local) <= 3:
+        masked_local = local[:1] + "*" * max(len(local) - 1, 2)
+    else:
+        masked_local = local[:2] + "*" * (len(local) - 3) + local[-1]
+    return f"{masked_local}@{domain}" if domain else masked_local
+
+
+class EmailSearchIndex:
+    def __init__(self, emails):
+        self._emails = []
+        postings = {}
+        seen = set()
+        for email in emails:
+            key = normalize_email(email)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            email_id = len(self._emails)
+            self._emails.append(key)
+            for trigram in _trigrams(key):
+                posting = postings.get(trigram)
+                if posting is None:
+                    posting = postings[trigram] = array("i")
+                posting.append(email_id)
+        self._postings = postings
+
+    def __len__(self):
+        return len(self._emails)
+
+    # Closest stored emails as (distance, email), nearest first. Closer distances are
+    # tried first because they allow a much tighter candidate filter.
+    def search(self, query, limit=MAX_SUGGESTIONS, max_distance=MAX_DISTANCE):
+        query = normalize_email(query)
+        if not query:
+            return []
+        for distance in range(1, max_distance + 1):
+            matches = self._search_within(query, distance)
+            if matches:
+                return matches[:limit]
+        return []
+
+    def _search_within(self, query, max_distance):
+        query_trigrams = _trigrams(query)
+        slack = 4 * max_distance
+        # Too short to rule anything out by shared trigrams
+        if len(query_trigrams) <= slack:
+            return []
+
+        lists = sorted((self._postings.get(trigram, _EMPTY) for trigram in query_trigrams), key=len)
+        read = slack + 1
+        total = sum(len(posting) for posting in lists[:read])
+        while read < len(lists) and total + len(lists[read]) <= CANDIDATE_BUDGET:
+            total += len(lists[read])
+            read += 1
+
+        counts = Counter()
+        for posting in lists[:read]:
+            counts.update(posting)
+        needed = read - slack
+        min_shared = len(query_trigrams) - slack
+
+        matches = []
+        for email_id, count in counts.items():
+            if count < needed:
+                continue
+            email = self._emails[email_id]
+            if abs(len(email) - len(query)) > max_distance:
+                continue
+            if len(query_trigrams & _trigrams(email)) < min_shared:
+                continue
+            distance = edit_distance(query, email, max_distance)
+            if distance <= max_distance:
+                matches.append((distance, email))
+        matches.sort()
+        return matches
+
+    # Masked suggestions for a mistyped email, excluding an exact match
+    def suggest(self, query, limit=MAX_SUGGESTIONS):
+        return [mask_email(email) for distance, email in self.search(query, limit) if distance > 0]
@@ -0,0 +1,51 @@
+import os
+
+import phonenumbers
+
+# Regenerates portal/country_codes.py from phonenumbers' metadata, so the portal
+# never has to import phonenumbers or sort its tables just to render the selectbox.
+#
+#   python -m portal.generate_country_codes
+
+OUTPUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "country_codes.py")
+DEFAULT_COUNTRY = "IN (+91)"  # Default to India
+
+
+# Generate country code list (Without Flags)
+def get_country_code_map():
+    country_code_map = {}
+
+    for cc in sorted(phonenumbers.COUNTRY_CODE_TO_REGION_CODE.keys()):
+        regions = phonenumbers.COUNTRY_CODE_TO_REGION_CODE[cc]
+        if regions:
+            region = regions[0]  # Use the first region if multiple exist
+            key = f"{region} (+{cc})"
+            country_code_map[key] = str(cc)
+
+    return country_code_map
+
+
+def render_module(country_code_map):
+    lines = [
+        "# Generated by `python -m portal.generate_country_codes` from phonenumbers "
+        f"{phonenumbers.__version__}. Do not edit by hand.",
+        "",
+        "COUNTRY_CODE_MAP = {",
+    ]
+    lines += [f'    "{label}": "{code}",' for label, code in country_code_map.items()]
+    lines += [
+        "}",
+        "",
+        "COUNTRY_CODE_LABELS = tuple(COUNTRY_CODE_MAP)",
+        "",
+        f'DEFAULT_COUNTRY = "{DEFAULT_COUNTRY}"',
+        "DEFAULT_COUNTRY_INDEX = COUNTRY_CODE_LABELS.index(DEFAULT_COUNTRY)",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    with open(OUTPUT_PATH, "w") as f:
+        f.write(render_module(get_country_code_map()))
+    print(f"Wrote {OUTPUT_PATH}")
@@ -0,0 +1,268 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from portal.profiling import sheets_section
+from portal.rate_limit import MAX_WAIT, READ_PRIORITY, WRITE_PRIORITY, SheetsBusyError, get_scheduler
+
+# Process-wide spans, counters and Google API quota accounting. Recording a span
+# is a perf_counter pair, a bisect and a dict update under one lock, which is cheap
+# enough to leave enabled in production.
+
+# Write metrics as JSON to this file every METRICS_WRITE_INTERVAL seconds
+METRICS_FILE = os.environ.get("PORTAL_METRICS_FILE")
+METRICS_WRITE_INTERVAL = float(os.environ.get("PORTAL_METRICS_WRITE_INTERVAL", "15"))
+
+# Serve metrics over HTTP: /metrics (Prometheus text) and /metrics.json
+METRICS_PORT = os.environ.get("PORTAL_METRICS_PORT")
+
+# Show the debug panel to everyone, not only with ?debug=1
+DEBUG_PANEL = os.environ.get("PORTAL_DEBUG_PANEL", "") == "1"
+
+# Google Sheets API per-minute quotas for one service account
+READ_QUOTA_PER_MINUTE = int(os.environ.get("PORTAL_READ_QUOTA_PER_MINUTE", "300"))
+WRITE_QUOTA_PER_MINUTE = int(os.environ.get("PORTAL_WRITE_QUOTA_PER_MINUTE", "300"))
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Minutes of quota history kept
+QUOTA_HISTORY_MINUTES = 60
+
+
+class _Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    # Upper bound of the bucket holding the given fraction of observations
+    def quantile(self, fraction):
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = defaultdict(_Histogram)
+        self._counters = defaultdict(int)
+        self._gauges = {}
+        # kind -> deque of [minute, calls]
+        self._quota = defaultdict(deque)
+        self.started_at = time.time()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            self._histograms[name].observe(seconds)
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    # Count one Google API request against the per-minute quota of its kind
+    def record_api_call(self, operation, kind):
+        minute = int(time.time() // 60)
+        with self._lock:
+            self._counters[f"sheets.{kind}.{operation}"] += 1
+            window = self._quota[kind]
+            if window and window[-1][0] == minute:
+                window[-1][1] += 1
+            else:
+                window.append([minute, 1])
+                while len(window) > QUOTA_HISTORY_MINUTES:
+                    window.popleft()
+
+    def quota_used(self, kind):
+        minute = int(time.time() // 60)
+        with self._lock:
+            window = self._quota.get(kind)
+            return window[-1][1] if window and window[-1][0] == minute else 0
+
+    def snapshot(self):
+        with self._lock:
+            spans = {
+                name: {
+                    "count": histogram.count,
+                    "total_s": round(histogram.total, 6),
+                    "mean_ms": round(histogram.total / histogram.count * 1000, 3) if histogram.count else 0.0,
+                    "p50_ms": round(histogram.quantile(0.50) * 1000, 3),
+                    "p95_ms": round(histogram.quantile(0.95) * 1000, 3),
+                    "p99_ms": round(histogram.quantile(0.99) * 1000, 3),
+                    "max_ms": round(histogram.max * 1000, 3),
+                }
+                for name, histogram in self._histograms.items()
+            }
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            quota_history = {kind: [list(entry) for entry in window] for kind, window in self._quota.items()}
+        return {
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "spans": spans,
+            "counters": counters,
+            "gauges": gauges,
+            "quota": {
+                "read_per_minute": self.quota_used("read"),
+                "write_per_minute": self.quota_used("write"),
+                "read_limit_per_minute": READ_QUOTA_PER_MINUTE,
+                "write_limit_per_minute": WRITE_QUOTA_PER_MINUTE,
+                "history": quota_history,
+            },
+        }
+
+    def prometheus(self):
+        lines = []
+        with self._lock:
+            lines.append("# TYPE portal_span_seconds histogram")
+            for name, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append(f'portal_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'portal_span_seconds_bucket{{span="{name}",le="+Inf"}} {histogram.count}')
+                lines.append(f'portal_span_seconds_sum{{span="{name}"}} {histogram.total:.6f}')
+                lines.append(f'portal_span_seconds_count{{span="{name}"}} {histogram.count}')
+            lines.append("# TYPE portal_events_total counter")
+            for name, value in sorted(self._counters.items()):
+                lines.append(f'portal_events_total{{name="{name}"}} {value}')
+            lines.append("# TYPE portal_gauge gauge")
+            for name, value in sorted(self._gauges.items()):
+                lines.append(f'portal_gauge{{name="{name}"}} {value}')
+        lines.append("# TYPE portal_sheets_quota_used gauge")
+        for kind in ("read", "write"):
+            lines.append(f'portal_sheets_quota_used{{kind="{kind}"}} {self.quota_used(kind)}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# Time a named section of code
+@contextmanager
+def span(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe(name, time.perf_counter() - started)
+
+
+# Start/stop timer for sections that cannot be wrapped in a with block (e.g. a whole rerun)
+class Timer:
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+
+    def stop(self):
+        metrics.observe(self.name, time.perf_counter() - self.started)
+
+
+# Wrap one Google API request: time it, count it against quota and count failures.
+# Sheets reads and writes first wait for a token from the rate limiter (at most
+# max_wait seconds, then SheetsBusyError); other kinds, such as "auth" and the
+# Drive "drive" revision check, do not count against the Sheets quota.
+@contextmanager
+def sheets_call(operation, kind="read", max_wait=MAX_WAIT):
+    if kind in ("read", "write"):
+        _admit(kind, max_wait)
+    metrics.record_api_call(operation, kind)
+    started = time.perf_counter()
+    try:
+        with sheets_section(operation):
+            yield
+    except Exception as error:
+        metrics.increment(f"sheets.errors.{getattr(error, 'code', type(error).__name__)}")
+        raise
+    finally:
+        metrics.observe(f"sheets.{operation}", time.perf_counter() - started)
+
+
+def _admit(kind, max_wait):
+    scheduler = get_scheduler()
+    metrics.set_gauge("sheets.queue_depth", scheduler.queue_depth + 1)
+    try:
+        waited = scheduler.acquire(WRITE_PRIORITY if kind == "write" else READ_PRIORITY, max_wait)
+    except SheetsBusyError:
+        metrics.increment(f"sheets.rejected.{kind}")
+        raise
+    finally:
+        metrics.set_gauge("sheets.queue_depth", scheduler.queue_depth)
+    if waited > 0.001:
+        metrics.increment(f"sheets.throttled.{kind}")
+        metrics.observe(f"sheets.admission_wait.{kind}", waited)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, content_type = json.dumps(metrics.snapshot()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, content_type = metrics.prometheus().encode(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _write_metrics_file():
+    while True:
+        time.sleep(METRICS_WRITE_INTERVAL)
+        temporary_path = f"{METRICS_FILE}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(metrics.snapshot(), f, indent=2)
+        os.replace(temporary_path, METRICS_FILE)
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+# Start the metrics file writer and HTTP endpoint once per process, if configured
+def start_exporters():
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+    if METRICS_FILE:
+        threading.Thread(target=_write_metrics_file, name="portal-metrics-file", daemon=True).start()
+    if METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", int(METRICS_PORT)), _MetricsHandler)
+        except OSError:
+            # Another portal process on this host already serves the endpoint
+            return
+        threading.Thread(target=server.serve_forever, name="portal-metrics-http", daemon=True).start()
@@ -0,0 +1,291 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from portal.instrumentation import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so run a single portal process per journal directory
+    fcntl = None
+
+# Write-ahead journal of submissions. Every validated request is appended with its
+# Request ID and fsync'd before the volunteer sees the confirmation, so a slow or
+# unavailable Google Sheet never loses a request: the submission writer replays what
+# is not saved yet, also after the process crashed or was restarted.
+#
+# Each process appends to its own segment file (JSON lines) in JOURNAL_DIR and holds
+# an exclusive lock on it. At startup a process adopts the segments nobody holds any
+# more (their process is gone) and replays their unsaved entries.
+#
+#   {"op": "submit", "id": "REQ-LTV00042", "row": [...], "key": "...", "at": 1738312345.6}
+#   {"op": "saved", "ids": ["REQ-LTV00042", ...]}
+#   {"op": "failed", "ids": [...], "error": "..."}
+
+# "" turns the journal off (rows then only live in memory until they are written)
+JOURNAL_DIR = os.environ.get("PORTAL_SUBMIT_JOURNAL_DIR", os.path.join(".cache", "journal"))
+
+# A segment with nothing left to replay is emptied once it is larger than this
+JOURNAL_COMPACT_BYTES = int(os.environ.get("PORTAL_SUBMIT_JOURNAL_COMPACT_BYTES", str(1024 * 1024)))
+
+SEGMENT_PREFIX = "submissions-"
+SEGMENT_SUFFIX = ".journal"
+
+
+class JournalEntry:
+    def __init__(self, request_id, row, idempotency_key=None, submitted_at=None):
+        self.request_id = request_id
+        self.row = row
+        self.idempotency_key = idempotency_key
+        self.submitted_at = submitted_at or time.time()
+
+
+# Submit entries of one segment with no saved/failed record after them, in order.
+# A last line cut short by a crash is not a record; returns (entries, bytes of whole lines).
+def read_segment(f):
+    pending = OrderedDict()
+    valid_bytes = 0
+    for line in f:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            break
+        if not line.endswith(b"\n"):
+            break
+        valid_bytes += len(line)
+        if record["op"] == "submit":
+            pending[record["id"]] = JournalEntry(record["id"], record["row"], record.get("key"), record["at"])
+        else:
+            for request_id in record["ids"]:
+                pending.pop(request_id, None)
+    return list(pending.values()), valid_bytes
+
+
+def _lock(fd):
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+# Open and lock an existing segment; None while its process is alive, or if another
+# process adopted and removed it between our open and our lock
+def _lock_segment(path):
+    try:
+        fd = os.open(path, os.O_RDWR)
+    except FileNotFoundError:
+        return None
+    try:
+        if _lock(fd) and os.path.samestat(os.fstat(fd), os.stat(path)):
+            return fd
+    except FileNotFoundError:
+        pass
+    os.close(fd)
+    return None
+
+
+# Make a created, renamed or removed segment itself durable
+def _fsync_directory(directory):
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class SubmissionJournal:
+    def __init__(self, directory=JOURNAL_DIR, compact_bytes=JOURNAL_COMPACT_BYTES):
+        self.directory = directory
+        self.compact_bytes = compact_bytes
+        self._lock = threading.Lock()
+        # Request ID -> JournalEntry not saved yet, oldest first
+        self._pending = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+        self.path, self._fd = self._open_segment()
+        self._size = os.fstat(self._fd).st_size
+        self._adopt_orphans()
+        self.update_gauges()
+
+    # Reuse a segment left by a stopped process if there is one, otherwise start a new one
+    def _open_segment(self):
+        for path in self._segments():
+            fd = _lock_segment(path)
+            if fd is not None:
+                self._load(fd)
+                return path, fd
+        path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{uuid.uuid4().hex[:12]}{SEGMENT_SUFFIX}")
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+        _lock(fd)
+        _fsync_directory(self.directory)
+        return path, fd
+
+    def _segments(self):
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+
+    # Read the unsaved entries of our own segment and cut off a torn last line
+    def _load(self, fd):
+        with os.fdopen(os.dup(fd), "rb") as f:
+            entries, valid_bytes = read_segment(f)
+        if valid_bytes < os.fstat(fd).st_size:
+            metrics.increment("journal.torn_records")
+            os.ftruncate(fd, valid_bytes)
+            os.fsync(fd)
+        os.lseek(fd, 0, os.SEEK_END)
+        for entry in entries:
+            self._pending[entry.request_id] = entry
+
+    # Move the unsaved entries of other stopped processes' segments into ours, then remove them
+    def _adopt_orphans(self):
+        for path in self._segments():
+            if path == self.path:
+                continue
+            fd = _lock_segment(path)
+            if fd is None:
+                continue
+            try:
+                with os.fdopen(os.dup(fd), "rb") as f:
+                    entries, _ = read_segment(f)
+                entries = [entry for entry in entries if entry.request_id not in self._pending]
+                if entries:
+                    self._write([self._submit_record(entry) for entry in entries])
+                    for entry in entries:
+                        self._pending[entry.request_id] = entry
+                    metrics.increment("journal.adopted", len(entries))
+                # Removed while still locked, so no other process adopts the same entries
+                os.unlink(path)
+                _fsync_directory(self.directory)
+            finally:
+                os.close(fd)
+
+    @staticmethod
+    def _submit_record(entry):
+        return {"op": "submit", "id": entry.request_id, "row": entry.row, "key": entry.idempotency_key, "at": entry.submitted_at}
+
+    # Append records as whole lines in one write, then fsync. Needs the lock (or __init__).
+    # A failed write is cut off again, so later records never follow half a line.
+    def _write(self, records):
+        data = b"".join(json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode() + b"\n" for record in records)
+        started = time.perf_counter()
+        try:
+            os.write(self._fd, data)
+            os.fsync(self._fd)
+        except OSError:
+            try:
+                os.ftruncate(self._fd, self._size)
+                os.lseek(self._fd, self._size, os.SEEK_SET)
+            except OSError:
+                pass
+            raise
+        metrics.observe("journal.fsync", time.perf_counter() - started)
+        self._size += len(data)
+
+    # Durably record a submission; once this returns, the request survives a crash
+    def append(self, request_id, row, idempotency_key=None):
+        entry = JournalEntry(request_id, list(row), idempotency_key)
+        with self._lock:
+            self._write([self._submit_record(entry)])
+            self._pending[request_id] = entry
+        metrics.increment("journal.appended")
+        self.update_gauges()
+        return entry
+
+    def mark_saved(self, request_ids):
+        self._finish({"op": "saved", "ids": list(request_ids)})
+
+    # Given up for good (e.g. the sheet rejected the row); not replayed again
+    def mark_failed(self, request_ids, error):
+        self._finish({"op": "failed", "ids": list(request_ids), "error": str(error)})
+
+    # Raises OSError when the record cannot be written; the entries are finished in
+    # memory anyway, and only replayed again after a restart
+    def _finish(self, record):
+        with self._lock:
+            try:
+                self._write([record])
+            finally:
+                for request_id in record["ids"]:
+                    self._pending.pop(request_id, None)
+            # Truncating in place keeps the inode, and with it our lock
+            if not self._pending and self._size > self.compact_bytes:
+                os.ftruncate(self._fd, 0)
+                os.fsync(self._fd)
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                self._size = 0
+                metrics.increment("journal.compactions")
+        self.update_gauges()
+
+    # Entries not saved yet, oldest first
+    def pending(self):
+        with self._lock:
+            return list(self._pending.values())
+
+    @property
+    def backlog(self):
+        return len(self._pending)
+
+    # Age of the oldest unsaved entry: how far the sheet is behind the journal
+    def lag_seconds(self):
+        with self._lock:
+            oldest = next(iter(self._pending.values()), None)
+        return max(0.0, time.time() - oldest.submitted_at) if oldest is not None else 0.0
+
+    def update_gauges(self):
+        metrics.set_gauge("journal.backlog", self.backlog)
+        metrics.set_gauge("journal.lag_seconds", round(self.lag_seconds(), 1))
+
+
+_journal = None
+_journal_lock = threading.Lock()
+
+
+# The process-wide journal, or None when PORTAL_SUBMIT_JOURNAL_DIR is empty
+def get_journal():
+    global _journal
+    if not JOURNAL_DIR:
+        return None
+    with _journal_lock:
+        if _journal is None:
+            _journal = SubmissionJournal()
+        return _journal
+
+
+# Backlog of every segment in a journal directory, read without taking any locks:
+#   python -m portal.journal [directory]
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    directory = argv[0] if argv else JOURNAL_DIR
+    now = time.time()
+    segments = []
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)):
+            continue
+        with open(os.path.join(directory, name), "rb") as f:
+            entries, _ = read_segment(f)
+        segments.append({
+            "segment": name,
+            "backlog": len(entries),
+            "lag_seconds": round(now - entries[0].submitted_at, 1) if entries else 0.0,
+            "oldest": entries[0].request_id if entries else None,
+        })
+    print(json.dumps({
+        "backlog": sum(segment["backlog"] for segment in segments),
+        "lag_seconds": max((segment["lag_seconds"] for segment in segments), default=0.0),
+        "segments": segments,
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+import sys
+import threading
+from array import array
+from typing import NamedTuple
+
+from portal.phones import normalize_stored_phone_numbers
+from portal.shared_cache import get_shared_cache
+
+
+# Only the fields the portal actually uses from "Volunteer Details"
+class ParticipantRecord(NamedTuple):
+    name: str
+    gender: str
+    category: str
+    email: str
+    phone: str
+
+
+# Emails are matched case-insensitively and ignoring surrounding spaces
+def normalize_email(email):
+    return str(email).strip().casefold()
+
+
+# Columns read from "Volunteer Details"; snapshots keep only these
+PARTICIPANT_COLUMNS = ("Name", "Gender", "Email ID", "Phone Number", "Volunteer Category")
+
+
+# A column with few distinct values, stored as one small code per row
+class Categorical:
+    def __init__(self, values=()):
+        self.labels = ()
+        self.codes = array("H")
+        self._code_of = {}
+        self.extend(values)
+
+    # Append rows; codes already handed out never change
+    def extend(self, values):
+        labels = list(self.labels)
+        code_of = self._code_of
+        for value in values:
+            code = code_of.get(value)
+            if code is None:
+                code = code_of[value] = len(labels)
+                labels.append(value)
+                if code > 0xFFFF and self.codes.typecode == "H":
+                    self.codes = array("I", self.codes)
+            self.codes.append(code)
+        self.labels = tuple(labels)
+
+    # Code of a label, or None if no row has it
+    def code(self, label):
+        return self._code_of.get(label)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, row):
+        return self.labels[self.codes[row]]
+
+
+# Read-only, column-oriented lookup of participants by email and by E.164 phone
+# number. Name and email columns are the snapshot's own tuples, Gender and
+# Volunteer Category are categorical, and the lookup dicts map to row numbers.
+# Nothing here is copied or changed after construction, so every session shares it.
+class ParticipantIndex:
+    def __init__(self, names, genders, categories, emails, phones):
+        self._names = tuple(names)
+        self._genders = Categorical(genders)
+        self._categories = Categorical(categories)
+        self._emails = tuple(emails)
+        self._phones = tuple(phones)
+        self._email_search = None
+        self._email_search_lock = threading.Lock()
+        self._by_email = {}
+        self._by_phone = {}
+        for row, (email, phone) in enumerate(zip(self._emails, self._phones)):
+            # Keep the first row for duplicates, like the old iloc[0] lookup did
+            if email:
+                key = normalize_email(email)
+                self._by_email.setdefault(email if key == email else key, row)
+            if phone:
+                self._by_phone.setdefault(phone, row)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls(
+            snapshot.column("Name"),
+            snapshot.column("Gender"),
+            snapshot.column("Volunteer Category"),
+            snapshot.column("Email ID"),
+            # Normalize every stored number in one deduplicated, cached batch
+            normalize_stored_phone_numbers(snapshot.column("Phone Number")),
+        )
+
+    # Locks and the lazily built email search index are not shared between replicas
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_email_search"] = None
+        del state["_email_search_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._email_search_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._by_email)
+
+    def record(self, row):
+        return ParticipantRecord(self._names[row], self._genders[row], self._categories[row],
+                                 self._emails[row], self._phones[row])
+
+    # Records in sheet order, built on demand
+    def records(self):
+        return (self.record(row) for row in range(len(self._names)))
+
+    def by_email(self, email):
+        if not email:
+            return None
+        row = self._by_email.get(normalize_email(email))
+        return self.record(row) if row is not None else None
+
+    # phone_number must already be normalized to E.164
+    def by_phone(self, phone_number):
+        if not phone_number:
+            return None
+        row = self._by_phone.get(phone_number)
+        return self.record(row) if row is not None else None
+
+    # Trigram index for typo-tolerant email search, built on first use
+    def email_search(self):
+        from portal.email_search import EmailSearchIndex
+
+        with self._email_search_lock:
+            if self._email_search is None:
+                self._email_search = EmailSearchIndex(self._emails)
+            return self._email_search
+
+    # Approximate bytes held by the index, counting each shared string once
+    def memory_bytes(self):
+        seen = set()
+        total = 0
+        containers = (self._names, self._emails, self._phones, self._by_email, self._by_phone,
+                      self._genders.codes, self._genders.labels, self._categories.codes, self._categories.labels)
+        for container in containers:
+            total += sys.getsizeof(container)
+            for value in container:
+                if isinstance(value, str) and id(value) not in seen:
+                    seen.add(id(value))
+                    total += sys.getsizeof(value)
+        return total
+
+
+_index_lock = threading.Lock()
+_index_cache = {}
+
+
+# Get the index for a snapshot, building it only once per snapshot
+def get_participant_index(snapshot):
+    with _index_lock:
+        cached = _index_cache.get(snapshot.title)
+        if cached is not None and cached[0] is snapshot:
+            return cached[1]
+        index = _load_shared_index(snapshot)
+        _index_cache[snapshot.title] = (snapshot, index)
+        return index
+
+
+# With a shared cache, the replica that builds the index for a snapshot publishes it for
+# the others. There is one entry per worksheet, (revision, fetched_at, index), which the
+# next build overwrites, so old indexes do not pile up in the cache.
+def _load_shared_index(snapshot):
+    shared_cache = get_shared_cache()
+    if shared_cache is None:
+        return ParticipantIndex.from_snapshot(snapshot)
+    key = f"participant-index:{snapshot.title}"
+    version = (snapshot.revision, snapshot.fetched_at)
+
+    def is_current(entry):
+        return entry[:2] == version
+
+    entry = shared_cache.get(key)
+    if entry is not None and is_current(entry):
+        return entry[2]
+    token = shared_cache.acquire_lease(key)
+    if token is None:
+        entry = shared_cache.wait_for(key, is_current)
+        return entry[2] if entry is not None else ParticipantIndex.from_snapshot(snapshot)
+    try:
+        index = ParticipantIndex.from_snapshot(snapshot)
+        shared_cache.set(key, (*version, index))
+        return index
+    finally:
+        shared_cache.release_lease(key, token)
@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import closing
+
+# Number of (raw number, region) results kept in memory
+PHONE_CACHE_SIZE = int(os.environ.get("PORTAL_PHONE_CACHE_SIZE", "200000"))
+
+# SQLite file that keeps normalized numbers across restarts
+PHONE_CACHE_PATH = os.environ.get("PORTAL_PHONE_CACHE_PATH", os.path.join(".cache", "phone_numbers.sqlite3"))
+
+# Keep each "IN (...)" query well under SQLite's bound-parameter limit
+_SQL_CHUNK_SIZE = 400
+
+
+# Parse one number with phonenumbers; None if it is not a valid number.
+# phonenumbers is imported on first use, so reruns served from the caches never load it.
+def _parse_phone_number(phone_number, country_code):
+    import phonenumbers
+
+    try:
+        parsed_number = phonenumbers.parse(phone_number, country_code)
+        if not phonenumbers.is_valid_number(parsed_number):
+            return None
+        return phonenumbers.format_number(parsed_number, phonenumbers.PhoneNumberFormat.E164)
+    except phonenumbers.NumberParseException:
+        return None
+
+
+# Small thread-safe LRU; invalid numbers are cached as None like valid ones
+class _LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    found[key] = self._data[key]
+        return found
+
+    def put_many(self, items):
+        with self._lock:
+            for key, value in items.items():
+                self._data[key] = value
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+# On-disk cache keyed by (raw number, default region); a NULL e164 marks an invalid number
+class PhoneNormalizationStore:
+    def __init__(self, path):
+        self.path = path
+        self.enabled = True
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS normalized_phone_numbers ("
+            "raw TEXT NOT NULL, region TEXT NOT NULL, e164 TEXT, PRIMARY KEY (raw, region))"
+        )
+        return conn
+
+    def get_many(self, keys):
+        found = {}
+        if not self.enabled or not keys:
+            return found
+        by_region = {}
+        for raw, region in keys:
+            by_region.setdefault(region, []).append(raw)
+        try:
+            with closing(self._connect()) as conn:
+                for region, raws in by_region.items():
+                    for start in range(0, len(raws), _SQL_CHUNK_SIZE):
+                        chunk = raws[start:start + _SQL_CHUNK_SIZE]
+                        placeholders = ",".join("?" * len(chunk))
+                        rows = conn.execute(
+                            f"SELECT raw, e164 FROM normalized_phone_numbers WHERE region = ? AND raw IN ({placeholders})",
+                            [region, *chunk],
+                        )
+                        for raw, e164 in rows:
+                            found[(raw, region)] = e164
+        except (sqlite3.Error, OSError):
+            # The cache is an optimization only; keep working without it
+            self.enabled = False
+        return found
+
+    def put_many(self, items):
+        if not self.enabled or not items:
+            return
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO normalized_phone_numbers (raw, region, e164) VALUES (?, ?, ?)",
+                    [(raw, region, e164) for (raw, region), e164 in items.items()],
+                )
+        except (sqlite3.Error, OSError):
+            self.enabled = False
+
+
+_memory_cache = _LRUCache(PHONE_CACHE_SIZE)
+_disk_cache = PhoneNormalizationStore(PHONE_CACHE_PATH)
+
+
+# Normalize many numbers at once: duplicates are parsed once, and results come from
+# the in-memory LRU, then the on-disk cache, and only then from phonenumbers
+def normalize_phone_numbers(phone_numbers, country_code="IN", persist=True):
+    phone_numbers = [str(phone_number) for phone_number in phone_numbers]
+    keys = list(dict.fromkeys((phone_number, country_code) for phone_number in phone_numbers))
+
+    results = _memory_cache.get_many(keys)
+    missing = [key for key in keys if key not in results]
+
+    if missing and persist:
+        from_disk = _disk_cache.get_many(missing)
+        _memory_cache.put_many(from_disk)
+        results.update(from_disk)
+        missing = [key for key in missing if key not in from_disk]
+
+    if missing:
+        parsed = {key: _parse_phone_number(*key) for key in missing}
+        _memory_cache.put_many(parsed)
+        if persist:
+            _disk_cache.put_many(parsed)
+        results.update(parsed)
+
+    return [results[(phone_number, country_code)] for phone_number in phone_numbers]
+
+
+# Function to normalize phone numbers to E.164 format
+# Typed-in numbers are only memoized in memory so user input never grows the disk cache
+def normalize_phone_number(phone_number, country_code="IN"):
+    return normalize_phone_numbers([phone_number], country_code, persist=False)[0]
+
+
+# Stored numbers without a country code are assumed to be Indian
+def _with_default_country_code(phone_number):
+    phone_number = str(phone_number).strip()
+    if not phone_number.startswith("+"):
+        phone_number = f"+91{phone_number}"
+    return phone_number
+
+
+def normalize_stored_phone_numbers(phone_numbers, persist=True):
+    return normalize_phone_numbers([_with_default_country_code(phone_number) for phone_number in phone_numbers], persist=persist)
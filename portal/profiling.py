@@ -0,0 +1,336 @@
+import functools
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Opt-in sampling profiler for single reruns. While a rerun (or a fragment rerun) is
+# traced, a background thread samples the stack of the thread running it every
+# PROFILE_INTERVAL_MS, and when the run ends the stacks are written to PROFILE_DIR
+# as speedscope JSON (https://www.speedscope.app) and/or collapsed stacks
+# (flamegraph.pl, inferno). File names carry the session and the interaction, e.g.
+# 20250131-102030-1a2b3c4d-0007-request_section.speedscope.json. Google Sheets calls
+# show up as a "[sheets.<operation>]" frame, so time spent waiting on the API stands out.
+#
+#   PORTAL_PROFILE=1                  trace PORTAL_PROFILE_RATE of all reruns (and of Sheets
+#                                     calls made by background threads)
+#   PORTAL_PROFILE_KEY=<secret>       ?profile=<secret> traces every rerun of that session
+#
+# Nothing is sampled while no run is traced; tracing stops for good once
+# PORTAL_PROFILE_MAX_TRACES traces were written by the process.
+
+PROFILE_ALL = os.environ.get("PORTAL_PROFILE", "") == "1"
+PROFILE_KEY = os.environ.get("PORTAL_PROFILE_KEY", "")
+
+# False when neither is set; the hooks below then do nothing
+PROFILING_ENABLED = PROFILE_ALL or bool(PROFILE_KEY)
+
+PROFILE_DIR = os.environ.get("PORTAL_PROFILE_DIR", os.path.join(".cache", "profiles"))
+
+# Fraction of reruns traced with PORTAL_PROFILE=1
+PROFILE_RATE = float(os.environ.get("PORTAL_PROFILE_RATE", "1"))
+
+PROFILE_INTERVAL_MS = float(os.environ.get("PORTAL_PROFILE_INTERVAL_MS", "5"))
+
+# Only runs that took at least this long are written
+PROFILE_MIN_MS = float(os.environ.get("PORTAL_PROFILE_MIN_MS", "0"))
+
+PROFILE_MAX_TRACES = int(os.environ.get("PORTAL_PROFILE_MAX_TRACES", "500"))
+
+# A trace still running after this long is cut off and written
+PROFILE_MAX_SECONDS = float(os.environ.get("PORTAL_PROFILE_MAX_SECONDS", "60"))
+
+# "speedscope", "collapsed" or "both"
+PROFILE_FORMAT = os.environ.get("PORTAL_PROFILE_FORMAT", "both")
+
+_UNSAFE_FILENAME_CHARACTERS = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+class Trace:
+    def __init__(self, session, interaction, thread_id):
+        self.session = session
+        self.interaction = interaction
+        self.thread_id = thread_id
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.last_sample = self.started
+        self.ended = None
+        # Frame key -> index into self.frames
+        self._frame_index = {}
+        self.frames = []
+        # Consecutive identical stacks are merged: [[frame indexes root first, milliseconds], ...]
+        self.samples = []
+
+    @property
+    def duration_ms(self):
+        return ((self.ended or time.perf_counter()) - self.started) * 1000
+
+    def add(self, stack, now):
+        weight = (now - self.last_sample) * 1000
+        self.last_sample = now
+        indexes = []
+        for key in stack:
+            index = self._frame_index.get(key)
+            if index is None:
+                index = self._frame_index[key] = len(self.frames)
+                self.frames.append(key)
+            indexes.append(index)
+        if self.samples and self.samples[-1][0] == indexes:
+            self.samples[-1][1] += weight
+        else:
+            self.samples.append([indexes, weight])
+
+    def name(self):
+        return f"{self.session} {self.interaction} ({self.duration_ms:.0f} ms)"
+
+    def speedscope(self):
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name(),
+            "exporter": "portal.profiling",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [{"name": name, "file": file, "line": line} for name, file, line in self.frames]},
+            "profiles": [{
+                "type": "sampled",
+                "name": self.name(),
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(self.duration_ms, 3),
+                "samples": [indexes for indexes, _ in self.samples],
+                "weights": [round(weight, 3) for _, weight in self.samples],
+            }],
+        }
+
+    # One "root;...;leaf milliseconds" line per distinct stack
+    def collapsed(self):
+        totals = {}
+        for indexes, weight in self.samples:
+            stack = ";".join(_frame_label(self.frames[index]) for index in indexes)
+            totals[stack] = totals.get(stack, 0.0) + weight
+        return "".join(f"{stack} {round(weight)}\n" for stack, weight in totals.items() if round(weight))
+
+
+def _frame_label(frame):
+    name, file, line = frame
+    return f"{name} ({os.path.basename(file)}:{line})" if file else name
+
+
+class Profiler:
+    def __init__(self, directory=PROFILE_DIR, interval_ms=PROFILE_INTERVAL_MS, max_traces=PROFILE_MAX_TRACES):
+        self.directory = directory
+        self.interval = interval_ms / 1000
+        self.max_traces = max_traces
+        self._condition = threading.Condition()
+        # Thread id -> Trace being recorded on that thread
+        self._active = {}
+        # Session -> its trace, so a run cut short by st.stop()/st.rerun() is closed by the next one
+        self._by_session = {}
+        # Thread id -> Sheets operation in progress, shown as a pseudo frame
+        self._labels = {}
+        self._sequences = {}
+        self._written = 0
+        self._sampler = None
+        self._skip_prefixes = ()
+
+    @property
+    def exhausted(self):
+        return self._written >= self.max_traces
+
+    def active_on_current_thread(self):
+        return threading.get_ident() in self._active
+
+    def start(self, session, interaction):
+        thread_id = threading.get_ident()
+        with self._condition:
+            stale = []
+            for old_trace in (self._by_session.get(session), self._active.get(thread_id)):
+                if old_trace is not None and old_trace not in stale:
+                    stale.append(old_trace)
+            self._sequences[session] = sequence = self._sequences.get(session, 0) + 1
+            trace = Trace(session, f"{sequence:04d}-{interaction}", thread_id)
+            for old_trace in stale:
+                self._close(old_trace)
+            self._active[thread_id] = trace
+            self._by_session[session] = trace
+            self._ensure_sampler()
+            self._condition.notify_all()
+        for old_trace in stale:
+            self._write(old_trace)
+        return trace
+
+    def stop(self, trace):
+        with self._condition:
+            if not self._close(trace):
+                return
+        self._write(trace)
+
+    # Remove a trace from the active ones; False if it was already closed. Needs the lock.
+    def _close(self, trace):
+        if self._active.get(trace.thread_id) is not trace:
+            return False
+        del self._active[trace.thread_id]
+        if self._by_session.get(trace.session) is trace:
+            del self._by_session[trace.session]
+        trace.ended = time.perf_counter()
+        return True
+
+    @contextmanager
+    def label(self, name):
+        thread_id = threading.get_ident()
+        previous = self._labels.get(thread_id)
+        self._labels[thread_id] = name
+        try:
+            yield
+        finally:
+            if previous is None:
+                self._labels.pop(thread_id, None)
+            else:
+                self._labels[thread_id] = previous
+
+    def _ensure_sampler(self):
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._sample_forever, name="portal-profiler", daemon=True)
+            self._sampler.start()
+
+    def _sample_forever(self):
+        # Frames of Streamlit's script runner and of threading sit below every stack; leave them out
+        streamlit = sys.modules.get("streamlit")
+        self._skip_prefixes = tuple(
+            os.path.dirname(path) + os.sep for path in (threading.__file__, getattr(streamlit, "__file__", None)) if path
+        )
+        while True:
+            with self._condition:
+                while not self._active:
+                    self._condition.wait()
+                active = list(self._active.values())
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            finished = []
+            for trace in active:
+                frame = frames.get(trace.thread_id)
+                # The thread is gone (its run ended with an exception), or the run is too long
+                if frame is None or now - trace.started > PROFILE_MAX_SECONDS:
+                    finished.append(trace)
+                    continue
+                trace.add(self._stack(frame, trace.thread_id), now)
+            del frames
+            for trace in finished:
+                self.stop(trace)
+            time.sleep(self.interval)
+
+    # (name, file, line) per frame, root first, without the runner's own frames
+    def _stack(self, frame, thread_id):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        stack.reverse()
+        start = 0
+        while start < len(stack) - 1 and stack[start][1].startswith(self._skip_prefixes):
+            start += 1
+        stack = stack[start:]
+        label = self._labels.get(thread_id)
+        if label is not None:
+            stack.append((f"[{label}]", "", 0))
+        return stack
+
+    def _write(self, trace):
+        from portal.instrumentation import metrics
+
+        if trace.duration_ms < PROFILE_MIN_MS or not trace.samples:
+            return
+        with self._condition:
+            if self.exhausted:
+                return
+            self._written += 1
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.fromtimestamp(trace.started_at).strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(self.directory, _UNSAFE_FILENAME_CHARACTERS.sub("_", f"{stamp}-{trace.session}-{trace.interaction}"))
+        if PROFILE_FORMAT in ("speedscope", "both"):
+            with open(f"{base}.speedscope.json", "w") as f:
+                json.dump(trace.speedscope(), f)
+        if PROFILE_FORMAT in ("collapsed", "both"):
+            with open(f"{base}.collapsed.txt", "w") as f:
+                f.write(trace.collapsed())
+        metrics.increment("profiler.traces_written")
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = Profiler()
+        return _profiler
+
+
+# Whether a run should be traced: always for a session that asked with the profile key,
+# otherwise PROFILE_RATE of the runs while PORTAL_PROFILE=1
+def should_profile(requested=False):
+    if not (requested or PROFILE_ALL) or get_profiler().exhausted:
+        return False
+    return requested or random.random() < PROFILE_RATE
+
+
+def profile_key_matches(value):
+    import hmac
+
+    return bool(PROFILE_KEY) and bool(value) and hmac.compare_digest(str(value).encode(), PROFILE_KEY.encode())
+
+
+# Start/stop handle for a whole rerun, which cannot be wrapped in a with block.
+# stop() is optional: a run ended by st.stop() or st.rerun() is closed once its thread
+# exits or when the session's next run starts.
+class RerunProfile:
+    def __init__(self, session, interaction="rerun", requested=False):
+        self.trace = get_profiler().start(session, interaction) if should_profile(requested) else None
+
+    def stop(self):
+        if self.trace is not None:
+            get_profiler().stop(self.trace)
+
+
+# Trace a fragment rerun under the fragment's name. Inside an already traced run
+# (e.g. the fragment runs as part of a full rerun) it adds nothing.
+def profiled(session_of, requested_of=lambda: False):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profiler = get_profiler() if PROFILING_ENABLED else None
+            if profiler is None or profiler.active_on_current_thread() or not should_profile(requested_of()):
+                return function(*args, **kwargs)
+            trace = profiler.start(session_of(), function.__name__)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.stop(trace)
+        return wrapper
+    return decorator
+
+
+# Label a Google Sheets call in traces. With PORTAL_PROFILE=1, a call made outside
+# any traced run (the submission writer, prefetch threads) gets a trace of its own.
+@contextmanager
+def sheets_section(operation):
+    if not PROFILING_ENABLED:
+        yield
+        return
+    profiler = get_profiler()
+    trace = None
+    if PROFILE_ALL and not profiler.active_on_current_thread() and should_profile():
+        trace = profiler.start(threading.current_thread().name, f"sheets.{operation}")
+    try:
+        with profiler.label(f"sheets.{operation}"):
+            yield
+    finally:
+        if trace is not None:
+            profiler.stop(trace)
@@ -0,0 +1,121 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from portal.shared_cache import get_shared_cache
+
+# Admission control in front of Google Sheets. Every session uses the same service
+# account, so all Sheets reads and writes of the process (or, with a shared cache,
+# of every replica) draw from one token bucket kept under the per-minute quota.
+# Callers that find the bucket empty queue up, writes ahead of reads, and give up
+# with SheetsBusyError once they have waited MAX_WAIT seconds.
+
+# Sustained Sheets requests per minute; the default leaves headroom under the 300/minute quota
+RATE_PER_MINUTE = float(os.environ.get("PORTAL_SHEETS_RATE_PER_MINUTE", "240"))
+
+# Requests that may be made back to back after a quiet period
+BURST = float(os.environ.get("PORTAL_SHEETS_BURST", "20"))
+
+# Longest time a request waits for a token before SheetsBusyError is raised
+MAX_WAIT = float(os.environ.get("PORTAL_SHEETS_MAX_WAIT", "10"))
+
+# Lower values are served first
+WRITE_PRIORITY = 0
+READ_PRIORITY = 1
+
+
+class SheetsBusyError(Exception):
+    pass
+
+
+# Google itself answering 429 (the quota is shared with the CLIs and other replicas) or
+# 5xx is handled like an empty bucket: serve what is cached, or try again shortly
+def is_sheets_busy(error):
+    if isinstance(error, SheetsBusyError):
+        return True
+
+    from gspread.exceptions import APIError
+
+    return isinstance(error, APIError) and (error.code == 429 or 500 <= error.code < 600)
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute=RATE_PER_MINUTE, capacity=BURST):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    # Take one token; returns 0 on success, else seconds until one is available
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+# The same bucket kept in the shared cache, so all replicas share one budget
+class SharedTokenBucket:
+    def __init__(self, shared_cache, key="sheets", rate_per_minute=RATE_PER_MINUTE, capacity=BURST):
+        self.shared_cache = shared_cache
+        self.key = key
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity
+
+    def take(self):
+        return self.shared_cache.take_token(self.key, self.rate, self.capacity)
+
+
+class SheetsScheduler:
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self._condition = threading.Condition()
+        # Heap of (priority, arrival) tickets; only the first one may take a token
+        self._waiting = []
+        self._arrivals = itertools.count()
+
+    @property
+    def queue_depth(self):
+        return len(self._waiting)
+
+    # Wait for a token; returns the seconds spent waiting, or raises SheetsBusyError.
+    # max_wait=0 only succeeds if a token is available right now.
+    def acquire(self, priority=READ_PRIORITY, max_wait=MAX_WAIT):
+        started = time.monotonic()
+        deadline = started + max_wait
+        ticket = (priority, next(self._arrivals))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    delay = self.bucket.take() if self._waiting[0] == ticket else None
+                    if delay == 0:
+                        return time.monotonic() - started
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise SheetsBusyError("Google Sheets is busy, please try again shortly")
+                    self._condition.wait(remaining if delay is None else min(delay, remaining))
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+# Get the process-wide scheduler; its bucket is shared between replicas when PORTAL_SHARED_CACHE is set
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            shared_cache = get_shared_cache()
+            bucket = SharedTokenBucket(shared_cache) if shared_cache is not None else TokenBucket()
+            _scheduler = SheetsScheduler(bucket)
+        return _scheduler
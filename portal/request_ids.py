@@ -0,0 +1,146 @@
+import os
+import re
+import sqlite3
+import threading
+from contextlib import closing
+
+from portal.shared_cache import get_shared_cache
+
+# SQLite file holding the last number handed out per prefix. Every portal process on
+# the host shares it, and it can always be rebuilt from the Requests sheet.
+REQUEST_ID_DB_PATH = os.environ.get("PORTAL_REQUEST_ID_DB", os.path.join(".cache", "request_ids.sqlite3"))
+
+# Define request prefix mapping
+REQUEST_PREFIXES = {
+    "Ashram Volunteer": "AV",
+    "Short Term Department Support": "STV",
+    "Long Term Department Support": "LTV"
+}
+DEFAULT_REQUEST_PREFIX = "REQ"
+
+# Numbers are zero-padded to 5 digits; past 99999 they simply grow wider
+# (REQ-LTV99999 is followed by REQ-LTV100000), so IDs never need a random fallback
+REQUEST_NUMBER_WIDTH = 5
+
+_REQUEST_ID_PATTERN = re.compile(r"^REQ-(AV|STV|LTV|REQ)(\d+)$")
+
+
+def request_prefix(volunteer_category):
+    return REQUEST_PREFIXES.get(volunteer_category, DEFAULT_REQUEST_PREFIX)
+
+
+def format_request_id(prefix, number):
+    return f"REQ-{prefix}{number:0{REQUEST_NUMBER_WIDTH}d}"
+
+
+# Split a request ID into (prefix, number); None for anything we did not generate
+def parse_request_id(request_id):
+    match = _REQUEST_ID_PATTERN.match(str(request_id).strip())
+    if match is None:
+        return None
+    return match.group(1), int(match.group(2))
+
+
+# Highest number per prefix among existing request IDs
+def max_request_numbers(request_ids):
+    highest = {}
+    for request_id in request_ids:
+        parsed = parse_request_id(request_id)
+        if parsed is not None and parsed[1] > highest.get(parsed[0], 0):
+            highest[parsed[0]] = parsed[1]
+    return highest
+
+
+# Hands out request IDs with one counter per prefix
+class BaseRequestIdAllocator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tail_cursor = None
+
+    # Reserve `count` consecutive IDs for a prefix and return them in order
+    def allocate(self, prefix, count=1):
+        raise NotImplementedError
+
+    # Move counters forward so they are never behind the IDs already in the sheet
+    def recover(self, request_ids):
+        raise NotImplementedError
+
+    # Recover from the Request ID column, looking only at rows appended since the last call
+    def recover_from_tail(self, tail):
+        with self._lock:
+            rows, self._tail_cursor, _ = tail.rows_since(self._tail_cursor)
+        if rows:
+            self.recover(row[0] for row in rows if row)
+
+
+# Each allocation is a single IMMEDIATE transaction on a shared SQLite file, so
+# concurrent sessions and processes on one host never receive the same ID.
+class RequestIdAllocator(BaseRequestIdAllocator):
+    def __init__(self, path=REQUEST_ID_DB_PATH):
+        super().__init__()
+        self.path = path
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("CREATE TABLE IF NOT EXISTS request_id_counters (prefix TEXT PRIMARY KEY, last_number INTEGER NOT NULL)")
+        return conn
+
+    def allocate(self, prefix, count=1):
+        with self._lock, closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT last_number FROM request_id_counters WHERE prefix = ?", (prefix,)).fetchone()
+                first = (row[0] if row else 0) + 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO request_id_counters (prefix, last_number) VALUES (?, ?)",
+                    (prefix, first + count - 1),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return [format_request_id(prefix, number) for number in range(first, first + count)]
+
+    def recover(self, request_ids):
+        highest = max_request_numbers(request_ids)
+        if not highest:
+            return
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.executemany(
+                "INSERT INTO request_id_counters (prefix, last_number) VALUES (?, ?) "
+                "ON CONFLICT(prefix) DO UPDATE SET last_number = MAX(last_number, excluded.last_number)",
+                list(highest.items()),
+            )
+
+
+# Counters kept in the shared cache, so replicas on different hosts never hand
+# out the same ID either
+class SharedRequestIdAllocator(BaseRequestIdAllocator):
+    def __init__(self, shared_cache):
+        super().__init__()
+        self.shared_cache = shared_cache
+
+    def allocate(self, prefix, count=1):
+        last = self.shared_cache.increment(f"request-id:{prefix}", count)
+        return [format_request_id(prefix, number) for number in range(last - count + 1, last + 1)]
+
+    def recover(self, request_ids):
+        for prefix, number in max_request_numbers(request_ids).items():
+            self.shared_cache.raise_to(f"request-id:{prefix}", number)
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+# Get the process-wide request ID allocator
+def get_request_id_allocator():
+    global _allocator
+    with _allocator_lock:
+        if _allocator is None:
+            shared_cache = get_shared_cache()
+            _allocator = SharedRequestIdAllocator(shared_cache) if shared_cache is not None else RequestIdAllocator()
+        return _allocator
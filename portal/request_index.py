@@ -0,0 +1,44 @@
+import threading
+
+# Request ID -> row lookup over the Requests worksheet for the "Track my Request"
+# view. Rows come from a WorksheetTail, so after the first read a refresh only
+# indexes the rows appended since the last one, and a lookup is one dict access.
+
+# Coordinators may add a Status column after the 12 request columns
+STATUS_COLUMN = "Status"
+
+# Shown while the Status cell is empty (or the column does not exist)
+DEFAULT_STATUS = "Received"
+
+
+class RequestIndex:
+    def __init__(self, tail, columns):
+        self.tail = tail
+        self.columns = tuple(columns)
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._cursor = None
+
+    def refresh(self):
+        self.tail.refresh()
+        with self._lock:
+            rows, self._cursor, reset = self.tail.rows_since(self._cursor)
+            # A new tail generation is a full re-read: build a fresh dict and swap it in,
+            # so lookups keep using the old one meanwhile
+            index = {} if reset else self._rows
+            for row in rows:
+                if row and row[0]:
+                    index[row[0].strip()] = row
+            self._rows = index
+
+    def __len__(self):
+        return len(self._rows)
+
+    # Stored columns of a request as a dict, or None if the ID is not in the sheet
+    def get(self, request_id):
+        row = self._rows.get(str(request_id).strip().upper())
+        if row is None:
+            return None
+        details = {column: row[i] if i < len(row) else "" for i, column in enumerate(self.columns)}
+        details[STATUS_COLUMN] = details.get(STATUS_COLUMN) or DEFAULT_STATUS
+        return details
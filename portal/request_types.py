@@ -0,0 +1,30 @@
+# Which request types and sub categories a participant may choose, shared by the
+# form in App.py and the bulk import (portal/bulk.py) so both apply the same rules.
+
+LONG_TERM_CATEGORY = "Long Term Department Support"
+
+# Sub categories that need a From Date and a To Date ("Extension Request" only asks for the To Date)
+DATE_REQUIRED_SUB_CATEGORIES = {
+    "Linga Seva", "Devi Seva", "Prana Danam", "Adi Yogi Arpanam",
+    "Step out of Ashram", "3 days Silence", "Extension Request"
+}
+
+
+# Request types offered to a volunteer category, in the order the form shows them
+def request_types(volunteer_category):
+    options = ["Seva Team", "Health Team", "Sahaya (Support) Team", "Others"]
+    if volunteer_category == LONG_TERM_CATEGORY:
+        options.insert(1, "Accommodation Team")
+    return options
+
+
+# Sub categories of a request type for a volunteer category; empty if there are none to pick
+def sub_categories(request_type, volunteer_category):
+    if request_type == "Seva Team":
+        options = ["Seva Affecting Health", "Seva Change", "Linga Seva", "Devi Seva", "Prana Danam", "Adi Yogi Arpanam", "Others"]
+        if volunteer_category == LONG_TERM_CATEGORY:
+            options.insert(0, "Meet Seva Team")
+        return options
+    if request_type == "Sahaya (Support) Team" and volunteer_category == LONG_TERM_CATEGORY:
+        return ["Meet Sahaya Team", "Step out of Ashram", "3 days Silence", "Extension Request", "Others"]
+    return []
@@ -0,0 +1,96 @@
+import argparse
+import csv
+import json
+import sys
+import time
+
+from portal.archive import SHEET_URL
+from portal.participants import PARTICIPANT_COLUMNS, ParticipantRecord
+from portal.phones import normalize_stored_phone_numbers
+from portal.storage import MESSAGE_TEMPLATE_COLUMNS, SQLITE_PATH, SQLiteStorage
+
+# Loads participants and message templates into the local SQLite store used by
+# PORTAL_STORAGE=sqlite, which starts out empty. Run it again whenever the volunteer
+# list changes; both tables are replaced in one transaction each. Requests and ID
+# counters already in the store are left alone.
+#
+#   python -m portal.seed sheet --credentials service_account.json
+#   python -m portal.seed csv --participants volunteers.csv --templates templates.csv
+
+
+# ParticipantRecords from rows with the PARTICIPANT_COLUMNS headers, phones normalized
+def participant_records(records):
+    records = list(records)
+    phones = normalize_stored_phone_numbers([record.get("Phone Number", "") for record in records], persist=False)
+    return [
+        ParticipantRecord(
+            record.get("Name", ""), record.get("Gender", ""), record.get("Volunteer Category", ""),
+            record.get("Email ID", "").strip(), phone,
+        )
+        for record, phone in zip(records, phones)
+    ]
+
+
+# Template name -> message; the first row of a name wins, as in the portal
+def message_templates(records):
+    templates = {}
+    for record in records:
+        templates.setdefault(record.get("Template Name", ""), record.get("Message", ""))
+    templates.pop("", None)
+    return templates
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return list(csv.DictReader(f))
+
+
+# Participants and templates as the portal itself reads them from the Google Sheet
+def read_sheet(credentials_path, sheet_url):
+    from portal.sheets_data import get_data_layer
+    from portal.storage import SheetsStorage
+
+    with open(credentials_path) as f:
+        creds_info = json.load(f)
+    sheets = SheetsStorage(get_data_layer(creds_info, sheet_url))
+    return list(sheets.participant_index().records()), sheets.message_templates()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load participants and message templates into the local SQLite store.")
+    parser.add_argument("--sqlite-path", default=SQLITE_PATH, help="SQLite store (or PORTAL_SQLITE_PATH)")
+    sources = parser.add_subparsers(dest="source", required=True)
+
+    sheet_parser = sources.add_parser("sheet", help="copy them from the Google Sheet")
+    sheet_parser.add_argument("--sheet-url", default=SHEET_URL, help="Google Sheet URL (or PORTAL_SHEET_URL)")
+    sheet_parser.add_argument("--credentials", default="service_account.json", help="service account JSON file")
+
+    csv_parser = sources.add_parser("csv", help="read them from CSV files")
+    csv_parser.add_argument("--participants", required=True, help=f"CSV with columns {', '.join(PARTICIPANT_COLUMNS)}")
+    csv_parser.add_argument("--templates", help=f"CSV with columns {', '.join(MESSAGE_TEMPLATE_COLUMNS)}")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.source == "sheet":
+        if not args.sheet_url:
+            parser.error("--sheet-url (or PORTAL_SHEET_URL) is required")
+        participants, templates = read_sheet(args.credentials, args.sheet_url)
+    else:
+        participants = participant_records(read_csv(args.participants))
+        templates = message_templates(read_csv(args.templates)) if args.templates else None
+
+    storage = SQLiteStorage(args.sqlite_path)
+    storage.load_participants(participants)
+    if templates is not None:
+        storage.load_message_templates(templates)
+    print(json.dumps({
+        "sqlite_path": args.sqlite_path,
+        "participants": len(participants),
+        "message_templates": len(templates) if templates is not None else "unchanged",
+        "seconds": round(time.perf_counter() - started, 1),
+    }, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
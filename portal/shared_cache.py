@@ -0,0 +1,230 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from contextlib import closing
+
+# Cache tier shared by every portal replica, so only one of them refreshes from
+# Google Sheets at a time and the rest read the shared copy. It holds worksheet
+# snapshots, participant indexes, the spreadsheet revision and the request ID
+# counters, plus short leases used for single-flight refreshes.
+#
+#   PORTAL_SHARED_CACHE=sqlite:///.cache/shared_cache.sqlite3   (replicas on one host)
+#   PORTAL_SHARED_CACHE=redis://cache-host:6379/0                 (needs the redis package)
+#
+# Leave it unset to keep every cache local to the process.
+SHARED_CACHE_URL = os.environ.get("PORTAL_SHARED_CACHE", "")
+
+# How long a refresh lease is held before another replica may take over
+LEASE_TTL = float(os.environ.get("PORTAL_SHARED_CACHE_LEASE_TTL", "60"))
+
+# How long a replica waits for the lease holder to publish before fetching itself
+LEASE_WAIT = float(os.environ.get("PORTAL_SHARED_CACHE_LEASE_WAIT", "30"))
+LEASE_POLL_INTERVAL = 0.2
+
+
+def dumps(value):
+    return zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 1)
+
+
+def loads(data):
+    return pickle.loads(zlib.decompress(data))
+
+
+# Common interface; values are arbitrary picklable objects
+class SharedCache:
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    # Take the named lease if nobody holds it; returns a token, or None if it is taken
+    def acquire_lease(self, name, ttl=LEASE_TTL):
+        raise NotImplementedError
+
+    def release_lease(self, name, token):
+        raise NotImplementedError
+
+    # Atomically add to a counter and return the new value
+    def increment(self, key, amount=1):
+        raise NotImplementedError
+
+    # Atomically raise a counter to at least `value`
+    def raise_to(self, key, value):
+        raise NotImplementedError
+
+    # Take one token from a shared token bucket refilled at `rate` per second up to
+    # `capacity`; returns 0 if a token was taken, else seconds until one is available
+    def take_token(self, key, rate, capacity):
+        raise NotImplementedError
+
+    # Wait until `is_ready(value)` holds for the shared value, or give up and return None
+    def wait_for(self, key, is_ready, timeout=LEASE_WAIT):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            value = self.get(key)
+            if value is not None and is_ready(value):
+                return value
+            time.sleep(LEASE_POLL_INTERVAL)
+        return None
+
+
+# One SQLite file shared by the replicas running on the same host
+class SQLiteSharedCache(SharedCache):
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, updated_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS cache_leases (name TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS cache_counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS cache_buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL);
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def get(self, key):
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT value FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        return loads(row[0]) if row else None
+
+    def set(self, key, value):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, updated_at) VALUES (?, ?, ?)",
+                (key, dumps(value), time.time()),
+            )
+
+    def acquire_lease(self, name, ttl=LEASE_TTL):
+        token = uuid.uuid4().hex
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT expires_at FROM cache_leases WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] > now:
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute("INSERT OR REPLACE INTO cache_leases (name, token, expires_at) VALUES (?, ?, ?)", (name, token, now + ttl))
+            conn.execute("COMMIT")
+        return token
+
+    def release_lease(self, name, token):
+        with closing(self._connect()) as conn:
+            conn.execute("DELETE FROM cache_leases WHERE name = ? AND token = ?", (name, token))
+
+    def increment(self, key, amount=1):
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO cache_counters (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                (key, amount),
+            )
+            value = conn.execute("SELECT value FROM cache_counters WHERE key = ?", (key,)).fetchone()[0]
+            conn.execute("COMMIT")
+        return value
+
+    def raise_to(self, key, value):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO cache_counters (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)",
+                (key, value),
+            )
+
+    def take_token(self, key, rate, capacity):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT tokens, updated_at FROM cache_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            delay = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not delay:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO cache_buckets (key, tokens, updated_at) VALUES (?, ?, ?)", (key, tokens, now))
+            conn.execute("COMMIT")
+        return delay
+
+
+# Redis (or any Redis-compatible server) shared by replicas on different hosts
+class RedisSharedCache(SharedCache):
+    _RAISE_TO = "local v = tonumber(redis.call('GET', KEYS[1]) or '0') if v < tonumber(ARGV[1]) then redis.call('SET', KEYS[1], ARGV[1]) end"
+    _RELEASE = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end return 0"
+    # Returns the wait in microseconds (0 when a token was taken); uses the server clock
+    _TAKE_TOKEN = """
+        local rate, capacity = tonumber(ARGV[1]), tonumber(ARGV[2])
+        local clock = redis.call('TIME')
+        local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+        local tokens = tonumber(state[1]) or capacity
+        local updated_at = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+        local delay = 0
+        if tokens >= 1 then tokens = tokens - 1 else delay = math.ceil((1 - tokens) / rate * 1000000) end
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+        redis.call('EXPIRE', KEYS[1], 3600)
+        return delay
+    """
+
+    def __init__(self, url, prefix="portal:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("PORTAL_SHARED_CACHE points at Redis, but the redis package is not installed") from None
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        data = self.redis.get(self.prefix + key)
+        return loads(data) if data is not None else None
+
+    def set(self, key, value):
+        self.redis.set(self.prefix + key, dumps(value))
+
+    def acquire_lease(self, name, ttl=LEASE_TTL):
+        token = uuid.uuid4().hex
+        if self.redis.set(f"{self.prefix}lease:{name}", token, nx=True, px=int(ttl * 1000)):
+            return token
+        return None
+
+    def release_lease(self, name, token):
+        self.redis.eval(self._RELEASE, 1, f"{self.prefix}lease:{name}", token)
+
+    def increment(self, key, amount=1):
+        return self.redis.incrby(f"{self.prefix}counter:{key}", amount)
+
+    def raise_to(self, key, value):
+        self.redis.eval(self._RAISE_TO, 1, f"{self.prefix}counter:{key}", value)
+
+    def take_token(self, key, rate, capacity):
+        return self.redis.eval(self._TAKE_TOKEN, 1, f"{self.prefix}bucket:{key}", rate, capacity) / 1000000
+
+
+def open_shared_cache(url):
+    if url.startswith("sqlite:///"):
+        return SQLiteSharedCache(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSharedCache(url)
+    raise ValueError(f"Unsupported PORTAL_SHARED_CACHE: {url}")
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+# Get the process-wide shared cache, or None when PORTAL_SHARED_CACHE is not set
+def get_shared_cache():
+    global _shared_cache
+    if not SHARED_CACHE_URL:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = open_shared_cache(SHARED_CACHE_URL)
+        return _shared_cache
@@ -0,0 +1,517 @@
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from portal.instrumentation import metrics, sheets_call
+from portal.rate_limit import MAX_WAIT, is_sheets_busy
+from portal.shared_cache import get_shared_cache
+
+# Streamlit re-executes App.py top to bottom on every widget interaction, but
+# Python modules are imported only once per process. Everything kept here (the
+# authorized client, worksheet handles and worksheet snapshots) is therefore
+# shared by all sessions instead of being rebuilt on every rerun.
+
+DRIVE_FILES_API_V3_URL = "https://www.googleapis.com/drive/v3/files"
+
+# Define Google API scopes
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+# Seconds after which a snapshot is re-fetched even if the revision looks unchanged
+SNAPSHOT_TTL = float(os.environ.get("PORTAL_SNAPSHOT_TTL", "300"))
+
+# Seconds between two Drive revision checks; reruns inside this window make no API calls
+REVISION_CHECK_INTERVAL = float(os.environ.get("PORTAL_REVISION_CHECK_INTERVAL", "15"))
+
+# Revisions produced by this portal's own writes that are remembered (see own_write)
+OWN_WRITE_HISTORY = 100
+
+_SPREADSHEET_ID_PATTERN = re.compile(r"/spreadsheets/d/([a-zA-Z0-9-_]+)")
+
+
+# A1 notation for a whole worksheet, or a range on it
+def sheet_range(title, cells=None):
+    quoted = "'" + title.replace("'", "''") + "'"
+    return f"{quoted}!{cells}" if cells else quoted
+
+
+# Function to create the authorized gspread client (benchmarks swap in a fake).
+# gspread and google-auth are imported here so the SQLite-only mode never loads them.
+def authorize_client(creds_info):
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    creds = Credentials.from_service_account_info(creds_info, scopes=SCOPES)
+    return gspread.authorize(creds)
+
+
+client_factory = authorize_client
+
+
+def set_client_factory(factory):
+    global client_factory
+    client_factory = factory
+
+
+# Immutable copy of one worksheet, shared by every session. Values are stored
+# column by column as interned strings, so repeated values (categories, genders)
+# are kept once and column() hands out the stored tuple instead of a copy.
+@dataclass(frozen=True)
+class WorksheetSnapshot:
+    title: str
+    revision: str
+    fetched_at: float
+    header: tuple
+    columns: tuple = field(repr=False)
+
+    # Build from get_all_values() output, keeping only `columns` if given
+    @classmethod
+    def from_values(cls, title, revision, fetched_at, values, columns=None):
+        header = tuple(values[0]) if values else ()
+        rows = values[1:]
+        wanted = tuple(columns) if columns is not None else header
+        intern = sys.intern
+        data = []
+        for name in wanted:
+            index = header.index(name)
+            data.append(tuple(intern(row[index]) if index < len(row) else "" for row in rows))
+        return cls(title, revision, fetched_at, wanted, tuple(data))
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    @property
+    def rows(self):
+        return tuple(zip(*self.columns))
+
+    def column(self, name):
+        return self.columns[self.header.index(name)]
+
+
+class SheetsDataLayer:
+    def __init__(self, creds_info, sheet_url):
+        self.creds_info = dict(creds_info)
+        self.sheet_url = sheet_url
+        self._lock = threading.RLock()
+        self._client = None
+        self._spreadsheet = None
+        self._worksheets = {}
+        # Opening the spreadsheet and resolving a worksheet are round trips; they have
+        # their own locks so a background read never holds up a rerun's use of self._lock
+        self._spreadsheet_lock = threading.Lock()
+        self._worksheet_locks = {}
+        self._snapshots = {}
+        self._snapshot_locks = {}
+        self._tails = {}
+        self._revision = None
+        self._revision_checked_at = 0.0
+        # Single-flight for the Drive revision check, which is a round trip as well
+        self._revision_lock = threading.Lock()
+        self._invalidations = 0
+        # Revision after one of our own writes -> (revision before it, worksheet written)
+        self._own_writes = {}
+        # Set when PORTAL_SHARED_CACHE is configured; replicas then share revisions and snapshots
+        self.shared_cache = get_shared_cache()
+
+    # One authorized client per process
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                with sheets_call("authorize", "auth"):
+                    self._client = client_factory(self.creds_info)
+            return self._client
+
+    @property
+    def spreadsheet(self):
+        with self._spreadsheet_lock:
+            if self._spreadsheet is None:
+                client = self.client
+                with sheets_call("open_by_url"):
+                    self._spreadsheet = client.open_by_url(self.sheet_url)
+            return self._spreadsheet
+
+    # Taken from the URL when possible, so revision checks and batched reads do not
+    # have to open the spreadsheet (a metadata round trip) first
+    @property
+    def spreadsheet_id(self):
+        match = _SPREADSHEET_ID_PATTERN.search(self.sheet_url)
+        return match.group(1) if match else self.spreadsheet.id
+
+    # Worksheet handles are resolved once; each worksheet() call is a metadata round trip
+    def worksheet(self, title, max_wait=MAX_WAIT):
+        with self._lock:
+            worksheet = self._worksheets.get(title)
+            if worksheet is not None:
+                return worksheet
+            title_lock = self._worksheet_locks.setdefault(title, threading.Lock())
+        with title_lock:
+            if title not in self._worksheets:
+                spreadsheet = self.spreadsheet
+                with sheets_call("worksheet", max_wait=max_wait):
+                    worksheet = spreadsheet.worksheet(title)
+                with self._lock:
+                    self._worksheets[title] = worksheet
+            return self._worksheets[title]
+
+    # Current Drive revision of the spreadsheet, checked at most once per REVISION_CHECK_INTERVAL.
+    # Sessions arriving while it is checked wait for that check, not for self._lock.
+    def revision(self, force=False):
+        with self._lock:
+            if not force and self._revision_is_fresh():
+                return self._revision
+        with self._revision_lock:
+            with self._lock:
+                if not force and self._revision_is_fresh():
+                    return self._revision
+                invalidations = self._invalidations
+            checked_at = time.monotonic()
+            if self.shared_cache is not None and not force:
+                revision = self._shared_revision()
+            else:
+                revision = self._fetch_revision()
+            with self._lock:
+                # An invalidate() during the check wins; the next call checks again
+                if self._invalidations == invalidations:
+                    self._revision = revision
+                    self._revision_checked_at = checked_at
+            return revision
+
+    # Needs self._lock
+    def _revision_is_fresh(self):
+        return self._revision is not None and time.monotonic() - self._revision_checked_at < REVISION_CHECK_INTERVAL
+
+    def _fetch_revision(self):
+        http_client, spreadsheet_id = self.client.http_client, self.spreadsheet_id
+        with sheets_call("drive_revision", "drive"):
+            response = http_client.request(
+                "get",
+                f"{DRIVE_FILES_API_V3_URL}/{spreadsheet_id}",
+                params={"supportsAllDrives": True, "fields": "version,modifiedTime"},
+            )
+        metadata = response.json()
+        # "version" bumps on every change; fall back to modifiedTime if it is missing
+        return str(metadata.get("version") or metadata.get("modifiedTime") or "")
+
+    # Revision last published by any replica; only the lease holder asks Drive again
+    def _shared_revision(self):
+        key = f"revision:{self.sheet_url}"
+        entry = self.shared_cache.get(key)
+        if entry is not None and time.time() - entry[1] < REVISION_CHECK_INTERVAL:
+            return entry[0]
+        token = self.shared_cache.acquire_lease(key, ttl=REVISION_CHECK_INTERVAL)
+        if token is None:
+            # Another replica is checking right now; its answer will be published shortly
+            return entry[0] if entry is not None else self._fetch_revision()
+        try:
+            revision = self._fetch_revision()
+            self.shared_cache.set(key, (revision, time.time()))
+            return revision
+        finally:
+            self.shared_cache.release_lease(key, token)
+
+    # Wrap a write of this portal to one worksheet. The Drive revision is read right before
+    # and after it, so the revision it produced is known as our own: it makes the data of
+    # that worksheet stale, but not the snapshots of the others (Volunteer Details and
+    # Message Templates are not re-read after every appended request). Someone else's
+    # edit landing during the write is only noticed after SNAPSHOT_TTL.
+    @contextmanager
+    def own_write(self, title):
+        before = self._revision_or_none()
+        yield
+        after = self._revision_or_none()
+        if before is None or after is None or after == before:
+            return
+        with self._lock:
+            own_writes = self._shared_own_writes() if self.shared_cache is not None else self._own_writes
+            own_writes[after] = (before, title)
+            while len(own_writes) > OWN_WRITE_HISTORY:
+                del own_writes[next(iter(own_writes))]
+            self._own_writes = own_writes
+            if self.shared_cache is not None:
+                self.shared_cache.set(f"own-writes:{self.sheet_url}", own_writes)
+
+    # Read without updating the cached revision, so reruns keep their check interval.
+    # A failed check must not fail the write it surrounds.
+    def _revision_or_none(self):
+        try:
+            return self._fetch_revision()
+        except Exception:
+            metrics.increment("sheets.own_write_revision_errors")
+            return None
+
+    def _shared_own_writes(self):
+        return dict(self.shared_cache.get(f"own-writes:{self.sheet_url}") or {})
+
+    # Whether data of `title` read at `revision` is still current: the spreadsheet is
+    # at that revision, or only our own writes to other worksheets came after it
+    def is_current(self, revision, title, current=None):
+        current = self.revision() if current is None else current
+        if current == revision:
+            return True
+        own_writes = self._shared_own_writes() if self.shared_cache is not None else self._own_writes
+        seen = set()
+        while current in own_writes and current not in seen:
+            seen.add(current)
+            current, written = own_writes[current]
+            if written == title:
+                return False
+            if current == revision:
+                return True
+        return False
+
+    # Snapshot of a worksheet, refreshed only when the revision changes or the TTL expires.
+    # `columns` keeps only those columns; pass the same list on every call for a title.
+    def snapshot(self, title, columns=None):
+        with self._lock:
+            title_lock = self._snapshot_locks.setdefault(title, threading.Lock())
+
+        # Per-worksheet lock so concurrent sessions wait for one refresh instead of each fetching
+        with title_lock:
+            stale = self._snapshots.get(title)
+            try:
+                if stale is not None and time.time() - stale.fetched_at < SNAPSHOT_TTL:
+                    if self.is_current(stale.revision, title):
+                        return stale
+
+                revision = self.revision()
+                if self.shared_cache is not None:
+                    snapshot = self._shared_snapshot(title, revision, columns)
+                else:
+                    # With an older copy at hand, do not queue behind other Sheets calls
+                    snapshot = self._fetch_snapshot(title, revision, columns, MAX_WAIT if stale is None else 0)
+            except Exception as error:
+                # A busy rate limiter or Google 429/5xx: keep serving the older copy
+                if stale is None or not is_sheets_busy(error):
+                    raise
+                metrics.increment("sheets.stale_served")
+                return stale
+            self._snapshots[title] = snapshot
+            return snapshot
+
+    def _fetch_snapshot(self, title, revision, columns=None, max_wait=MAX_WAIT):
+        worksheet = self.worksheet(title, max_wait)
+        with sheets_call("get_all_values", max_wait=max_wait):
+            values = worksheet.get_all_values()
+        return WorksheetSnapshot.from_values(title, revision, time.time(), values, columns)
+
+    # Single-flight across replicas: the lease holder fetches and publishes the
+    # snapshot, everyone else waits for it and reads the shared copy
+    def _shared_snapshot(self, title, revision, columns=None):
+        key = f"snapshot:{self.sheet_url}:{title}"
+
+        def is_current(snapshot):
+            return self.is_current(snapshot.revision, title, revision) and time.time() - snapshot.fetched_at < SNAPSHOT_TTL
+
+        snapshot = self.shared_cache.get(key)
+        if snapshot is not None and is_current(snapshot):
+            metrics.increment("shared_cache.snapshot_hits")
+            return snapshot
+
+        token = self.shared_cache.acquire_lease(key)
+        if token is None:
+            metrics.increment("shared_cache.snapshot_waits")
+            snapshot = self.shared_cache.wait_for(key, is_current)
+            # The lease holder died or is too slow: fetch it ourselves
+            return snapshot if snapshot is not None else self._fetch_snapshot(title, revision, columns)
+        try:
+            snapshot = self._fetch_snapshot(title, revision, columns)
+            self.shared_cache.set(key, snapshot)
+            return snapshot
+        finally:
+            self.shared_cache.release_lease(key, token)
+
+    # Read several worksheets (title -> columns, as for snapshot()) and tails in one
+    # values:batchGet request, with the revision check running alongside it, so a
+    # cold start waits for about one round trip instead of one per worksheet.
+    # Anything already loaded is skipped. With a shared cache the regular
+    # single-flight path is used instead, since the shared copy is usually there.
+    def prefetch(self, snapshots, tails=()):
+        if self.shared_cache is not None:
+            return
+        with self._lock:
+            snapshots = {title: columns for title, columns in snapshots.items() if title not in self._snapshots}
+        tails = [tail for tail in tails if not tail.loaded]
+        if not snapshots and not tails:
+            return
+
+        ranges = [sheet_range(title) for title in snapshots] + [tail.range_name() for tail in tails]
+        http_client, spreadsheet_id = self.client.http_client, self.spreadsheet_id
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="portal-revision") as pool:
+            # A change landing between the two requests is picked up after SNAPSHOT_TTL at the latest
+            revision_future = pool.submit(self.revision)
+            with sheets_call("values_batch_get"):
+                response = http_client.values_batch_get(spreadsheet_id, ranges)
+            revision = revision_future.result()
+
+        value_ranges = [value_range.get("values", []) for value_range in response.get("valueRanges", [])]
+        fetched_at = time.time()
+        with self._lock:
+            for (title, columns), values in zip(snapshots.items(), value_ranges):
+                self._snapshots.setdefault(
+                    title, WorksheetSnapshot.from_values(title, revision, fetched_at, values, columns)
+                )
+        for tail, values in zip(tails, value_ranges[len(snapshots):]):
+            tail.load(values, revision)
+
+    # Column-projected, append-only view of a worksheet (e.g. only the Request ID column)
+    def tail(self, title, columns="A:A", header_rows=1):
+        with self._lock:
+            key = (title, columns)
+            if key not in self._tails:
+                self._tails[key] = WorksheetTail(self, title, columns, header_rows)
+            return self._tails[key]
+
+    # Drop cached snapshots, e.g. right after this process wrote to the sheet
+    def invalidate(self, title=None):
+        with self._lock:
+            if title is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(title, None)
+            self._revision = None
+            self._invalidations += 1
+
+
+# Reads only some columns of a worksheet and, after the first read, only the rows
+# appended since the last known row count. Whenever rows above the last known one
+# were removed, the columns are read again from the top; that starts a new
+# generation. Edits to rows already read are picked up by a full re-read every
+# SNAPSHOT_TTL, which runs on a background thread so no rerun waits for a read that
+# grows with the sheet's history.
+class WorksheetTail:
+    def __init__(self, data_layer, title, columns="A:A", header_rows=1):
+        self.data_layer = data_layer
+        self.title = title
+        self.first_column, self.last_column = columns.split(":")
+        self.header_rows = header_rows
+        self._lock = threading.Lock()
+        self._rows = []
+        self._generation = 0
+        self._revision = None
+        self._synced_at = None
+        self._resyncing = False
+
+    @property
+    def loaded(self):
+        return self._synced_at is not None
+
+    # A1 range of the rows after the ones already read, including the sheet name
+    def range_name(self):
+        return sheet_range(self.title, f"{self.first_column}{self.header_rows + len(self._rows) + 1}:{self.last_column}")
+
+    # Start an empty tail from values read elsewhere, e.g. by a batched prefetch
+    def load(self, values, revision):
+        with self._lock:
+            if self._synced_at is not None:
+                return
+            self._replace(values, revision)
+
+    # Fetch rows appended since the last refresh; a no-op while the revision is unchanged
+    def refresh(self):
+        with self._lock:
+            if self._synced_at is None:
+                revision = self.data_layer.revision()
+                self._replace(self._read(self.header_rows + 1, MAX_WAIT), revision)
+                return
+            if time.time() - self._synced_at >= SNAPSHOT_TTL:
+                self._resync_in_background()
+            # Once something has been read, a busy rate limiter or Google 429/5xx means
+            # "keep what we have"
+            try:
+                revision = self.data_layer.revision()
+                if self.data_layer.is_current(self._revision, self.title, revision):
+                    return
+                if self._rows:
+                    # The last known row is read again: if it moved, rows above it were
+                    # removed (e.g. archived) and the whole range has to be read again
+                    values = self._read(self.header_rows + len(self._rows), 0)
+                    if values and tuple(values[0]) == self._rows[-1]:
+                        # Rows are only ever appended within a generation, so cursors stay valid
+                        self._rows.extend(tuple(row) for row in values[1:])
+                        self._revision = revision
+                        return
+                    metrics.increment("sheets.tail_resyncs")
+                values = self._read(self.header_rows + 1, 0)
+            except Exception as error:
+                if not is_sheets_busy(error):
+                    raise
+                metrics.increment("sheets.stale_served")
+                return
+            self._replace(values, revision)
+
+    # Start a new generation from a full read. Needs the lock.
+    def _replace(self, values, revision):
+        self._rows = [tuple(row) for row in values]
+        self._generation += 1
+        self._synced_at = time.time()
+        self._revision = revision
+
+    # Needs the lock
+    def _resync_in_background(self):
+        if self._resyncing:
+            return
+        self._resyncing = True
+        threading.Thread(target=self._resync, name="portal-tail-resync", daemon=True).start()
+
+    # Full re-read for edits to rows already read. Only when such a row changed does a
+    # new generation start (consumers then rebuild); otherwise the new rows are appended.
+    def _resync(self):
+        try:
+            revision = self.data_layer.revision()
+            values = [tuple(row) for row in self._read(self.header_rows + 1, MAX_WAIT)]
+            with self._lock:
+                generation, rows, count = self._generation, self._rows, len(self._rows)
+            # Rows are only appended within a generation, so a prefix match means nothing was
+            # edited; compared without the lock, as it is proportional to the sheet
+            unchanged = len(values) >= count and values[:count] == rows[:count]
+            with self._lock:
+                if self._generation != generation:
+                    return
+                if unchanged:
+                    self._rows.extend(values[len(self._rows):])
+                    self._synced_at = time.time()
+                else:
+                    metrics.increment("sheets.tail_resyncs")
+                    self._replace(values, revision)
+        except Exception:
+            metrics.increment("sheets.tail_resync_errors")
+            with self._lock:
+                # Tried again after another SNAPSHOT_TTL
+                self._synced_at = time.time()
+        finally:
+            with self._lock:
+                self._resyncing = False
+
+    def _read(self, start_row, max_wait):
+        worksheet = self.data_layer.worksheet(self.title, max_wait)
+        with sheets_call("values_get", max_wait=max_wait):
+            return worksheet.get(f"{self.first_column}{start_row}:{self.last_column}")
+
+    # Rows added since `cursor`; a new generation means "start over from these rows"
+    def rows_since(self, cursor=None):
+        with self._lock:
+            generation, count = self._generation, len(self._rows)
+            if cursor is None or cursor[0] != generation:
+                return self._rows[:count], (generation, count), True
+            return self._rows[cursor[1]:count], (generation, count), False
+
+
+_layers = {}
+_layers_lock = threading.Lock()
+
+
+# Get the process-wide data layer for a spreadsheet
+def get_data_layer(creds_info, sheet_url):
+    key = (creds_info.get("client_email"), sheet_url)
+    with _layers_lock:
+        if key not in _layers:
+            _layers[key] = SheetsDataLayer(creds_info, sheet_url)
+        return _layers[key]
@@ -0,0 +1,468 @@
+import os
+import sqlite3
+import threading
+import time
+
+from portal.archive import ARCHIVE_MANIFEST_SHEET, ArchiveManifest
+from portal.instrumentation import metrics, sheets_call
+from portal.participants import PARTICIPANT_COLUMNS, ParticipantRecord, get_participant_index, normalize_email
+from portal.request_ids import RequestIdAllocator, get_request_id_allocator
+from portal.request_index import DEFAULT_STATUS, STATUS_COLUMN, RequestIndex
+from portal.sheets_data import SNAPSHOT_TTL
+from portal.triage import RequestTriage
+
+# Which engine App.py talks to: "sheets" (default), "sqlite" (local primary store,
+# runs fully offline) or "sqlite-replica" (reads from SQLite, synced from Sheets)
+STORAGE_ENGINE = os.environ.get("PORTAL_STORAGE", "sheets")
+
+SQLITE_PATH = os.environ.get("PORTAL_SQLITE_PATH", os.path.join(".cache", "portal.sqlite3"))
+
+# Worksheet names in the Google Sheet
+PARTICIPANTS_SHEET = "Volunteer Details"
+REQUESTS_SHEET = "Requests"
+MESSAGE_TEMPLATES_SHEET = "Message Templates"
+MESSAGE_TEMPLATE_COLUMNS = ("Template Name", "Message")
+
+# Columns written for every request, in sheet order
+REQUEST_COLUMNS = (
+    "Request ID", "Name", "Gender", "Email ID", "Phone Number", "Volunteer Category",
+    "Request Type", "Sub Category", "From Date", "To Date", "Description", "Timestamp",
+)
+
+# Request columns plus the optional Status column (A:M) read by "Track my Request"
+TRACKED_REQUEST_COLUMNS = REQUEST_COLUMNS + (STATUS_COLUMN,)
+
+
+# Everything App.py needs from a data store
+class StorageBackend:
+    # Called once per rerun; must be cheap when nothing changed
+    def refresh(self):
+        pass
+
+    def participant_by_email(self, email):
+        raise NotImplementedError
+
+    # phone_number must already be normalized to E.164
+    def participant_by_phone(self, phone_number):
+        raise NotImplementedError
+
+    # Masked emails close to a mistyped one, for "did you mean" hints
+    def suggest_emails(self, email):
+        raise NotImplementedError
+
+    # Message text for a template name, or None if there is no such template
+    def message_template(self, template_name):
+        raise NotImplementedError
+
+    def append_requests(self, rows):
+        raise NotImplementedError
+
+    # Stored columns of a request (plus its Status) as a dict, or None if there is no such request
+    def request_details(self, request_id):
+        raise NotImplementedError
+
+    def reserve_request_ids(self, prefix, count=1):
+        raise NotImplementedError
+
+    # Move the ID counters past Request IDs that were handed out but are not stored yet
+    # (journaled submissions), so a lost counter store never hands them out again
+    def recover_request_ids(self, request_ids):
+        raise NotImplementedError
+
+    # Which of these Request IDs are already stored, read from the store itself rather
+    # than a cache; the submission writer asks before it writes a replayed row again
+    def stored_request_ids(self, request_ids):
+        raise NotImplementedError
+
+    # Up-to-date RequestTriage over all active requests, for the coordinator view
+    def request_triage(self):
+        raise NotImplementedError
+
+
+# The Google Sheet itself, read through the shared snapshot layer
+class SheetsStorage(StorageBackend):
+    def __init__(self, data_layer, allocator=None):
+        self.data_layer = data_layer
+        self.allocator = allocator or get_request_id_allocator()
+        self.request_ids_tail = data_layer.tail(REQUESTS_SHEET, "A:A")
+        self._templates = (None, {})
+        self._request_index = None
+        self._request_index_lock = threading.Lock()
+        self._triage = None
+        self._manifest = (None, ArchiveManifest())
+        self._manifest_missing_since = None
+        self._manifest_lock = threading.Lock()
+        self._manifest_checked_at = None
+        self._manifest_refreshing = False
+        self._archive_indexes = {}
+
+    def refresh(self):
+        # The first refresh reads everything the form needs in one batched request
+        self.data_layer.prefetch(
+            {PARTICIPANTS_SHEET: PARTICIPANT_COLUMNS, MESSAGE_TEMPLATES_SHEET: MESSAGE_TEMPLATE_COLUMNS},
+            [self.request_ids_tail],
+        )
+        # Only the Request ID column is read, and after the first read only newly appended rows
+        self.request_ids_tail.refresh()
+        self.allocator.recover_from_tail(self.request_ids_tail)
+        self.refresh_archive_manifest_in_background()
+
+    # ID counters also recover from the archive manifest, which only changes when
+    # requests are archived. It is re-read by a background thread at most once per
+    # SNAPSHOT_TTL, so neither a rerun nor a submit waits for it.
+    def refresh_archive_manifest_in_background(self):
+        with self._manifest_lock:
+            checked_at = self._manifest_checked_at
+            if self._manifest_refreshing or (checked_at is not None and time.monotonic() - checked_at < SNAPSHOT_TTL):
+                return
+            self._manifest_refreshing = True
+        threading.Thread(target=self._refresh_archive_manifest, name="portal-archive-manifest", daemon=True).start()
+
+    def _refresh_archive_manifest(self):
+        try:
+            self.archive_manifest()
+        except Exception:
+            metrics.increment("archive.manifest_errors")
+        finally:
+            with self._manifest_lock:
+                self._manifest_checked_at = time.monotonic()
+                self._manifest_refreshing = False
+
+    def participants_snapshot(self):
+        return self.data_layer.snapshot(PARTICIPANTS_SHEET, PARTICIPANT_COLUMNS)
+
+    def templates_snapshot(self):
+        return self.data_layer.snapshot(MESSAGE_TEMPLATES_SHEET, MESSAGE_TEMPLATE_COLUMNS)
+
+    def participant_index(self):
+        return get_participant_index(self.participants_snapshot())
+
+    def participant_by_email(self, email):
+        return self.participant_index().by_email(email)
+
+    def participant_by_phone(self, phone_number):
+        return self.participant_index().by_phone(phone_number)
+
+    def suggest_emails(self, email):
+        return self.participant_index().email_search().suggest(email)
+
+    def message_templates(self):
+        snapshot = self.templates_snapshot()
+        cached_snapshot, templates = self._templates
+        if cached_snapshot is not snapshot:
+            templates = {}
+            for template_name, message in zip(snapshot.column("Template Name"), snapshot.column("Message")):
+                templates.setdefault(template_name, message)
+            self._templates = (snapshot, templates)
+        return templates
+
+    def message_template(self, template_name):
+        return self.message_templates().get(template_name)
+
+    def append_requests(self, rows):
+        worksheet = self.data_layer.worksheet(REQUESTS_SHEET)
+        with self.data_layer.own_write(REQUESTS_SHEET), sheets_call("append_rows", "write"):
+            worksheet.append_rows([list(row) for row in rows])
+
+    # Full request rows are only read once somebody tracks a request, then kept
+    # up to date from newly appended rows
+    def request_index(self):
+        with self._request_index_lock:
+            if self._request_index is None:
+                self._request_index = RequestIndex(self.data_layer.tail(REQUESTS_SHEET, "A:M"), TRACKED_REQUEST_COLUMNS)
+            request_index = self._request_index
+        request_index.refresh()
+        return request_index
+
+    # Shares the A:M tail with the request index, so both read new rows only once
+    def request_triage(self):
+        with self._request_index_lock:
+            if self._triage is None:
+                self._triage = RequestTriage(self.data_layer.tail(REQUESTS_SHEET, "A:M"), TRACKED_REQUEST_COLUMNS)
+            triage = self._triage
+        triage.refresh()
+        return triage
+
+    # Only the active "Requests" worksheet is indexed; archived requests are found
+    # through the archive manifest
+    def request_details(self, request_id):
+        details = self.request_index().get(request_id)
+        if details is not None:
+            return details
+        for shard in self.archive_manifest().shards_for(request_id):
+            details = self.archived_request_details(shard, request_id)
+            if details is not None:
+                return details
+        return None
+
+    # Archive shards are read on demand and indexed once per snapshot
+    def archived_request_details(self, shard, request_id):
+        snapshot = self.data_layer.snapshot(shard)
+        cached_snapshot, rows_by_id = self._archive_indexes.get(shard, (None, None))
+        if cached_snapshot is not snapshot:
+            rows_by_id = {value: row for row, value in enumerate(snapshot.column("Request ID"))}
+            self._archive_indexes[shard] = (snapshot, rows_by_id)
+        row = rows_by_id.get(str(request_id).strip().upper())
+        if row is None:
+            return None
+        details = {column: values[row] for column, values in zip(snapshot.header, snapshot.columns)}
+        details[STATUS_COLUMN] = details.get(STATUS_COLUMN) or DEFAULT_STATUS
+        return details
+
+    # Manifest of archived shards (empty until requests were first archived). It is
+    # read when needed rather than at startup, and a missing manifest worksheet is
+    # only looked for again after SNAPSHOT_TTL.
+    def archive_manifest(self):
+        from gspread.exceptions import WorksheetNotFound
+
+        if self._manifest_missing_since is not None and time.monotonic() - self._manifest_missing_since < SNAPSHOT_TTL:
+            return self._manifest[1]
+        try:
+            snapshot = self.data_layer.snapshot(ARCHIVE_MANIFEST_SHEET)
+        except WorksheetNotFound:
+            self._manifest_missing_since = time.monotonic()
+            return self._manifest[1]
+        self._manifest_missing_since = None
+        cached_snapshot, manifest = self._manifest
+        if cached_snapshot is not snapshot:
+            manifest = ArchiveManifest.from_snapshot(snapshot)
+            self._manifest = (snapshot, manifest)
+            # Archived IDs are no longer in the active worksheet, so counters recover from the manifest
+            self.allocator.recover(manifest.last_request_ids())
+        return manifest
+
+    # Only the local counters are used; the manifest moves them forward in the background
+    def reserve_request_ids(self, prefix, count=1):
+        return self.allocator.allocate(prefix, count)
+
+    def recover_request_ids(self, request_ids):
+        self.allocator.recover(request_ids)
+
+    # The Request ID column is read in full: the cached tail only notices new rows once
+    # the Drive revision changes, and this must see an append made seconds ago. Archive
+    # shards are not looked at; the manifest only knows ID ranges, which may have gaps.
+    def stored_request_ids(self, request_ids):
+        wanted = {str(request_id).strip().upper() for request_id in request_ids}
+        worksheet = self.data_layer.worksheet(REQUESTS_SHEET)
+        with sheets_call("values_get"):
+            values = worksheet.get("A2:A")
+        return {row[0] for row in values if row and row[0] in wanted}
+
+
+# Indexed local SQLite store. Used on its own it is the primary store; through
+# SQLiteReplicaStorage it is a read replica of the Google Sheet.
+class SQLiteStorage(StorageBackend):
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._email_search = None
+        self._email_search_lock = threading.Lock()
+        self._triage = None
+        self._triage_lock = threading.Lock()
+        # ID counters live in the same database file
+        self.allocator = RequestIdAllocator(path)
+        self._create_tables()
+
+    # sqlite3 connections cannot be shared between threads, and every session has its own
+    @property
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _create_tables(self):
+        request_columns = ", ".join(f'"{column}" TEXT' for column in REQUEST_COLUMNS[1:])
+        with self.conn:
+            self.conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS participants (
+                    name TEXT, gender TEXT, category TEXT, email TEXT, email_key TEXT, phone TEXT
+                );
+                CREATE INDEX IF NOT EXISTS participants_email_key ON participants (email_key);
+                CREATE INDEX IF NOT EXISTS participants_phone ON participants (phone);
+                CREATE TABLE IF NOT EXISTS message_templates (name TEXT PRIMARY KEY, message TEXT);
+                CREATE TABLE IF NOT EXISTS requests ("Request ID" TEXT PRIMARY KEY, {request_columns});
+            """)
+
+    def _participant(self, where, value):
+        row = self.conn.execute(
+            f"SELECT name, gender, category, email, phone FROM participants WHERE {where} = ? ORDER BY rowid LIMIT 1",
+            (value,),
+        ).fetchone()
+        return ParticipantRecord(*row) if row else None
+
+    def participant_by_email(self, email):
+        if not email:
+            return None
+        return self._participant("email_key", normalize_email(email))
+
+    def participant_by_phone(self, phone_number):
+        if not phone_number:
+            return None
+        return self._participant("phone", phone_number)
+
+    # The trigram index is kept in memory and rebuilt after participants are reloaded
+    def suggest_emails(self, email):
+        from portal.email_search import EmailSearchIndex
+
+        with self._email_search_lock:
+            if self._email_search is None:
+                emails = (row[0] for row in self.conn.execute("SELECT email FROM participants ORDER BY rowid"))
+                self._email_search = EmailSearchIndex(emails)
+            email_search = self._email_search
+        return email_search.suggest(email)
+
+    def message_template(self, template_name):
+        row = self.conn.execute("SELECT message FROM message_templates WHERE name = ?", (template_name,)).fetchone()
+        return row[0] if row else None
+
+    def append_requests(self, rows):
+        placeholders = ", ".join("?" * len(REQUEST_COLUMNS))
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR IGNORE INTO requests VALUES ({placeholders})",
+                [tuple(row) for row in rows],
+            )
+
+    def request_details(self, request_id):
+        cursor = self.conn.execute('SELECT * FROM requests WHERE "Request ID" = ?', (str(request_id).strip().upper(),))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        details = dict(zip((column[0] for column in cursor.description), row))
+        details[STATUS_COLUMN] = DEFAULT_STATUS
+        return details
+
+    def reserve_request_ids(self, prefix, count=1):
+        return self.allocator.allocate(prefix, count)
+
+    def recover_request_ids(self, request_ids):
+        self.allocator.recover(request_ids)
+
+    def stored_request_ids(self, request_ids):
+        request_ids = [str(request_id).strip().upper() for request_id in request_ids]
+        placeholders = ", ".join("?" * len(request_ids))
+        rows = self.conn.execute(f'SELECT "Request ID" FROM requests WHERE "Request ID" IN ({placeholders})', request_ids)
+        return {row[0] for row in rows}
+
+    def request_triage(self):
+        with self._triage_lock:
+            if self._triage is None:
+                self._triage = RequestTriage(SQLiteRequestRows(self), REQUEST_COLUMNS)
+            triage = self._triage
+        triage.refresh()
+        return triage
+
+    # Replace all participants in one transaction (records are ParticipantRecord tuples)
+    def load_participants(self, records):
+        with self.conn:
+            self.conn.execute("DELETE FROM participants")
+            self.conn.executemany(
+                "INSERT INTO participants VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (record.name, record.gender, record.category, record.email, normalize_email(record.email), record.phone)
+                    for record in records
+                ),
+            )
+        with self._email_search_lock:
+            self._email_search = None
+
+    def load_message_templates(self, templates):
+        with self.conn:
+            self.conn.execute("DELETE FROM message_templates")
+            self.conn.executemany("INSERT OR IGNORE INTO message_templates VALUES (?, ?)", templates.items())
+
+
+# Serves lookups from SQLite and sends writes to the Google Sheet. The replica is
+# re-synced whenever the Sheets snapshot it was loaded from changes.
+class SQLiteReplicaStorage(StorageBackend):
+    def __init__(self, primary, replica):
+        self.primary = primary
+        self.replica = replica
+        self._lock = threading.Lock()
+        self._synced_from = (None, None)
+
+    def refresh(self):
+        self.primary.refresh()
+        participants = self.primary.participants_snapshot()
+        templates = self.primary.templates_snapshot()
+        with self._lock:
+            synced_participants, synced_templates = self._synced_from
+            if synced_participants is not participants:
+                self.replica.load_participants(self.primary.participant_index().records())
+            if synced_templates is not templates:
+                self.replica.load_message_templates(self.primary.message_templates())
+            self._synced_from = (participants, templates)
+
+    def participant_by_email(self, email):
+        return self.replica.participant_by_email(email)
+
+    def participant_by_phone(self, phone_number):
+        return self.replica.participant_by_phone(phone_number)
+
+    def suggest_emails(self, email):
+        return self.replica.suggest_emails(email)
+
+    def message_template(self, template_name):
+        return self.replica.message_template(template_name)
+
+    def append_requests(self, rows):
+        self.primary.append_requests(rows)
+
+    # Requests are not copied into the replica; the sheet is the only place they live
+    def request_details(self, request_id):
+        return self.primary.request_details(request_id)
+
+    def reserve_request_ids(self, prefix, count=1):
+        return self.primary.reserve_request_ids(prefix, count)
+
+    def stored_request_ids(self, request_ids):
+        return self.primary.stored_request_ids(request_ids)
+
+    def recover_request_ids(self, request_ids):
+        self.primary.recover_request_ids(request_ids)
+
+    def request_triage(self):
+        return self.primary.request_triage()
+
+
+# Rows of the requests table in insertion order, read like a WorksheetTail
+class SQLiteRequestRows:
+    def __init__(self, storage):
+        self.storage = storage
+
+    def refresh(self):
+        pass
+
+    # The cursor is the last rowid read
+    def rows_since(self, cursor=None):
+        last_rowid = cursor or 0
+        rows = self.storage.conn.execute("SELECT rowid, * FROM requests WHERE rowid > ? ORDER BY rowid", (last_rowid,)).fetchall()
+        if rows:
+            last_rowid = rows[-1][0]
+        return [row[1:] for row in rows], last_rowid, cursor is None
+
+
+_storage = {}
+_storage_lock = threading.Lock()
+
+
+# Get the process-wide storage backend for STORAGE_ENGINE
+def get_storage(engine=STORAGE_ENGINE, data_layer=None):
+    with _storage_lock:
+        key = (engine, id(data_layer))
+        if key not in _storage:
+            if engine == "sqlite":
+                _storage[key] = SQLiteStorage()
+            elif engine == "sqlite-replica":
+                _storage[key] = SQLiteReplicaStorage(SheetsStorage(data_layer), SQLiteStorage())
+            elif engine == "sheets":
+                _storage[key] = SheetsStorage(data_layer)
+            else:
+                raise ValueError(f"Unknown storage engine: {engine}")
+        return _storage[key]
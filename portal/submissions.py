@@ -0,0 +1,328 @@
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+
+
+from portal.instrumentation import metrics, span
+from portal.rate_limit import SheetsBusyError, is_sheets_busy
+
+# Submission states reported back to the session that queued the request
+QUEUED = "queued"
+RETRYING = "retrying"
+SAVED = "saved"
+FAILED = "failed"
+
+# Largest number of rows coalesced into one append_rows call
+MAX_BATCH_ROWS = int(os.environ.get("PORTAL_SUBMIT_BATCH_ROWS", "200"))
+
+# How long the worker waits for more rows before writing a batch
+BATCH_WINDOW = float(os.environ.get("PORTAL_SUBMIT_BATCH_WINDOW", "0.5"))
+
+# Exponential backoff with full jitter on quota and transient errors
+RETRY_BASE_DELAY = float(os.environ.get("PORTAL_SUBMIT_RETRY_BASE", "1"))
+RETRY_MAX_DELAY = float(os.environ.get("PORTAL_SUBMIT_RETRY_MAX", "64"))
+MAX_ATTEMPTS = int(os.environ.get("PORTAL_SUBMIT_MAX_ATTEMPTS", "10"))
+
+# Number of finished submissions whose status is remembered
+STATUS_HISTORY_SIZE = 10000
+
+# A repeat of the same submission within this many seconds returns the original Request ID
+DEDUPE_WINDOW = float(os.environ.get("PORTAL_SUBMIT_DEDUPE_WINDOW", "600"))
+DEDUPE_MAX_ENTRIES = 50000
+
+
+# 429 (quota), 5xx responses and a busy rate limiter are worth retrying; anything else is a real error
+def is_retryable_error(error):
+    if is_sheets_busy(error):
+        return True
+
+    from requests.exceptions import ConnectionError, Timeout
+
+    return isinstance(error, (ConnectionError, Timeout))
+
+
+# Whether a failed append may still have reached the sheet (a timeout or 5xx can come
+# back after the rows were written); a quota error or a busy rate limiter never does
+def may_have_been_written(error):
+    if isinstance(error, SheetsBusyError):
+        return False
+
+    from gspread.exceptions import APIError
+
+    return not (isinstance(error, APIError) and error.code == 429)
+
+
+# The check whether uncertain rows are already stored failed. Not knowing is no proof
+# that a row was never written, so this is always retried rather than failing the rows.
+class StoredCheckError(Exception):
+    pass
+
+
+def backoff_delay(attempt):
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+# Idempotency key of a submission: the session plus a hash of what was submitted
+def submission_key(session_key, email, request_type, sub_category, from_date, to_date, description):
+    content = json.dumps([
+        str(email).strip().casefold(), request_type, sub_category, from_date, to_date, description.strip(),
+    ])
+    return f"{session_key}:{hashlib.sha256(content.encode()).hexdigest()}"
+
+
+# Idempotency key -> Request ID for recent submissions, bounded in size and age.
+# Entries are kept in insertion order, which is also their expiry order.
+class DedupeIndex:
+    def __init__(self, window=DEDUPE_WINDOW, max_entries=DEDUPE_MAX_ENTRIES):
+        self.window = window
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._entries:
+            key, (_, added_at) = next(iter(self._entries.items()))
+            if now - added_at < self.window and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get(key)
+            return entry[0] if entry else None
+
+    # Remember key -> request_id; returns the Request ID already stored for key, if any
+    def add(self, key, request_id):
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            if key in self._entries:
+                return self._entries[key][0]
+            self._entries[key] = (request_id, now)
+            return None
+
+    # Forget key -> request_id again, e.g. when that submission could not be queued
+    def discard(self, key, request_id):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == request_id:
+                del self._entries[key]
+
+
+class SubmissionStatus:
+    def __init__(self, request_id, queued_at=None):
+        self.request_id = request_id
+        self.state = QUEUED
+        self.error = None
+        self.queued_at = queued_at or time.time()
+        self.saved_at = None
+        # The row may already be in the sheet (replayed from the journal, or an append
+        # that failed ambiguously), so the sheet is checked before it is written again
+        self.uncertain = False
+
+    @property
+    def done(self):
+        return self.state in (SAVED, FAILED)
+
+
+# Write-behind queue for new requests. Sessions get their request ID back
+# immediately, and a single background worker appends pending rows in batches.
+# With a journal (portal/journal.py) every row is fsync'd to local disk before
+# submit() returns, and the worker replays the journal: rows left unsaved by an
+# earlier process are queued again at startup, and a Sheets outage is retried for
+# as long as it lasts instead of failing the rows after MAX_ATTEMPTS.
+class SubmissionQueue:
+    def __init__(self, storage, journal=None):
+        self.storage = storage
+        self.journal = journal
+        self._queue = queue.Queue()
+        self._statuses = OrderedDict()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._dedupe = DedupeIndex()
+        if journal is not None:
+            self._replay_journal()
+
+    # Queue the rows an earlier process journaled but did not save
+    def _replay_journal(self):
+        entries = self.journal.pending()
+        if not entries:
+            return
+        self._recover_request_ids(entries)
+        for entry in entries:
+            if entry.idempotency_key is not None:
+                self._dedupe.add(entry.idempotency_key, entry.request_id)
+            status = SubmissionStatus(entry.request_id, entry.submitted_at)
+            status.uncertain = True
+            with self._lock:
+                self._statuses[entry.request_id] = status
+            self._queue.put((status, list(entry.row)))
+        metrics.increment("journal.replayed", len(entries))
+        with self._lock:
+            self._ensure_worker()
+
+    # Request ID of an identical submission queued recently, or None
+    def duplicate_of(self, idempotency_key):
+        return self._dedupe.get(idempotency_key)
+
+    # Queue a row for writing; with an idempotency key that was already used, nothing is
+    # queued and the original Request ID is returned instead. Raises OSError when the
+    # row cannot be journaled; the submission is then not taken and can be retried.
+    def submit(self, request_id, row, idempotency_key=None):
+        if idempotency_key is not None:
+            original_request_id = self._dedupe.add(idempotency_key, request_id)
+            if original_request_id is not None:
+                metrics.increment("submissions.duplicates")
+                return original_request_id
+        if self.journal is not None:
+            try:
+                with span("submissions.journal_append"):
+                    self.journal.append(request_id, row, idempotency_key)
+            except OSError:
+                metrics.increment("journal.append_errors")
+                if idempotency_key is not None:
+                    self._dedupe.discard(idempotency_key, request_id)
+                raise
+        status = SubmissionStatus(request_id)
+        with self._lock:
+            self._statuses[request_id] = status
+            while len(self._statuses) > STATUS_HISTORY_SIZE:
+                self._statuses.popitem(last=False)
+            self._ensure_worker()
+        self._queue.put((status, list(row)))
+        metrics.set_gauge("submissions.queue_depth", self._queue.qsize())
+        return request_id
+
+    def status(self, request_id):
+        with self._lock:
+            return self._statuses.get(request_id)
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="portal-submission-writer", daemon=True)
+            self._worker.start()
+
+    # Block for the first row, then gather whatever else arrives within BATCH_WINDOW
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + BATCH_WINDOW
+        while len(batch) < MAX_BATCH_ROWS:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            metrics.set_gauge("submissions.queue_depth", self._queue.qsize())
+            with span("submissions.write_batch"):
+                self._write(batch)
+
+    def _write(self, batch):
+        attempt = 0
+        while True:
+            try:
+                batch = self._without_stored(batch)
+                if batch:
+                    self.storage.append_requests([row for _, row in batch])
+            except Exception as error:
+                # Journaled rows are safe on disk, so only a real error makes them fail
+                gives_up = attempt + 1 >= MAX_ATTEMPTS and self.journal is None
+                retryable = isinstance(error, StoredCheckError) or is_retryable_error(error)
+                if not retryable or gives_up:
+                    self._finish(batch, FAILED, error)
+                    return
+                metrics.increment("submissions.retries")
+                for status, _ in batch:
+                    status.state = RETRYING
+                    status.error = str(error)
+                    status.uncertain = status.uncertain or may_have_been_written(error)
+                self._update_journal_gauges()
+                if self.journal is not None:
+                    self._recover_request_ids(self.journal.pending())
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+            else:
+                self._finish(batch, SAVED)
+                return
+
+    # Rows that may already be in the sheet are looked up first; those found are
+    # finished as saved, so a replayed row is never appended twice
+    def _without_stored(self, batch):
+        uncertain = [status.request_id for status, _ in batch if status.uncertain]
+        if not uncertain:
+            return batch
+        try:
+            stored = self.storage.stored_request_ids(uncertain)
+        except Exception as error:
+            metrics.increment("submissions.stored_check_errors")
+            raise StoredCheckError(f"Could not check whether the rows were saved: {error}") from error
+        for status, _ in batch:
+            status.uncertain = False
+        if not stored:
+            return batch
+        metrics.increment("journal.already_stored", len(stored))
+        self._finish([(status, row) for status, row in batch if status.request_id in stored], SAVED)
+        return [(status, row) for status, row in batch if status.request_id not in stored]
+
+    # A journal that cannot record the outcome (e.g. a full disk) does not stop the
+    # worker: the entries are replayed after a restart, and replayed rows are checked
+    # against the sheet before they are written again
+    def _finish(self, batch, state, error=None):
+        if not batch:
+            return
+        if self.journal is not None:
+            request_ids = [status.request_id for status, _ in batch]
+            try:
+                if state == SAVED:
+                    self.journal.mark_saved(request_ids)
+                else:
+                    self.journal.mark_failed(request_ids, error)
+            except OSError:
+                metrics.increment("journal.finish_errors")
+                self._update_journal_gauges()
+        metrics.increment(f"submissions.{state}", len(batch))
+        now = time.time()
+        for status, _ in batch:
+            status.state = state
+            status.error = str(error) if error else None
+            if state == SAVED:
+                status.saved_at = now
+
+    # Journaled IDs are only in the sheet once saved; until then the counters must not
+    # fall behind them, even if the counter store was lost (deleted file, Redis restart)
+    def _recover_request_ids(self, entries):
+        try:
+            self.storage.recover_request_ids(entry.request_id for entry in entries)
+        except Exception:
+            metrics.increment("journal.recover_errors")
+
+    # Lag grows while an outage lasts, so it is refreshed on every retry too
+    def _update_journal_gauges(self):
+        if self.journal is not None:
+            self.journal.update_gauges()
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+# Get the process-wide submission queue for a storage backend
+def get_submission_queue(storage):
+    from portal.journal import get_journal
+
+    with _queues_lock:
+        if id(storage) not in _queues:
+            _queues[id(storage)] = SubmissionQueue(storage, get_journal())
+        return _queues[id(storage)]
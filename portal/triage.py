@@ -0,0 +1,149 @@
+import threading
+from array import array
+from datetime import date
+from typing import NamedTuple
+
+from portal.participants import Categorical
+from portal.request_index import DEFAULT_STATUS, STATUS_COLUMN
+
+# Column-oriented copy of the Requests rows behind the coordinator triage view.
+# Request Type, Sub Category, Volunteer Category and Status are categorical and the
+# submission date is kept as a day number, so a filter is a few vectorized
+# comparisons over small integer arrays and only the rows of the page being shown
+# are turned back into dicts. Like RequestIndex it is fed by a WorksheetTail, so a
+# refresh only adds the rows appended since the last one. numpy (installed with
+# pandas) is imported on first use, never by the request form.
+
+FILTER_COLUMNS = ("Request Type", "Sub Category", "Volunteer Category", STATUS_COLUMN)
+
+PAGE_SIZE = 50
+
+# Day number of rows whose Timestamp cannot be read; any date filter leaves them out
+UNKNOWN_DAY = 0
+
+
+# Timestamps are written as str(datetime.now()), so the date is the first 10 characters
+def submission_day(timestamp):
+    try:
+        return date.fromisoformat(timestamp[:10]).toordinal()
+    except (TypeError, ValueError):
+        return UNKNOWN_DAY
+
+
+class TriagePage(NamedTuple):
+    # Requests matching the filters, across all pages
+    total: int
+    page: int
+    pages: int
+    rows: list
+
+
+class RequestTriage:
+    def __init__(self, source, columns):
+        self.source = source
+        self.columns = tuple(columns)
+        self._lock = threading.Lock()
+        self._cursor = None
+        self._rows = []
+        self._categoricals = {}
+        self._days = array("i")
+        self._reset()
+
+    def _reset(self):
+        self._rows = []
+        self._categoricals = {column: Categorical() for column in FILTER_COLUMNS}
+        self._days = array("i")
+
+    def refresh(self):
+        self.source.refresh()
+        with self._lock:
+            rows, self._cursor, reset = self.source.rows_since(self._cursor)
+            if reset:
+                self._reset()
+            # Blank rows (e.g. cleared by hand in the sheet) are not requests
+            rows = [row for row in rows if row and row[0]]
+            if not rows:
+                return
+            positions = {column: self.columns.index(column) for column in FILTER_COLUMNS if column in self.columns}
+            for column, categorical in self._categoricals.items():
+                index = positions.get(column)
+                categorical.extend(
+                    (row[index] if index is not None and index < len(row) else "") or
+                    (DEFAULT_STATUS if column == STATUS_COLUMN else "")
+                    for row in rows
+                )
+            timestamp = self.columns.index("Timestamp")
+            self._days.extend(submission_day(row[timestamp]) if timestamp < len(row) else UNKNOWN_DAY for row in rows)
+            # Rows are the source's own tuples; short rows are padded when a page is built
+            self._rows.extend(rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    # Values present in a filter column, for the filter widgets
+    def options(self, column):
+        return sorted(label for label in self._categoricals[column].labels if label)
+
+    # Boolean mask of the rows matching the filters, or None when nothing is filtered.
+    # Must be called with the lock held.
+    def _mask(self, np, filters, from_date, to_date):
+        mask = None
+        for column, values in (filters or {}).items():
+            if not values:
+                continue
+            categorical = self._categoricals[column]
+            wanted = [code for code in (categorical.code(value) for value in values) if code is not None]
+            codes = np.frombuffer(categorical.codes, dtype=categorical.codes.typecode)
+            matches = np.isin(codes, wanted) if len(wanted) > 1 else codes == (wanted[0] if wanted else -1)
+            del codes
+            mask = matches if mask is None else mask & matches
+        if from_date is not None or to_date is not None:
+            days = np.frombuffer(self._days, dtype=np.int32)
+            matches = days != UNKNOWN_DAY
+            if from_date is not None:
+                matches &= days >= from_date.toordinal()
+            if to_date is not None:
+                matches &= days <= to_date.toordinal()
+            del days
+            mask = matches if mask is None else mask & matches
+        return mask
+
+    # One page of requests, newest first. `filters` maps a FILTER_COLUMNS name to the
+    # accepted values (empty means any); `from_date`/`to_date` bound the submission date.
+    def query(self, filters=None, from_date=None, to_date=None, page=0, page_size=PAGE_SIZE):
+        import numpy as np
+
+        with self._lock:
+            count = len(self._rows)
+            mask = self._mask(np, filters, from_date, to_date)
+            total = count if mask is None else int(np.count_nonzero(mask))
+            pages = max(1, -(-total // page_size))
+            page = min(max(page, 0), pages - 1)
+            # Newest first: page 0 holds the last matching rows of the sheet
+            if mask is None:
+                end = count - page * page_size
+                selected = range(end - 1, max(end - page_size, 0) - 1, -1)
+            else:
+                matching = np.flatnonzero(mask)
+                end = total - page * page_size
+                selected = matching[max(end - page_size, 0):end][::-1].tolist()
+            rows = [self._record(self._rows[row]) for row in selected]
+        return TriagePage(total, page, pages, rows)
+
+    # Every matching request in sheet order, built one at a time (for exports). Rows
+    # are only ever appended to the list, and a reset replaces it, so it is safe to
+    # keep reading it after the lock is released.
+    def matching(self, filters=None, from_date=None, to_date=None):
+        import numpy as np
+
+        with self._lock:
+            rows = self._rows
+            mask = self._mask(np, filters, from_date, to_date)
+            selected = range(len(rows)) if mask is None else np.flatnonzero(mask)
+        for row in selected:
+            yield self._record(rows[row])
+
+    def _record(self, row):
+        record = {column: row[i] if i < len(row) else "" for i, column in enumerate(self.columns)}
+        record[STATUS_COLUMN] = record.get(STATUS_COLUMN) or DEFAULT_STATUS
+        return record
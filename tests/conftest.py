@@ -0,0 +1,37 @@
+import pytest
+
+from benchmarks.fake_sheets import REQUEST_HEADER, FakeBackend, FakeClient, FakeSpreadsheet, FakeWorksheet
+from portal import rate_limit, sheets_data
+from portal.rate_limit import SheetsScheduler, TokenBucket
+from portal.sheets_data import SheetsDataLayer
+
+SHEET_URL = "https://docs.google.com/spreadsheets/d/tests/edit"
+
+
+# Builds a SheetsDataLayer over an in-memory spreadsheet ({title: values}); returns
+# (client, data_layer). Revisions are checked on every call and the rate limiter
+# never makes a test wait.
+@pytest.fixture
+def fake_sheets(monkeypatch):
+    monkeypatch.setattr(sheets_data, "REVISION_CHECK_INTERVAL", 0)
+    monkeypatch.setattr(rate_limit, "_scheduler", SheetsScheduler(TokenBucket(rate_per_minute=600000, capacity=10000)))
+
+    def build(worksheets):
+        backend = FakeBackend()
+        spreadsheet = FakeSpreadsheet(backend, [FakeWorksheet(backend, title, values) for title, values in worksheets.items()])
+        client = FakeClient(backend, spreadsheet)
+        monkeypatch.setattr(sheets_data, "client_factory", lambda creds_info: client)
+        return client, SheetsDataLayer({"client_email": "tests@example.com"}, SHEET_URL)
+
+    return build
+
+
+# A data layer whose spreadsheet only has a "Requests" worksheet with these rows;
+# returns (worksheet, data_layer)
+@pytest.fixture
+def requests_sheet(fake_sheets):
+    def build(rows):
+        client, data_layer = fake_sheets({"Requests": [list(REQUEST_HEADER) + ["Status"]] + [list(row) for row in rows]})
+        return client.spreadsheet._worksheets["Requests"], data_layer
+
+    return build
@@ -0,0 +1,122 @@
+from datetime import datetime
+
+import pytest
+
+from portal import archive
+from portal.archive import (
+    ARCHIVE_MANIFEST_SHEET, ArchiveManifest, RowsChanged, archivable_rows, archive_requests, plan_shards,
+)
+from portal.participants import PARTICIPANT_COLUMNS
+from portal.request_ids import RequestIdAllocator
+from portal.storage import MESSAGE_TEMPLATE_COLUMNS, SheetsStorage
+
+HEADER = ["Request ID", "Timestamp", "Status"]
+CUTOFF = datetime(2025, 6, 1)
+
+
+def row(request_id, timestamp, status=""):
+    return [request_id, timestamp, status]
+
+
+def test_archivable_rows_stop_at_the_first_row_to_keep():
+    rows = [
+        row("REQ-AV00001", "2025-01-05 10:00:00"),
+        row("REQ-AV00002", "2025-07-01 10:00:00", "Closed"),
+        row("REQ-AV00003", "2025-07-02 10:00:00"),
+        row("REQ-AV00004", "2025-01-06 10:00:00"),
+    ]
+    assert archivable_rows(HEADER, rows, CUTOFF) == rows[:2]
+    assert archivable_rows(HEADER, [row("REQ-AV00001", "not a date")] + rows, CUTOFF) == []
+
+
+def test_plan_shards_groups_rows_by_month_and_prefix():
+    rows = [
+        row("REQ-AV00001", "2025-01-05 10:00:00"),
+        row("REQ-LTV00001", "2025-01-06 10:00:00"),
+        row("REQ-AV00002", "2025-02-01 10:00:00"),
+    ]
+    shards, entries = plan_shards(rows, 1)
+    assert {title: [r[0] for r in shard_rows] for title, shard_rows in shards.items()} == {
+        "Requests 2025-01": ["REQ-AV00001", "REQ-LTV00001"],
+        "Requests 2025-02": ["REQ-AV00002"],
+    }
+    assert [(e.shard, e.prefix, e.first, e.last, e.rows) for e in entries] == [
+        ("Requests 2025-01", "AV", 1, 1, 1),
+        ("Requests 2025-01", "LTV", 1, 1, 1),
+        ("Requests 2025-02", "AV", 2, 2, 1),
+    ]
+
+
+# IDs out of date order (a backdated import) give month ranges that overlap
+def test_overlapping_ranges_return_every_shard_that_may_hold_the_id():
+    rows = [
+        row("REQ-AV00001", "2025-01-05 10:00:00"),
+        row("REQ-AV00002", "2025-02-01 10:00:00"),
+        row("REQ-AV00003", "2025-01-07 10:00:00"),
+    ]
+    manifest = ArchiveManifest(plan_shards(rows, 1)[1])
+    assert manifest.shards_for("REQ-AV00002") == ["Requests 2025-01", "Requests 2025-02"]
+    assert manifest.shards_for("req-av00003") == ["Requests 2025-01"]
+    assert manifest.shards_for("REQ-AV00004") == []
+    assert manifest.shards_for("REQ-LTV00001") == []
+    assert manifest.last_request_ids() == ["REQ-AV00003"]
+
+
+@pytest.fixture
+def sheet(fake_sheets):
+    client, data_layer = fake_sheets({
+        "Requests": [
+            list(HEADER),
+            row("REQ-AV00001", "2025-01-05 10:00:00"),
+            row("REQ-AV00002", "2025-02-01 10:00:00"),
+            row("REQ-AV00003", "2025-01-07 10:00:00", "Closed"),
+            row("REQ-AV00004", "2025-07-01 10:00:00"),
+        ],
+        "Volunteer Details": [PARTICIPANT_COLUMNS],
+        "Message Templates": [MESSAGE_TEMPLATE_COLUMNS],
+    })
+    return client.spreadsheet._worksheets, data_layer
+
+
+def test_archived_requests_move_to_monthly_shards(sheet):
+    worksheets, data_layer = sheet
+    summary = archive_requests(data_layer, CUTOFF)
+
+    assert summary == {"archived_rows": 3, "shards": {"Requests 2025-01": 2, "Requests 2025-02": 1}}
+    assert worksheets["Requests"].values == [HEADER, row("REQ-AV00004", "2025-07-01 10:00:00")]
+    assert [r[0] for r in worksheets["Requests 2025-01"].values[1:]] == ["REQ-AV00001", "REQ-AV00003"]
+    assert [r[:5] for r in worksheets[ARCHIVE_MANIFEST_SHEET].values[1:]] == [
+        ["Requests 2025-01", "2025-01", "AV", "1", "3"],
+        ["Requests 2025-02", "2025-02", "AV", "2", "2"],
+    ]
+    # Nothing is left to archive, and a re-run changes nothing
+    assert archive_requests(data_layer, CUTOFF) == {"archived_rows": 0, "shards": {}}
+
+
+def test_archived_requests_are_still_found(sheet, tmp_path):
+    _, data_layer = sheet
+    archive_requests(data_layer, CUTOFF)
+    storage = SheetsStorage(data_layer, RequestIdAllocator(str(tmp_path / "ids.sqlite3")))
+    storage.refresh()
+
+    # REQ-AV00002 is covered by the ranges of both months
+    assert storage.request_details("REQ-AV00002")["Timestamp"] == "2025-02-01 10:00:00"
+    assert storage.request_details("REQ-AV00003")["Status"] == "Closed"
+    assert storage.request_details("REQ-AV00001")["Status"] == "Received"
+    assert storage.request_details("REQ-AV00009") is None
+
+
+def test_nothing_is_deleted_when_rows_changed_while_archiving(sheet, monkeypatch):
+    worksheets, data_layer = sheet
+    worksheet_or_create = archive._worksheet_or_create
+
+    # A coordinator removes the first request while the shards are being written
+    def edited_meanwhile(spreadsheet, title, header):
+        if title == ARCHIVE_MANIFEST_SHEET:
+            del worksheets["Requests"].values[1]
+        return worksheet_or_create(spreadsheet, title, header)
+
+    monkeypatch.setattr(archive, "_worksheet_or_create", edited_meanwhile)
+    with pytest.raises(RowsChanged):
+        archive_requests(data_layer, CUTOFF)
+    assert [r[0] for r in worksheets["Requests"].values[1:]] == ["REQ-AV00002", "REQ-AV00003", "REQ-AV00004"]
@@ -0,0 +1,116 @@
+import csv
+import io
+
+import pytest
+from requests.exceptions import ConnectionError
+
+from portal import bulk
+from portal.bulk import REPORT_COLUMNS, import_requests
+from portal.participants import ParticipantRecord
+from portal.storage import SQLiteStorage
+
+PARTICIPANTS = [
+    ParticipantRecord("Asha", "Female", "Ashram Volunteer", "asha@example.com", "+919876543210"),
+    ParticipantRecord("Ravi", "Male", "Long Term Department Support", "ravi@example.com", "+919812345678"),
+]
+
+HEADER = "Email ID,Phone Number,Request Type,Sub Category,From Date,To Date,Description,Timestamp\n"
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(bulk, "backoff_delay", lambda attempt: 0)
+    storage = SQLiteStorage(str(tmp_path / "portal.sqlite3"))
+    storage.load_participants(PARTICIPANTS)
+    return storage
+
+
+# Import CSV text; returns (summary, report rows)
+def run_import(storage, text, **options):
+    report_file = io.StringIO()
+    report = csv.DictWriter(report_file, fieldnames=REPORT_COLUMNS)
+    report.writeheader()
+    summary = import_requests(storage, csv.DictReader(io.StringIO(text)), report, **options)
+    report_file.seek(0)
+    return summary, list(csv.DictReader(report_file))
+
+
+def test_valid_rows_get_consecutive_ids_per_prefix(storage):
+    summary, report = run_import(storage, HEADER + (
+        "asha@example.com,,Health Team,,,,Fever,2025-01-02 09:00\n"
+        ",98123 45678,Seva Team,Linga Seva,2025-02-01,05/02/2025,Linga seva,\n"
+        "ASHA@example.com ,,Others,,,,Question,\n"
+    ))
+    assert summary == {"rows": 3, "imported": 3, "failed": 0}
+    assert [(r["Row"], r["Request ID"]) for r in report] == [("2", "REQ-AV00001"), ("3", "REQ-LTV00001"), ("4", "REQ-AV00002")]
+    details = storage.request_details("REQ-LTV00001")
+    assert (details["Name"], details["From Date"], details["To Date"]) == ("Ravi", "01/02/2025", "05/02/2025")
+    assert storage.request_details("REQ-AV00001")["Timestamp"] == "2025-01-02 09:00:00"
+
+
+def test_short_rows_are_reported_not_fatal(storage):
+    summary, report = run_import(storage, HEADER + (
+        "asha@example.com,,Health Team\n"
+        "asha@example.com\n"
+        "asha@example.com,,Health Team,,,,Fever\n"
+    ))
+    assert summary == {"rows": 3, "imported": 1, "failed": 2}
+    assert [r["Error"] for r in report[:2]] == ["Description is empty", "Request Type '' is not available to Ashram Volunteer"]
+    assert report[2]["Request ID"] == "REQ-AV00001"
+
+
+def test_invalid_rows_say_why(storage):
+    _, report = run_import(storage, HEADER + (
+        "nobody@example.com,,Health Team,,,,x,\n"
+        ",123,Health Team,,,,x,\n"
+        "asha@example.com,,Accommodation Team,,,,x,\n"
+        "ravi@example.com,,Seva Team,Linga Seva,,,x,\n"
+        "ravi@example.com,,Seva Team,Linga Seva,2025-02-01,2025-13-01,x,\n"
+    ))
+    assert [r["Error"] for r in report] == [
+        "No participant with Email ID 'nobody@example.com'",
+        "Email ID or a valid Phone Number is required",
+        "Request Type 'Accommodation Team' is not available to Ashram Volunteer",
+        "Linga Seva needs both From Date and To Date",
+        "'2025-13-01' is not a date",
+    ]
+
+
+def test_an_unexpected_error_only_fails_its_row(storage, monkeypatch):
+    participant_by_email = storage.participant_by_email
+
+    def broken_lookup(email):
+        if email == "ravi@example.com":
+            raise RuntimeError("lookup failed")
+        return participant_by_email(email)
+
+    monkeypatch.setattr(storage, "participant_by_email", broken_lookup)
+    summary, report = run_import(storage, HEADER + (
+        "ravi@example.com,,Health Team,,,,x,\n"
+        "asha@example.com,,Health Team,,,,x,\n"
+    ))
+    assert summary["imported"] == 1
+    assert report[0]["Error"] == "Could not be validated: RuntimeError: lookup failed"
+
+
+def test_dry_run_writes_nothing(storage):
+    summary, report = run_import(storage, HEADER + "asha@example.com,,Health Team,,,,x,\n", dry_run=True)
+    assert summary["imported"] == 1 and report[0]["Request ID"] == ""
+    assert storage.reserve_request_ids("AV") == ["REQ-AV00001"]
+
+
+def test_a_batch_written_before_a_connection_error_is_not_written_again(storage, monkeypatch):
+    appended = []
+    append_requests = storage.append_requests
+
+    def reset_after_writing(rows):
+        appended.append(len(rows))
+        append_requests(rows)
+        if len(appended) == 1:
+            raise ConnectionError("connection reset")
+
+    monkeypatch.setattr(storage, "append_requests", reset_after_writing)
+    summary, report = run_import(storage, HEADER + "asha@example.com,,Health Team,,,,x,\nasha@example.com,,Others,,,,y,\n")
+    assert summary["imported"] == 2
+    assert appended == [2]
+    assert [r["Request ID"] for r in report] == ["REQ-AV00001", "REQ-AV00002"]
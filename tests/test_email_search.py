@@ -0,0 +1,50 @@
+from portal.email_search import EmailSearchIndex, edit_distance, mask_email
+
+EMAILS = [
+    "ravi.kumar@gmail.com", "ravi.kumaar@gmail.com", "priya.sharma@yahoo.com",
+    "anand@example.org", "Ravi.Kumar@gmail.com ", "volunteer42@example.com",
+]
+
+
+def test_edit_distance_counts_a_transposition_as_one_edit():
+    assert edit_distance("gmail", "gmail") == 0
+    assert edit_distance("gmail", "gmial") == 1
+    assert edit_distance("gmail", "gmal") == 1
+    assert edit_distance("gmail", "hotmail", limit=2) == 3
+
+
+def test_mask_email_hides_most_of_the_local_part():
+    assert mask_email("ravi.kumar@gmail.com") == "ra*******r@gmail.com"
+    assert mask_email("ab@x.org") == "a**@x.org"
+
+
+def test_emails_are_indexed_once_ignoring_case_and_spaces():
+    assert len(EmailSearchIndex(EMAILS)) == 5
+
+
+def test_only_the_closest_emails_are_returned():
+    index = EmailSearchIndex(EMAILS)
+    assert index.search("ravi.kumar@gmial.com") == [(1, "ravi.kumar@gmail.com")]
+    # ravi.kumaar@gmail.com is two edits away, so it is left out
+    assert index.search("ravi.kumr@gmail.com") == [(1, "ravi.kumar@gmail.com")]
+    assert index.search("ravi.kumarr@gmail.com") == [(1, "ravi.kumaar@gmail.com"), (1, "ravi.kumar@gmail.com")]
+
+
+def test_suggestions_are_masked_and_skip_an_exact_match():
+    index = EmailSearchIndex(EMAILS)
+    assert index.suggest("priya.sharma@yaho.com") == ["pr*********a@yahoo.com"]
+    assert index.suggest("priya.sharma@yahoo.com") == []
+
+
+def test_nothing_close_enough_gives_no_suggestions():
+    index = EmailSearchIndex(EMAILS)
+    assert index.suggest("someone.else@outlook.com") == []
+    assert index.suggest("") == []
+
+
+def test_many_similar_emails_are_cut_to_the_nearest_few():
+    index = EmailSearchIndex(f"volunteer{number}@example.com" for number in range(20000))
+    assert index.search("volunteer1234@exmaple.com") == [(1, "volunteer1234@example.com")]
+    assert index.search("volunteer123@example.com") == [
+        (0, "volunteer123@example.com"), (1, "volunteer1023@example.com"), (1, "volunteer103@example.com"),
+    ]
@@ -0,0 +1,117 @@
+import errno
+import os
+
+import pytest
+
+from portal.journal import SubmissionJournal
+
+
+def row(request_id):
+    return [request_id, "Name", "F", "a@example.com", "+919876543210", "Ashram Volunteer",
+            "Health Team", "None", "None", "None", "Description", "2025-01-01 10:00:00"]
+
+
+# A process that died: its segment is closed without anything else being written
+def crash(journal):
+    os.close(journal._fd)
+
+
+def test_unsaved_entries_survive_a_crash(tmp_path):
+    journal = SubmissionJournal(str(tmp_path))
+    journal.append("REQ-AV00001", row("REQ-AV00001"), "key-1")
+    journal.append("REQ-AV00002", row("REQ-AV00002"))
+    journal.mark_saved(["REQ-AV00001"])
+    crash(journal)
+
+    reopened = SubmissionJournal(str(tmp_path))
+    entries = reopened.pending()
+    assert [entry.request_id for entry in entries] == ["REQ-AV00002"]
+    assert entries[0].row == row("REQ-AV00002")
+    assert reopened.backlog == 1
+
+
+def test_failed_entries_are_not_replayed(tmp_path):
+    journal = SubmissionJournal(str(tmp_path))
+    journal.append("REQ-AV00001", row("REQ-AV00001"))
+    journal.mark_failed(["REQ-AV00001"], "rejected")
+    crash(journal)
+
+    assert SubmissionJournal(str(tmp_path)).pending() == []
+
+
+def test_torn_last_line_is_cut_off(tmp_path):
+    journal = SubmissionJournal(str(tmp_path))
+    journal.append("REQ-AV00001", row("REQ-AV00001"))
+    path = journal.path
+    crash(journal)
+    with open(path, "ab") as f:
+        f.write(b'{"op":"submit","id":"REQ-AV0')
+
+    reopened = SubmissionJournal(str(tmp_path))
+    reopened.append("REQ-AV00002", row("REQ-AV00002"))
+    crash(reopened)
+
+    again = SubmissionJournal(str(tmp_path))
+    assert [entry.request_id for entry in again.pending()] == ["REQ-AV00001", "REQ-AV00002"]
+
+
+def test_failed_write_leaves_no_partial_record(tmp_path, monkeypatch):
+    journal = SubmissionJournal(str(tmp_path))
+    journal.append("REQ-AV00001", row("REQ-AV00001"))
+    size = os.path.getsize(journal.path)
+
+    def full_disk(fd):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(os, "fsync", full_disk)
+    with pytest.raises(OSError):
+        journal.append("REQ-AV00002", row("REQ-AV00002"))
+    monkeypatch.undo()
+
+    assert os.path.getsize(journal.path) == size
+    assert [entry.request_id for entry in journal.pending()] == ["REQ-AV00001"]
+
+
+def test_orphaned_segments_are_adopted_but_live_ones_are_not(tmp_path):
+    dead = SubmissionJournal(str(tmp_path))
+    dead.append("REQ-AV00001", row("REQ-AV00001"))
+    crash(dead)
+    # Takes over the dead segment as its own
+    live = SubmissionJournal(str(tmp_path))
+    live.append("REQ-AV00002", row("REQ-AV00002"))
+    # The live segment is locked, so a third process starts its own and adopts nothing
+    other = SubmissionJournal(str(tmp_path))
+    assert other.path != live.path
+    assert other.pending() == []
+
+    crash(live)
+    other.append("REQ-AV00003", row("REQ-AV00003"))
+    crash(other)
+    # Both segments are orphaned now: one is reused, the other adopted and removed
+    survivor = SubmissionJournal(str(tmp_path))
+    assert sorted(entry.request_id for entry in survivor.pending()) == ["REQ-AV00001", "REQ-AV00002", "REQ-AV00003"]
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_segment_is_emptied_once_everything_is_saved(tmp_path):
+    journal = SubmissionJournal(str(tmp_path), compact_bytes=100)
+    journal.append("REQ-AV00001", row("REQ-AV00001"))
+    journal.append("REQ-AV00002", row("REQ-AV00002"))
+    journal.mark_saved(["REQ-AV00001"])
+    assert os.path.getsize(journal.path) > 100
+
+    journal.mark_saved(["REQ-AV00002"])
+    assert os.path.getsize(journal.path) == 0
+    journal.append("REQ-AV00003", row("REQ-AV00003"))
+    crash(journal)
+
+    assert [entry.request_id for entry in SubmissionJournal(str(tmp_path)).pending()] == ["REQ-AV00003"]
+
+
+def test_lag_and_backlog(tmp_path):
+    journal = SubmissionJournal(str(tmp_path))
+    assert journal.lag_seconds() == 0.0
+    entry = journal.append("REQ-AV00001", row("REQ-AV00001"))
+    entry.submitted_at -= 30
+    assert journal.backlog == 1
+    assert journal.lag_seconds() >= 30
@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+
+import pytest
+import requests
+from gspread.exceptions import APIError
+
+from benchmarks.fake_sheets import PARTICIPANT_HEADER
+from portal.rate_limit import READ_PRIORITY, WRITE_PRIORITY, SheetsBusyError, SheetsScheduler, TokenBucket, is_sheets_busy
+
+
+def api_error(code):
+    response = requests.Response()
+    response.status_code = code
+    response._content = json.dumps({"error": {"code": code, "message": "fake", "status": "FAKE"}}).encode()
+    return APIError(response)
+
+
+# Hands out tokens only when a test adds them
+class ManualBucket:
+    def __init__(self):
+        self.tokens = 0
+
+    def take(self):
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return 0.01
+
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate():
+    bucket = TokenBucket(rate_per_minute=60, capacity=3)
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert 0 < bucket.take() <= 1
+    bucket.updated_at -= 1
+    assert bucket.take() == 0.0
+
+
+def test_an_empty_bucket_makes_callers_busy_after_max_wait():
+    scheduler = SheetsScheduler(ManualBucket())
+    started = time.monotonic()
+    with pytest.raises(SheetsBusyError):
+        scheduler.acquire(max_wait=0.05)
+    assert time.monotonic() - started < 1
+    assert scheduler.queue_depth == 0
+
+
+def test_writes_are_served_before_reads_that_queued_first():
+    bucket = ManualBucket()
+    scheduler = SheetsScheduler(bucket)
+    served = []
+
+    def acquire(name, priority):
+        scheduler.acquire(priority, max_wait=5)
+        served.append(name)
+
+    reader = threading.Thread(target=acquire, args=("read", READ_PRIORITY))
+    reader.start()
+    while scheduler.queue_depth < 1:
+        time.sleep(0.001)
+    writer = threading.Thread(target=acquire, args=("write", WRITE_PRIORITY))
+    writer.start()
+    while scheduler.queue_depth < 2:
+        time.sleep(0.001)
+
+    bucket.tokens = 1
+    writer.join(timeout=5)
+    assert served == ["write"]
+    bucket.tokens = 1
+    reader.join(timeout=5)
+    assert served == ["write", "read"]
+
+
+def test_quota_and_server_errors_count_as_busy():
+    assert is_sheets_busy(SheetsBusyError())
+    assert is_sheets_busy(api_error(429))
+    assert is_sheets_busy(api_error(503))
+    assert not is_sheets_busy(api_error(404))
+    assert not is_sheets_busy(ValueError())
+
+
+def test_a_cached_snapshot_is_served_while_google_returns_429(fake_sheets):
+    client, data_layer = fake_sheets({"Volunteer Details": [PARTICIPANT_HEADER, ["A", "F", "a@example.com", "+919876543210", "AV"]]})
+    snapshot = data_layer.snapshot("Volunteer Details")
+
+    client.backend.bump_version()
+    client.backend.quota_error_rate = 1.0
+    assert data_layer.snapshot("Volunteer Details") is snapshot
+
+    client.backend.quota_error_rate = 0.0
+    assert data_layer.snapshot("Volunteer Details") is not snapshot
+
+
+def test_without_a_cached_copy_a_429_is_raised(fake_sheets):
+    client, data_layer = fake_sheets({"Volunteer Details": [PARTICIPANT_HEADER]})
+    client.backend.quota_error_rate = 1.0
+    with pytest.raises(APIError):
+        data_layer.snapshot("Volunteer Details")
@@ -0,0 +1,48 @@
+import threading
+
+from portal.request_ids import RequestIdAllocator, format_request_id, parse_request_id
+
+
+def test_allocate_hands_out_consecutive_ids(tmp_path):
+    allocator = RequestIdAllocator(str(tmp_path / "ids.sqlite3"))
+    assert allocator.allocate("LTV") == ["REQ-LTV00001"]
+    assert allocator.allocate("LTV", 3) == ["REQ-LTV00002", "REQ-LTV00003", "REQ-LTV00004"]
+    assert allocator.allocate("AV") == ["REQ-AV00001"]
+
+
+def test_recover_only_moves_counters_forward(tmp_path):
+    allocator = RequestIdAllocator(str(tmp_path / "ids.sqlite3"))
+    allocator.recover(["REQ-LTV00100", "REQ-LTV00042", "not an id"])
+    assert allocator.allocate("LTV") == ["REQ-LTV00101"]
+    allocator.recover(["REQ-LTV00050"])
+    assert allocator.allocate("LTV") == ["REQ-LTV00102"]
+
+
+def test_ids_grow_past_five_digits():
+    assert format_request_id("LTV", 100000) == "REQ-LTV100000"
+    assert parse_request_id("REQ-LTV100000") == ("LTV", 100000)
+
+
+# Separate allocators on one file stand in for separate portal processes
+def test_concurrent_allocators_never_hand_out_the_same_id(tmp_path):
+    path = str(tmp_path / "ids.sqlite3")
+    allocated = []
+    lock = threading.Lock()
+
+    def allocate_many():
+        allocator = RequestIdAllocator(path)
+        ids = []
+        for count in (1, 2, 1, 3) * 5:
+            ids.extend(allocator.allocate("LTV", count))
+        with lock:
+            allocated.extend(ids)
+
+    threads = [threading.Thread(target=allocate_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(allocated) == 8 * 35
+    assert len(set(allocated)) == len(allocated)
+    assert max(parse_request_id(request_id)[1] for request_id in allocated) == len(allocated)
@@ -0,0 +1,52 @@
+from portal.request_index import RequestIndex
+from portal.storage import TRACKED_REQUEST_COLUMNS
+
+
+def row(request_id, status=None):
+    row = [request_id, "Name", "Female", "a@example.com", "+919876543210", "Ashram Volunteer",
+           "Health Team", "None", "None", "None", "Description", "2025-01-01 10:00:00"]
+    return row + [status] if status is not None else row
+
+
+def request_index(data_layer):
+    index = RequestIndex(data_layer.tail("Requests", "A:M"), TRACKED_REQUEST_COLUMNS)
+    index.refresh()
+    return index
+
+
+def test_requests_are_found_by_id_ignoring_case_and_spaces(requests_sheet):
+    _, data_layer = requests_sheet([row("REQ-AV00001"), row("REQ-LTV00001", "Closed")])
+    index = request_index(data_layer)
+
+    assert len(index) == 2
+    assert index.get(" req-ltv00001 ")["Status"] == "Closed"
+    assert index.get("REQ-AV00001")["Email ID"] == "a@example.com"
+    assert index.get("REQ-AV00002") is None
+
+
+def test_an_empty_status_reads_as_received(requests_sheet):
+    _, data_layer = requests_sheet([row("REQ-AV00001"), row("REQ-AV00002", "")])
+    index = request_index(data_layer)
+
+    assert index.get("REQ-AV00001")["Status"] == "Received"
+    assert index.get("REQ-AV00002")["Status"] == "Received"
+
+
+def test_appended_requests_are_found_after_a_refresh(requests_sheet):
+    worksheet, data_layer = requests_sheet([row("REQ-AV00001")])
+    index = request_index(data_layer)
+
+    worksheet.append_rows([row("REQ-AV00002"), ["", ""]])
+    index.refresh()
+    assert len(index) == 2
+    assert index.get("REQ-AV00002") is not None
+
+
+def test_removed_requests_are_dropped_on_a_new_generation(requests_sheet):
+    worksheet, data_layer = requests_sheet([row("REQ-AV00001"), row("REQ-AV00002")])
+    index = request_index(data_layer)
+
+    worksheet.delete_rows(2)
+    index.refresh()
+    assert index.get("REQ-AV00001") is None
+    assert index.get("REQ-AV00002") is not None
@@ -0,0 +1,98 @@
+import time
+
+from portal import sheets_data
+
+
+def row(request_id, status=""):
+    return [request_id, "Name", "Female", "a@example.com", "+919876543210", "Ashram Volunteer",
+            "Health Team", "None", "None", "None", "Description", "2025-01-01 10:00:00", status]
+
+
+def ids(rows):
+    return [row[0] for row in rows]
+
+
+def wait_for_reset(tail, cursor, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        rows, new_cursor, reset = tail.rows_since(cursor)
+        if reset:
+            return rows, new_cursor
+        time.sleep(0.01)
+    raise AssertionError("the tail was not read again")
+
+
+def test_only_appended_rows_are_read_after_the_first_refresh(requests_sheet):
+    worksheet, data_layer = requests_sheet([row("REQ-AV00001"), row("REQ-AV00002")])
+    tail = data_layer.tail("Requests", "A:A")
+    tail.refresh()
+    rows, cursor, reset = tail.rows_since()
+    assert reset and ids(rows) == ["REQ-AV00001", "REQ-AV00002"]
+
+    worksheet.append_rows([row("REQ-AV00003")])
+    tail.refresh()
+    rows, cursor, reset = tail.rows_since(cursor)
+    assert not reset and ids(rows) == ["REQ-AV00003"]
+    # The revision is unchanged, so nothing is read at all
+    calls = worksheet.backend.calls["values_get"]
+    tail.refresh()
+    assert worksheet.backend.calls["values_get"] == calls
+    assert tail.rows_since(cursor)[0] == []
+
+
+def test_a_removed_row_starts_a_new_generation(requests_sheet):
+    worksheet, data_layer = requests_sheet([row("REQ-AV00001"), row("REQ-AV00002"), row("REQ-AV00003")])
+    tail = data_layer.tail("Requests", "A:A")
+    tail.refresh()
+    _, cursor, _ = tail.rows_since()
+
+    worksheet.delete_rows(2)
+    worksheet.append_rows([row("REQ-AV00004")])
+    tail.refresh()
+    rows, cursor, reset = tail.rows_since(cursor)
+    assert reset and ids(rows) == ["REQ-AV00002", "REQ-AV00003", "REQ-AV00004"]
+
+
+def test_edits_to_rows_already_read_are_picked_up_in_the_background(requests_sheet, monkeypatch):
+    worksheet, data_layer = requests_sheet([row("REQ-AV00001"), row("REQ-AV00002")])
+    tail = data_layer.tail("Requests", "A:M")
+    tail.refresh()
+    _, cursor, _ = tail.rows_since()
+
+    monkeypatch.setattr(sheets_data, "SNAPSHOT_TTL", 0)
+    worksheet.values[1][12] = "Closed"
+    worksheet.backend.bump_version()
+    tail.refresh()
+    rows, _ = wait_for_reset(tail, cursor)
+    assert [row[12] for row in rows] == ["Closed", ""]
+
+
+def test_background_resync_without_edits_keeps_the_generation(requests_sheet, monkeypatch):
+    worksheet, data_layer = requests_sheet([row("REQ-AV00001")])
+    tail = data_layer.tail("Requests", "A:A")
+    tail.refresh()
+    _, cursor, _ = tail.rows_since()
+
+    monkeypatch.setattr(sheets_data, "SNAPSHOT_TTL", 0)
+    tail.refresh()
+    deadline = time.monotonic() + 5
+    while tail._resyncing and time.monotonic() < deadline:
+        time.sleep(0.01)
+    rows, _, reset = tail.rows_since(cursor)
+    assert not reset and rows == []
+
+
+def test_a_busy_sheet_keeps_the_rows_already_read(requests_sheet):
+    worksheet, data_layer = requests_sheet([row("REQ-AV00001")])
+    tail = data_layer.tail("Requests", "A:A")
+    tail.refresh()
+    _, cursor, _ = tail.rows_since()
+
+    worksheet.append_rows([row("REQ-AV00002")])
+    worksheet.backend.quota_error_rate = 1.0
+    tail.refresh()
+    assert tail.rows_since(cursor)[0] == []
+
+    worksheet.backend.quota_error_rate = 0.0
+    tail.refresh()
+    assert ids(tail.rows_since(cursor)[0]) == ["REQ-AV00002"]
@@ -0,0 +1,217 @@
+import errno
+import os
+import threading
+import time
+
+import pytest
+from requests.exceptions import ConnectionError
+
+from portal import submissions
+from portal.journal import SubmissionJournal
+from portal.rate_limit import SheetsBusyError
+from portal.request_ids import RequestIdAllocator
+from portal.storage import StorageBackend
+from portal.submissions import FAILED, SAVED, SubmissionQueue
+
+
+# Requests kept in a list; `failures` are raised by the next append calls, each after
+# writing the rows when it is a (error, True) pair
+class FakeStorage(StorageBackend):
+    def __init__(self, allocator, failures=()):
+        self.allocator = allocator
+        self.rows = []
+        self.appends = 0
+        self.failures = list(failures)
+        self._lock = threading.Lock()
+
+    def append_requests(self, rows):
+        with self._lock:
+            self.appends += 1
+            failure = self.failures.pop(0) if self.failures else None
+            if failure is None or failure[1]:
+                self.rows.extend(list(row) for row in rows)
+        if failure is not None:
+            raise failure[0]
+
+    def stored_request_ids(self, request_ids):
+        with self._lock:
+            stored = {row[0] for row in self.rows}
+        return {request_id for request_id in request_ids if request_id in stored}
+
+    def reserve_request_ids(self, prefix, count=1):
+        return self.allocator.allocate(prefix, count)
+
+    def recover_request_ids(self, request_ids):
+        self.allocator.recover(request_ids)
+
+    def stored_ids(self):
+        with self._lock:
+            return [row[0] for row in self.rows]
+
+
+def row(request_id):
+    return [request_id, "Name", "F", "a@example.com", "+919876543210", "Long Term Department Support",
+            "Health Team", "None", "None", "None", "Description", "2025-01-01 10:00:00"]
+
+
+def wait_until_done(queue, request_ids, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        statuses = [queue.status(request_id) for request_id in request_ids]
+        if all(status is not None and status.done for status in statuses):
+            return statuses
+        time.sleep(0.01)
+    raise AssertionError(f"not done: {request_ids}")
+
+
+@pytest.fixture(autouse=True)
+def fast_writer(monkeypatch):
+    monkeypatch.setattr(submissions, "BATCH_WINDOW", 0.01)
+    monkeypatch.setattr(submissions, "RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(submissions, "RETRY_MAX_DELAY", 0.01)
+
+
+@pytest.fixture
+def allocator(tmp_path):
+    return RequestIdAllocator(str(tmp_path / "ids.sqlite3"))
+
+
+def test_rows_are_journaled_and_saved(tmp_path, allocator):
+    storage = FakeStorage(allocator)
+    journal = SubmissionJournal(str(tmp_path / "journal"))
+    queue = SubmissionQueue(storage, journal)
+
+    assert queue.submit("REQ-LTV00001", row("REQ-LTV00001")) == "REQ-LTV00001"
+    assert [status.state for status in wait_until_done(queue, ["REQ-LTV00001"])] == [SAVED]
+    assert storage.stored_ids() == ["REQ-LTV00001"]
+    assert journal.backlog == 0
+
+
+def test_replay_after_restart_writes_every_row_once(tmp_path, allocator):
+    crashed = SubmissionJournal(str(tmp_path / "journal"))
+    for request_id in ("REQ-LTV00001", "REQ-LTV00002", "REQ-LTV00003"):
+        crashed.append(request_id, row(request_id), f"key-{request_id}")
+    os.close(crashed._fd)
+    # The first row reached the sheet before the crash, its "saved" record did not
+    storage = FakeStorage(allocator)
+    storage.rows.append(row("REQ-LTV00001"))
+
+    queue = SubmissionQueue(storage, SubmissionJournal(str(tmp_path / "journal")))
+    wait_until_done(queue, ["REQ-LTV00001", "REQ-LTV00002", "REQ-LTV00003"])
+
+    assert sorted(storage.stored_ids()) == ["REQ-LTV00001", "REQ-LTV00002", "REQ-LTV00003"]
+    # A resubmission of a replayed request gets its original Request ID back
+    assert queue.duplicate_of("key-REQ-LTV00002") == "REQ-LTV00002"
+
+
+def test_append_that_failed_after_writing_is_not_repeated(tmp_path, allocator):
+    storage = FakeStorage(allocator, failures=[(ConnectionError("connection reset"), True)])
+    queue = SubmissionQueue(storage, SubmissionJournal(str(tmp_path / "journal")))
+
+    queue.submit("REQ-LTV00001", row("REQ-LTV00001"))
+    assert [status.state for status in wait_until_done(queue, ["REQ-LTV00001"])] == [SAVED]
+    assert storage.stored_ids() == ["REQ-LTV00001"]
+
+
+def test_outage_longer_than_max_attempts_is_retried_until_it_ends(tmp_path, allocator, monkeypatch):
+    monkeypatch.setattr(submissions, "MAX_ATTEMPTS", 2)
+    storage = FakeStorage(allocator, failures=[(SheetsBusyError("busy"), False)] * 5)
+    queue = SubmissionQueue(storage, SubmissionJournal(str(tmp_path / "journal")))
+
+    queue.submit("REQ-LTV00001", row("REQ-LTV00001"))
+    assert [status.state for status in wait_until_done(queue, ["REQ-LTV00001"])] == [SAVED]
+    assert storage.appends == 6
+
+
+def test_rejected_row_fails_and_is_not_replayed(tmp_path, allocator):
+    storage = FakeStorage(allocator, failures=[(ValueError("bad row"), False)])
+    journal = SubmissionJournal(str(tmp_path / "journal"))
+    queue = SubmissionQueue(storage, journal)
+
+    queue.submit("REQ-LTV00001", row("REQ-LTV00001"))
+    assert [status.state for status in wait_until_done(queue, ["REQ-LTV00001"])] == [FAILED]
+    assert journal.pending() == []
+
+
+def test_duplicate_submission_returns_the_original_id(tmp_path, allocator):
+    storage = FakeStorage(allocator)
+    queue = SubmissionQueue(storage, SubmissionJournal(str(tmp_path / "journal")))
+
+    assert queue.submit("REQ-LTV00001", row("REQ-LTV00001"), "key") == "REQ-LTV00001"
+    assert queue.submit("REQ-LTV00002", row("REQ-LTV00002"), "key") == "REQ-LTV00001"
+    wait_until_done(queue, ["REQ-LTV00001"])
+    assert storage.stored_ids() == ["REQ-LTV00001"]
+
+
+def test_journal_write_error_keeps_no_dedupe_entry(tmp_path, allocator, monkeypatch):
+    storage = FakeStorage(allocator)
+    journal = SubmissionJournal(str(tmp_path / "journal"))
+    queue = SubmissionQueue(storage, journal)
+
+    def full_disk(*args, **kwargs):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(journal, "append", full_disk)
+    with pytest.raises(OSError):
+        queue.submit("REQ-LTV00001", row("REQ-LTV00001"), "key")
+    monkeypatch.undo()
+    assert queue.duplicate_of("key") is None
+    assert queue.status("REQ-LTV00001") is None
+
+    # The retry is journaled and saved under its own Request ID
+    assert queue.submit("REQ-LTV00002", row("REQ-LTV00002"), "key") == "REQ-LTV00002"
+    wait_until_done(queue, ["REQ-LTV00002"])
+    assert storage.stored_ids() == ["REQ-LTV00002"]
+
+
+def test_ids_pending_in_the_journal_are_not_handed_out_again(tmp_path, allocator):
+    crashed = SubmissionJournal(str(tmp_path / "journal"))
+    crashed.append("REQ-LTV00101", row("REQ-LTV00101"))
+    os.close(crashed._fd)
+    # The counter store was lost; the sheet only knows up to REQ-LTV00100
+    allocator.recover(["REQ-LTV00100"])
+    storage = FakeStorage(allocator, failures=[(SheetsBusyError("busy"), False)] * 1000)
+
+    SubmissionQueue(storage, SubmissionJournal(str(tmp_path / "journal")))
+    assert storage.reserve_request_ids("LTV") == ["REQ-LTV00102"]
+
+
+def test_journal_error_after_the_write_does_not_stop_the_writer(tmp_path, allocator, monkeypatch):
+    storage = FakeStorage(allocator)
+    journal = SubmissionJournal(str(tmp_path / "journal"))
+    queue = SubmissionQueue(storage, journal)
+
+    def full_disk(request_ids):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(journal, "mark_saved", full_disk)
+    queue.submit("REQ-LTV00001", row("REQ-LTV00001"))
+    assert [status.state for status in wait_until_done(queue, ["REQ-LTV00001"])] == [SAVED]
+    monkeypatch.undo()
+
+    queue.submit("REQ-LTV00002", row("REQ-LTV00002"))
+    assert [status.state for status in wait_until_done(queue, ["REQ-LTV00002"])] == [SAVED]
+    assert storage.stored_ids() == ["REQ-LTV00001", "REQ-LTV00002"]
+
+
+def test_failed_stored_check_is_retried_instead_of_failing_the_row(tmp_path, allocator):
+    crashed = SubmissionJournal(str(tmp_path / "journal"))
+    crashed.append("REQ-LTV00001", row("REQ-LTV00001"))
+    os.close(crashed._fd)
+    storage = FakeStorage(allocator)
+    storage.rows.append(row("REQ-LTV00001"))
+    checks = []
+    stored_request_ids = storage.stored_request_ids
+
+    def flaky_check(request_ids):
+        checks.append(request_ids)
+        if len(checks) == 1:
+            raise ValueError("unexpected response")
+        return stored_request_ids(request_ids)
+
+    storage.stored_request_ids = flaky_check
+    queue = SubmissionQueue(storage, SubmissionJournal(str(tmp_path / "journal")))
+
+    assert [status.state for status in wait_until_done(queue, ["REQ-LTV00001"])] == [SAVED]
+    assert len(checks) == 2
+    assert storage.stored_ids() == ["REQ-LTV00001"]
@@ -0,0 +1,80 @@
+from datetime import date
+
+import pytest
+
+from portal.storage import TRACKED_REQUEST_COLUMNS
+from portal.triage import RequestTriage
+
+
+def row(number, request_type="Health Team", day="2025-01-01", status=None, category="Ashram Volunteer"):
+    row = [f"REQ-AV{number:05d}", "Name", "Female", "a@example.com", "+919876543210", category,
+           request_type, "None", "None", "None", "Description", f"{day} 10:00:00"]
+    return row + [status] if status is not None else row
+
+
+@pytest.fixture
+def triage(requests_sheet):
+    def build(rows):
+        worksheet, data_layer = requests_sheet(rows)
+        triage = RequestTriage(data_layer.tail("Requests", "A:M"), TRACKED_REQUEST_COLUMNS)
+        triage.refresh()
+        return worksheet, triage
+
+    return build
+
+
+def ids(page):
+    return [record["Request ID"] for record in page.rows]
+
+
+def test_filters_combine_columns_and_dates(triage):
+    _, requests = triage([
+        row(1, "Health Team", "2025-01-01"),
+        row(2, "Seva Team", "2025-01-02", "Closed"),
+        row(3, "Health Team", "2025-01-03", "Closed"),
+        row(4, "Others", "2025-01-04"),
+    ])
+    assert requests.options("Request Type") == ["Health Team", "Others", "Seva Team"]
+    assert requests.options("Status") == ["Closed", "Received"]
+
+    assert ids(requests.query({"Request Type": ["Health Team"]})) == ["REQ-AV00003", "REQ-AV00001"]
+    assert ids(requests.query({"Request Type": ["Health Team", "Seva Team"], "Status": ["Closed"]})) == ["REQ-AV00003", "REQ-AV00002"]
+    assert ids(requests.query({"Status": ["Received"]}, from_date=date(2025, 1, 2))) == ["REQ-AV00004"]
+    assert ids(requests.query(from_date=date(2025, 1, 2), to_date=date(2025, 1, 3))) == ["REQ-AV00003", "REQ-AV00002"]
+    assert requests.query({"Request Type": ["Accommodation Team"]}).total == 0
+
+
+def test_unreadable_timestamps_are_left_out_of_date_filters(triage):
+    _, requests = triage([row(1, day="2025-01-01"), row(2, day="someday")])
+    assert requests.query().total == 2
+    assert ids(requests.query(from_date=date(2024, 1, 1))) == ["REQ-AV00001"]
+
+
+def test_pages_are_newest_first(triage):
+    _, requests = triage([row(number) for number in range(1, 8)])
+    first = requests.query(page=0, page_size=3)
+    assert (first.total, first.page, first.pages) == (7, 0, 3)
+    assert ids(first) == ["REQ-AV00007", "REQ-AV00006", "REQ-AV00005"]
+    assert ids(requests.query(page=2, page_size=3)) == ["REQ-AV00001"]
+    # A page past the end shows the last one
+    assert requests.query(page=9, page_size=3).page == 2
+    assert ids(requests.query({"Request Type": ["Health Team"]}, page=1, page_size=3)) == ["REQ-AV00004", "REQ-AV00003", "REQ-AV00002"]
+
+
+def test_new_and_removed_rows_are_picked_up(triage):
+    worksheet, requests = triage([row(1), row(2, "Seva Team")])
+    worksheet.append_rows([row(3, "Seva Team"), ["", ""]])
+    requests.refresh()
+    assert ids(requests.query({"Request Type": ["Seva Team"]})) == ["REQ-AV00003", "REQ-AV00002"]
+
+    worksheet.delete_rows(2, 3)
+    requests.refresh()
+    assert len(requests) == 1
+    assert requests.options("Request Type") == ["Seva Team"]
+
+
+def test_matching_yields_records_in_sheet_order(triage):
+    _, requests = triage([row(1), row(2, "Seva Team"), row(3)])
+    records = list(requests.matching({"Request Type": ["Health Team"]}))
+    assert [record["Request ID"] for record in records] == ["REQ-AV00001", "REQ-AV00003"]
+    assert records[0]["Status"] == "Received"